@@ -1,48 +1,120 @@
+import bisect
+import time
+
 import pygame
 
+from renderer import CELL_SIZE, MapRenderer, fonts, get_font, text_cache
+
+# The map panel never grows past this; larger maps scroll with the player
+MAX_VIEW_SIZE = (800, 800)
+ZOOM_IN_KEYS = (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS)
+ZOOM_OUT_KEYS = (pygame.K_MINUS, pygame.K_KP_MINUS)
+
+
+class FrameStats:
+    # Frame hook for UI: records the work time of every loop iteration and the process CPU time
+    def __init__(self):
+        self.frames = 0
+        self.rendered_frames = 0
+        self.frame_times = []
+        self.cpu_time = 0.0
+        self.started = None
+        self.finished = None
+
+    def __call__(self, frame_seconds, cpu_seconds, rendered):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now - frame_seconds
+        self.finished = now
+        self.frames += 1
+        self.rendered_frames += rendered
+        self.frame_times.append(frame_seconds)
+        self.cpu_time += cpu_seconds
+
+    def summary(self):
+        if not self.frames:
+            return "no frames recorded"
+        wall = self.finished - self.started
+        times = sorted(self.frame_times)
+        mean = sum(times) / len(times)
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        return (f"{self.frames} frames ({self.rendered_frames} rendered) over {wall:.1f}s, "
+                f"frame time mean {mean * 1000:.2f}ms p99 {p99 * 1000:.2f}ms, "
+                f"CPU {self.cpu_time / wall * 100:.1f}%")
+
+
+class LatencyHistogram:
+    # Time from a key press to the display update that shows it. A press counts from when it
+    # reached the loop, or from its `sent` attribute for events posted with a send time. Only
+    # presses that change the display are counted; a move into a wall shows nothing.
+    buckets = (0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.066, 0.1, 0.25)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.latencies = []
+
+    def record(self, seconds):
+        self.latencies.append(seconds)
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def summary(self):
+        if not self.latencies:
+            return "no key presses recorded"
+        times = sorted(self.latencies)
+        lines = [f"{len(times)} key presses, latency p50 {times[len(times) // 2] * 1000:.2f}ms "
+                 f"p99 {times[min(len(times) - 1, int(len(times) * 0.99))] * 1000:.2f}ms max {times[-1] * 1000:.2f}ms"]
+        lower = 0
+        for upper, count in zip(self.buckets + (float('inf'),), self.counts):
+            label = f">{lower * 1000:g}ms" if upper == float('inf') else f"{lower * 1000:g}-{upper * 1000:g}ms"
+            lines.append(f"{label:>12} {count:>6} {'#' * round(count / len(times) * 40)}")
+            lower = upper
+        return "\n".join(lines)
+
+
 class UI:
-    def __init__(self, map):
-        cell_size = 25
+    def __init__(self, map, frame_hook=None, max_frames=None, event_driven=False, latency=None):
         self.text_scroll_offset = 0
-        width = (map.width * 2 - 1) * cell_size
-        height = (map.height * 2 - 1) * cell_size
+        self.renderer = MapRenderer(map, CELL_SIZE, MAX_VIEW_SIZE)
+        # The panel keeps the size the map first needed, whatever the zoom
+        self.renderer.view_size = width, height = self.renderer.size
         pygame.init()
         self.screen = pygame.display.set_mode((width * 2, height))
         pygame.font.init()
-        self.font = pygame.font.SysFont("Helvetica", 24)
-        self.clock = pygame.time.Clock()
+        self.font = get_font(24)
         self.map = map
+        self.frame_hook = frame_hook
+        self.max_frames = max_frames
+        # Event-driven loops sleep in pygame.event.wait until there is input instead of polling
+        self.event_driven = event_driven
+        self.latency = latency
+        self.running = True
+        self.dirty = []
+        self.text_dirty = True
+        self.key_presses = []
         self.show_UI()
 
     def render_text_box(self, text, x, y):
         font_size = 30
-        font = pygame.font.SysFont("Helvetica", font_size)
+        font = get_font(font_size)
         text_color = (255, 255, 255)
         box_width = self.screen.get_width() // 2 - 20
         box_height = self.screen.get_height() - 20
         padding = 5
         line_spacing = 4
         font_height = font.get_linesize()
-        # Break the text into lines, considering newline characters
-        paragraphs = text.split('\n')
-        lines = []
-        for paragraph in paragraphs:
-            words = paragraph.split(' ')
-            line = ''
-            while words:
-                if font.size(line + words[0])[0] <= box_width - padding * 2:
-                    line += (words.pop(0) + ' ')
-                else:
-                    lines.append(line)
-                    line = ''
-            lines.append(line)
+        # Break the text into lines, considering newline characters; layouts are cached per text
+        lines = text_cache.wrap(text, font_size, box_width - padding * 2)
         # Draw the text box
-        pygame.draw.rect(self.screen, (0, 0, 0), (x, y, box_width, box_height))
-        pygame.draw.rect(self.screen, text_color, (x, y, box_width, box_height), 1)
-        # Render the text with the scroll offset
+        box = pygame.Rect(x, y, box_width, box_height)
+        pygame.draw.rect(self.screen, (0, 0, 0), box)
+        pygame.draw.rect(self.screen, text_color, box, 1)
+        # Render the text with the scroll offset, kept inside the box so only the box needs updating
+        self.screen.set_clip(box)
         for i, line in enumerate(lines):
-            text_surface = font.render(line, True, text_color)
+            text_surface = text_cache.render(line, font_size, text_color)
             self.screen.blit(text_surface, (x + padding, y + padding + i * (font_height + line_spacing) - self.text_scroll_offset))
+        self.screen.set_clip(None)
+        return box
 
     def get_directions(self, current_cell, connected_cells):
         directions = []
@@ -59,51 +131,106 @@ class UI:
                 directions.append("East")
         return directions
 
+    def render_room_text(self):
+        player_location = self.map.get_player_location()
+        connections = player_location.get_connections()
+        exits = self.get_directions((player_location.x, player_location.y), connections)
+        text = f"Coordinates: ({player_location.x}, {player_location.y})\nRegion: {player_location.region}\nType: {player_location.room_type}\n\nName: {player_location.name}\n\nDescription: {player_location.desc}"
+        text += f"\n\nYou can see exits: {exits}"
+        return self.render_text_box(text, 10, 10)
+
+    def handle_event(self, event, arrived, map_panel):
+        # Applies one event and marks what it changed: the text panel, the map or both
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button == 4: # scroll up
+                self.text_scroll_offset = max(self.text_scroll_offset -14, 0)
+                self.text_dirty = True
+            elif event.button == 5: # scroll down
+                self.text_scroll_offset += 14
+                self.text_dirty = True
+        elif event.type == pygame.KEYDOWN:
+            player = self.map.get_player_location()
+            zoomed = False
+            if event.key == pygame.K_UP:
+                self.map.move_player("N")
+            elif event.key == pygame.K_DOWN:
+                self.map.move_player("S")
+            elif event.key == pygame.K_LEFT:
+                self.map.move_player("W")
+            elif event.key == pygame.K_RIGHT:
+                self.map.move_player("E")
+            elif event.key in ZOOM_IN_KEYS or event.key in ZOOM_OUT_KEYS:
+                # A zoomed-out map can be smaller than the panel, so clear all of it
+                self.renderer.zoom(1 if event.key in ZOOM_IN_KEYS else -1)
+                self.screen.fill((0, 0, 0), map_panel)
+                self.dirty.append(map_panel)
+                zoomed = True
+            moved = self.map.get_player_location() != player
+            if moved:
+                self.text_dirty = True
+            if moved or zoomed:
+                self.key_presses.append(getattr(event, 'sent', arrived))
+
+    def draw_frame(self, map_offset):
+        # Only the player's old and new cells change on the map; nothing is drawn when idle
+        dirty = self.dirty + self.renderer.update(self.screen, map_offset)
+        # Render the UI in the left half of the window
+        if self.text_dirty:
+            dirty.append(self.render_room_text())
+        if dirty:
+            pygame.display.update(dirty)
+        if self.latency is not None:
+            shown = time.perf_counter()
+            for pressed in self.key_presses:
+                self.latency.record(shown - pressed)
+        self.key_presses = []
+        self.dirty = []
+        self.text_dirty = False
+        return dirty
+
+    def wait_for_frame(self, deadline):
+        # Sleeps until the next frame of the polling loop in pygame.event.wait rather than a
+        # clock tick, so input that comes in meanwhile is timed when it arrives
+        events = []
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return events
+            event = pygame.event.wait(max(1, round(remaining * 1000)))
+            if event.type != pygame.NOEVENT:
+                events.append((event, time.perf_counter()))
+
     def show_UI(self):
-        running = True
-        action = True
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 4: # scroll up
-                        self.text_scroll_offset = max(self.text_scroll_offset -14, 0)
-                    elif event.button == 5: # scroll down
-                        self.text_scroll_offset += 14
-                if event.type == pygame.KEYDOWN:
-                    action = True
-                    if event.key == pygame.K_UP:
-                        self.map.move_player("N")
-                    elif event.key == pygame.K_DOWN:
-                        self.map.move_player("S")
-                    elif event.key == pygame.K_LEFT:
-                        self.map.move_player("W")
-                    elif event.key == pygame.K_RIGHT:
-                        self.map.move_player("E")
-            # Calculate the required width for the map
-            map_width = self.map.width * 25 * 2 - 25
-            map_height = self.map.height * 25 * 2 - 25
-            if action:
-                self.screen.fill((0, 0, 0))
-            if self.screen.get_width() < map_width * 2:
-                # Resize the main window if needed
-                new_width = map_width * 2
-                new_height = max(map_height, self.screen.get_height())
-                self.screen = pygame.display.set_mode((new_width, new_height))
-            # Create the map surface
-            map_surface = pygame.Surface((map_width, map_height))
-            self.map.visualize_map(map_surface)
-            self.screen.blit(map_surface, (self.screen.get_width() - map_width, 0))
-            # Render the UI in the left half of the window
-            if action:
-                player_location = self.map.get_player_location()
-                connections = player_location.get_connections()
-                exits = self.get_directions((player_location.x, player_location.y), connections)
-                text = f"Coordinates: ({player_location.x}, {player_location.y})\nRegion: {player_location.region}\nType: {player_location.room_type}\n\nName: {player_location.name}\n\nDescription: {player_location.desc}"
-                text += f"\n\nYou can see exits: {exits}"
-                self.render_text_box(text, 10, 10)
-                action = False
-            pygame.display.flip()
-            self.clock.tick(30)
-        pygame.quit()
\ No newline at end of file
+        map_offset = (self.screen.get_width() - self.renderer.view_size[0], 0)
+        map_panel = pygame.Rect(map_offset, self.renderer.view_size)
+        self.screen.fill((0, 0, 0))
+        self.dirty = self.renderer.draw(self.screen, map_offset)
+        frames = 0
+        waited = []
+        while self.running:
+            if self.event_driven and frames:
+                # Blocks without using CPU; whatever queued up behind the first event is handled with it
+                events = [pygame.event.wait()] + pygame.event.get()
+            else:
+                events = pygame.event.get()
+            # (event, time it reached the loop); events caught while waiting for this frame
+            # keep the time they arrived
+            arrived = time.perf_counter()
+            events = waited + [(event, arrived) for event in events]
+            frame_start, cpu_start = time.perf_counter(), time.process_time()
+            for event, arrived in events:
+                self.handle_event(event, arrived, map_panel)
+            dirty = self.draw_frame(map_offset)
+            if self.frame_hook is not None:
+                self.frame_hook(time.perf_counter() - frame_start, time.process_time() - cpu_start, bool(dirty))
+            frames += 1
+            if frames == self.max_frames:
+                break
+            if not self.event_driven:
+                waited = self.wait_for_frame(frame_start + 1 / 30)
+        # Fonts and text surfaces do not survive pygame.quit, so a later UI must not reuse them
+        fonts.clear()
+        text_cache.clear()
+        pygame.quit()
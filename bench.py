@@ -0,0 +1,656 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from cells import ROOM_TYPES, DIRECTION_BITS
+from grid import Grid
+from map import Map
+from profiler import GenerationProfile
+from world_format import WorldFile, load_world, save_world
+
+
+def time_call(func, *args, repeat=1, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_scaling(sizes, num_regions, repeat):
+    print(f"{'size':>10} {'cells':>10} {'seconds':>10} {'us/cell':>10}")
+    for size in sizes:
+        seconds = time_call(Grid, size, size, num_regions, seed=size, repeat=repeat)
+        cells = size * size
+        print(f"{f'{size}x{size}':>10} {cells:>10} {seconds:>10.3f} {seconds / cells * 1e6:>10.2f}")
+
+
+class LegacyRoom:
+    # The per-cell Room object Map used to build before the compact arrays
+    def __init__(self, x, y, region, room_type):
+        self.x = x
+        self.y = y
+        self.region = region
+        self.room_type = room_type
+        self.connections = set()
+        self.name = ""
+        self.desc = ""
+
+
+def build_legacy_world(game_map):
+    grid = [[int(region) for region in row] for row in game_map.regions]
+    room_grid = [[ROOM_TYPES[code] for code in row] for row in game_map.room_types]
+    connections = {}
+    rooms = [[LegacyRoom(x, y, grid[y][x], room_grid[y][x]) for x in range(game_map.width)]
+             for y in range(game_map.height)]
+    for y in range(game_map.height):
+        for x in range(game_map.width):
+            for (d_row, d_col), bit in DIRECTION_BITS.items():
+                if game_map.exits[y, x] & bit:
+                    connections.setdefault((y, x), set()).add((y + d_row, x + d_col))
+                    rooms[y][x].connections.add(rooms[y + d_row][x + d_col])
+            room = game_map.get_room(x, y)
+            rooms[y][x].name, rooms[y][x].desc = room.name, room.desc
+    return grid, room_grid, connections, rooms
+
+
+def traced_bytes(func, *args):
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    result = func(*args)
+    end = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in end.compare_to(start, 'filename'))
+    return result, allocated
+
+
+def bench_memory(sizes, num_regions):
+    print(f"{'size':>10} {'legacy B/cell':>14} {'compact B/cell':>15} {'ratio':>7}")
+    # Generation imports scipy and loads the content tables on first use; neither belongs to a map
+    Map(Grid(8, 8, num_regions, seed=0), verbose=False)
+    for size in sizes:
+        game_map, compact = traced_bytes(lambda: Map(Grid(size, size, num_regions, seed=size), verbose=False))
+        _, legacy = traced_bytes(build_legacy_world, game_map)
+        cells = size * size
+        print(f"{f'{size}x{size}':>10} {legacy / cells:>14.1f} {compact / cells:>15.1f} {legacy / compact:>7.1f}")
+
+
+def bench_io(count, size, num_regions):
+    directory = tempfile.mkdtemp()
+    maps = [Map(Grid(size, size, num_regions, seed=seed), verbose=False) for seed in range(count)]
+    json_paths, binary_paths = [], []
+    for seed, game_map in enumerate(maps):
+        json_paths.append(os.path.join(directory, f"{seed}.json"))
+        binary_paths.append(os.path.join(directory, f"{seed}.world"))
+        with open(json_paths[-1], 'w') as file:
+            json.dump(game_map.to_dict(), file)
+        save_world(game_map, binary_paths[-1])
+        # Round trip: the loaded world must describe exactly the same map
+        assert load_world(binary_paths[-1]).to_dict() == game_map.to_dict()
+
+    def load_json(path):
+        with open(path) as file:
+            return json.load(file)
+
+    probes = [(random.randrange(game_map.width), random.randrange(game_map.height)) for game_map in maps]
+    print(f"{count} worlds of {size}x{size}")
+    print(f"{'format':>8} {'bytes':>10} {'full load ms':>13} {'one room ms':>12}")
+    for label, paths, load, read_room in (
+        ('json', json_paths, load_json, lambda path, x, y: load_json(path)['names'][y][x]),
+        ('binary', binary_paths, load_world, lambda path, x, y: WorldFile.open(path).room(x, y)),
+    ):
+        size_bytes = sum(os.path.getsize(path) for path in paths) / count
+        full = time_call(lambda: [load(path) for path in paths]) / count
+        one = time_call(lambda: [read_room(path, x, y) for path, (x, y) in zip(paths, probes)]) / count
+        print(f"{label:>8} {size_bytes:>10.0f} {full * 1000:>13.3f} {one * 1000:>12.3f}")
+
+
+def bench_render(sizes, frames, move_every, view):
+    # Map frame time inside a fixed viewport as the map grows: redrawing every visible cell
+    # each frame vs only the player's cells between camera moves
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from renderer import MapRenderer
+    from UI import FrameStats
+    pygame.init()
+    screen = pygame.display.set_mode((view * 2, view))
+    offset = (view, 0)
+    directions = "NESW"
+    print(f"{view}x{view} viewport, {frames} frames, a move every {move_every} frames")
+    for size in sizes:
+        game_map = Map(Grid(size, size, max(5, size // 20), seed=size), verbose=False, lazy_names=True)
+        renderer = MapRenderer(game_map, view_size=(view, view))
+        rng = random.Random(size)
+
+        def wander(frame):
+            if frame % move_every == 0:
+                room = game_map.get_player_location()
+                game_map.move_player(rng.choice(room.directions or directions)[0])
+
+        def full_frame(frame):
+            wander(frame)
+            renderer.drawn_player = None
+            pygame.display.update(renderer.update(screen, offset))
+            return True
+
+        def cached_frame(frame):
+            wander(frame)
+            dirty = renderer.update(screen, offset)
+            if dirty:
+                pygame.display.update(dirty)
+            return bool(dirty)
+
+        for label, frame_func in (('full', full_frame), ('cached', cached_frame)):
+            stats = FrameStats()
+            for frame in range(frames):
+                start, cpu_start = time.perf_counter(), time.process_time()
+                rendered = frame_func(frame)
+                stats(time.perf_counter() - start, time.process_time() - cpu_start, rendered)
+            print(f"{size:>5}x{size:<5} {label:>6}: {stats.summary()}")
+    pygame.quit()
+
+
+def bench_input(size, presses, interval, idle):
+    # Key press to display update latency and CPU use, polling at 30 FPS vs waiting for events.
+    # Presses are posted from another thread at random moments, stamped with their send time,
+    # after an idle spell with no input at all.
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import threading
+    import pygame
+    from UI import UI, FrameStats, LatencyHistogram
+
+    def press_keys():
+        time.sleep(idle)
+        rng = random.Random(size)
+        keys = (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT)
+        for _ in range(presses):
+            time.sleep(rng.uniform(0, interval * 2))
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=rng.choice(keys), sent=time.perf_counter()))
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    for label, event_driven in (("polling", False), ("event-driven", True)):
+        game_map = Map(Grid(size, size, seed=size), verbose=False)
+        frame_stats, latency = FrameStats(), LatencyHistogram()
+        pygame.init()
+        pygame.display.set_mode((1, 1))
+        cpu_start, start = time.process_time(), time.perf_counter()
+        threading.Thread(target=press_keys, daemon=True).start()
+        UI(game_map, frame_hook=frame_stats, event_driven=event_driven, latency=latency)
+        cpu = (time.process_time() - cpu_start) / (time.perf_counter() - start)
+        print(f"{label}: {frame_stats.frames} loop iterations, process CPU {cpu * 100:.1f}%")
+        print(latency.summary())
+
+
+def bench_export(size, repeat_map, cell_size, level):
+    # Export throughput to /dev/null; repeat_map tiles one generated map to reach huge sizes
+    # without generating them. Peak RSS shows the exporters only hold a block of rows.
+    import resource
+    from types import SimpleNamespace
+    import export
+    game_map = Map(Grid(size, size, max(5, size // 50), seed=size), verbose=False, lazy_names=True)
+    source = SimpleNamespace(**{name: np.tile(getattr(game_map, name), (repeat_map, repeat_map))
+                                for name in ('room_types', 'exits', 'regions')},
+                             generated_colors=game_map.generated_colors)
+    height, width = source.room_types.shape
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{width}x{height} cells, {cell_size}px cells, zlib level {level}")
+    for label, write in (("ascii", lambda file: export.write_ascii(source, file)),
+                         ("png", lambda file: export.write_image(source, file, cell_size, level))):
+        with open(os.devnull, 'wb') as devnull:
+            counter = SimpleNamespace(bytes=0)
+
+            class CountingFile:
+                def write(self, data):
+                    counter.bytes += len(data)
+                    devnull.write(data)
+            start = time.perf_counter()
+            write(CountingFile())
+            seconds = time.perf_counter() - start
+        grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+        print(f"{label:>6}: {seconds:.2f}s, {width * height / seconds / 1e6:.1f}M cells/s, "
+              f"{counter.bytes / seconds / 1e6:.1f}MB/s written, peak RSS +{grown / 1024:.0f}MB")
+
+
+def bench_navigation(size, num_regions, queries):
+    from collections import deque
+    game_map = Map(Grid(size, size, num_regions, seed=size), verbose=False)
+    rooms = [(x, y) for y in range(size) for x in range(size) if game_map.room_types[y, x] != 0]
+    rng = random.Random(size)
+    pairs = [(game_map.get_room(*rng.choice(rooms)), game_map.get_room(*rng.choice(rooms))) for _ in range(queries)]
+
+    def bfs(start, stop):
+        # What a caller had to do before the index: search the room graph on every query
+        seen = {(start.x, start.y)}
+        queue = deque([(start, 0)])
+        while queue:
+            room, steps = queue.popleft()
+            if stop(room):
+                return steps
+            for neighbour in room.connections:
+                if (neighbour.x, neighbour.y) not in seen:
+                    seen.add((neighbour.x, neighbour.y))
+                    queue.append((neighbour, steps + 1))
+        return None
+
+    build = time_call(game_map.get_navigation)
+    print(f"{size}x{size} map, {num_regions} regions, index built in {build * 1000:.1f}ms")
+    print(f"{'query':>16} {'bfs us':>10} {'index us':>10} {'speedup':>8}")
+    for label, on_the_fly, indexed in (
+        ('distance', lambda a, b: bfs(a, lambda room: room == b), game_map.distance),
+        ('reachable', lambda a, b: bfs(a, lambda room: room == b) is not None, game_map.is_reachable),
+        ('nearest entry', lambda a, b: bfs(a, lambda room: room.room_type == 'E'),
+         lambda a, b: game_map.nearest_entry_room(a)),
+    ):
+        slow = time_call(lambda: [on_the_fly(a, b) for a, b in pairs]) / queries
+        fast = time_call(lambda: [indexed(a, b) for a, b in pairs]) / queries
+        print(f"{label:>16} {slow * 1e6:>10.1f} {fast * 1e6:>10.1f} {slow / fast:>8.1f}")
+
+
+def bench_search(size, num_regions, queries):
+    from search import words
+    game_map = Map(Grid(size, size, num_regions, seed=size), verbose=False, lazy_names=True)
+    build = time_call(game_map.get_search_index)
+    index = game_map.get_search_index()
+    rooms = np.flatnonzero(index.rooms)
+    rng = random.Random(size)
+    picks = [game_map.get_room(int(cell) % size, int(cell) // size) for cell in rng.sample(list(rooms), queries)]
+    print(f"{size}x{size} map, {len(rooms)} rooms, {num_regions} regions, index built in {build:.2f}s")
+    print(f"{'query':>18} {'p50 us':>10} {'p99 us':>10} {'mean hits':>10}")
+
+    def report(label, run):
+        times, hits = [], 0
+        for room in picks:
+            start = time.perf_counter()
+            hits += len(run(room))
+            times.append(time.perf_counter() - start)
+        times.sort()
+        print(f"{label:>18} {times[len(times) // 2] * 1e6:>10.1f} {times[int(len(times) * 0.99)] * 1e6:>10.1f} "
+              f"{hits / len(picks):>10.1f}")
+
+    report('name word', lambda room: index.find(words(room.name)[0]))
+    report('major type', lambda room: index.find(major_type=index.major_type(room)))
+    report('region + type', lambda room: index.find(region=room.region, room_type=room.room_type))
+    report('within 10', lambda room: index.find(near=room, distance=10))
+    report('word within 50', lambda room: index.find(words(room.name)[0], near=room, distance=50))
+    for room in picks:
+        room.set_name_and_description(f"Renamed {room.x} {room.y}", room.desc)
+    report('after renames', lambda room: index.find(words(room.desc)[-1]))
+
+
+def bench_parallel(size, num_regions, worker_counts, repeat):
+    # Region generation across worker processes; every worker count must give the same grid
+    reference = Grid(size, size, num_regions, seed=size)
+    serial = time_call(Grid, size, size, num_regions, seed=size, repeat=repeat)
+    print(f"{size}x{size} map, {num_regions} regions, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+    print(f"{'serial':>8} {serial:>10.3f} {1:>8.2f}")
+    for workers in worker_counts:
+        grid = Grid(size, size, num_regions, seed=size, workers=workers)
+        assert (grid.room_grid == reference.room_grid).all() and (grid.exits == reference.exits).all()
+        seconds = time_call(Grid, size, size, num_regions, seed=size, workers=workers, repeat=repeat)
+        # Workers beyond the CPU count only add pool start-up and copying
+        note = "  more workers than CPUs" if workers > (os.cpu_count() or 1) else ""
+        print(f"{workers:>8} {seconds:>10.3f} {serial / seconds:>8.2f}{note}")
+
+
+def bench_startup(repeat):
+    # Process start to first frame of main.py, generating the world vs taking it from the pool
+    from world_pool import WorldPool
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy')
+    pool = WorldPool(directory=".world_pool", workers=1)
+
+    def start(*flags):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'main.py', '--exit-after-first-frame', *flags], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return time.perf_counter() - start
+
+    def fast_start():
+        pool.fill()
+        return start('--fast-start')
+
+    print(f"{'start':>12} {'best':>8} {'median':>8}")
+    for label, run in (("generate", start), ("fast-start", fast_start)):
+        times = sorted(run() for _ in range(repeat))
+        print(f"{label:>12} {times[0]:>8.3f} {times[len(times) // 2]:>8.3f}")
+    pool.close()
+
+
+def bench_pool(size, num_regions, count, pool_size):
+    # Time to hand out a world: generating it in-line vs taking it from a filled pool
+    from world_pool import WorldPool
+    from world import build_world
+    pool = WorldPool(pool_size, workers=1)
+    params = (size, size, num_regions)
+    inline = time_call(lambda: [build_world(None, *params) for _ in range(count)]) / count
+    pool.fill(*params)
+    start = time.perf_counter()
+    taken = [pool.take(*params) for _ in range(min(count, pool_size))]
+    pooled = (time.perf_counter() - start) / len(taken)
+    pool.fill(*params)
+    metrics = pool.metrics()
+    pool.close()
+    print(f"{size}x{size} map, {num_regions} regions")
+    print(f"in-line {inline * 1000:.2f}ms per world, pool hit {pooled * 1000:.2f}ms per world")
+    print(f"refill p50 {metrics['refill_seconds']['p50'] * 1000:.1f}ms, p99 {metrics['refill_seconds']['p99'] * 1000:.1f}ms")
+
+
+def bench_worlds(count, size, budget_mb, accesses, skew):
+    # Many worlds under a memory budget, used with a skewed access pattern like a server's
+    # players: a few busy worlds and a long tail of idle ones
+    import resource
+    from world import build_world
+    from world_manager import WorldManager, map_bytes
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    manager = WorldManager(int(budget_mb * 2 ** 20))
+    total = 0
+    for seed in range(count):
+        game_map = build_world(seed, size, size)
+        total += map_bytes(game_map)
+        manager.add(seed, game_map)
+    rng = np.random.default_rng(count)
+    seeds = np.minimum(rng.zipf(skew, accesses) - 1, count - 1)
+    directions = rng.choice(list("NESW"), accesses)
+    times = {True: [], False: []}
+    for seed, direction in zip(seeds.tolist(), directions.tolist()):
+        start = time.perf_counter()
+        evicted = seed in manager.evicted
+        game_map = manager.get(seed)
+        game_map.move_player(direction)
+        game_map.get_player_location().desc
+        times[evicted].append(time.perf_counter() - start)
+    metrics = manager.metrics()
+    manager.close()
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(f"{count} worlds of {size}x{size}, {total / 2 ** 20:.1f}MB in all, budget {budget_mb}MB, "
+          f"peak RSS +{grown / 1024:.0f}MB")
+    print(f"resident {metrics['resident_maps']} ({metrics['resident_bytes'] / 2 ** 20:.1f}MB), "
+          f"evictions {metrics['evictions']}, restores {metrics['restores']}")
+    for evicted, label in ((False, 'resident'), (True, 'restored')):
+        if times[evicted]:
+            values = sorted(times[evicted])
+            print(f"{label:>9} access: {len(values)} accesses, p50 {values[len(values) // 2] * 1e6:.0f}us, "
+                  f"p99 {values[int(len(values) * 0.99)] * 1e6:.0f}us")
+
+
+def suite_cases(quick=False):
+    # Every case is (name, setup): setup returns the function whose best time over repeats is recorded
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    from renderer import text_cache
+    from UI import UI
+    sizes = [25, 50] if quick else [25, 50, 100]
+    cases = []
+    for size in sizes:
+        for num_regions in (5, 10):
+            cases.append((f"grid/{size}x{size}/{num_regions}",
+                          lambda size=size, num_regions=num_regions: lambda: Grid(size, size, num_regions, seed=size)))
+
+    def build_map(size):
+        return Map(Grid(size, size, seed=size), verbose=False)
+
+    def move_player(size, moves=2000):
+        game_map = build_map(size)
+        rng = random.Random(size)
+        directions = [rng.choice("NESW") for _ in range(moves)]
+        return lambda: [game_map.move_player(direction) for direction in directions]
+
+    def ui_for(game_map):
+        # A UI without its event loop, drawing into a dummy display
+        pygame.init()
+        ui = UI.__new__(UI)
+        ui.text_scroll_offset = 0
+        ui.map = game_map
+        ui.screen = pygame.display.set_mode((game_map.width * 100, game_map.height * 50))
+        return ui
+
+    def render_text_box(size, cold):
+        ui = ui_for(build_map(size))
+
+        def draw():
+            if cold:
+                text_cache.surfaces.clear()
+                text_cache.layouts.clear()
+            ui.render_room_text()
+        return draw
+
+    def visualize_map(size, cold):
+        game_map = build_map(size)
+        pygame.init()
+        screen = pygame.display.set_mode((size * 50, size * 50))
+
+        def draw():
+            if cold:
+                game_map.renderer = None
+            game_map.visualize_map(screen)
+        return draw
+
+    def viewport(size):
+        from renderer import MapRenderer
+        renderer = MapRenderer(build_map(size), view_size=(800, 800))
+        pygame.init()
+        screen = pygame.display.set_mode((800, 800))
+
+        def draw():
+            renderer.drawn_player = None
+            renderer.update(screen)
+        return draw
+
+    size = sizes[-1]
+    cases += [
+        (f"map/{size}x{size}", lambda: (lambda grid: lambda: Map(grid, verbose=False))(Grid(size, size, seed=size))),
+        (f"map/{size}x{size}/lazy", lambda: (lambda grid: lambda: Map(grid, verbose=False, lazy_names=True))(Grid(size, size, seed=size))),
+        (f"map/{size}x{size}/set_room_descriptions", lambda: build_map(size).set_room_descriptions),
+        (f"move_player/{size}x{size}/2000", lambda: move_player(size)),
+        ("render/visualize_map/first", lambda: visualize_map(25, True)),
+        ("render/visualize_map/cached", lambda: visualize_map(25, False)),
+        (f"render/viewport/{size}x{size}", lambda: viewport(size)),
+        ("ui/render_text_box/cold", lambda: render_text_box(25, True)),
+        ("ui/render_text_box/cached", lambda: render_text_box(25, False)),
+    ]
+    return cases
+
+
+def stage_times(size, num_regions, repeat):
+    # Per-stage times come from the generation profiler, without allocation tracking
+    best = {}
+    for _ in range(repeat):
+        profile = GenerationProfile(track_allocations=False)
+        Map(Grid(size, size, num_regions, seed=size, profile=profile), verbose=False)
+        for stage in profile.stages:
+            name = f"stage/{size}x{size}/{stage['name']}"
+            best[name] = min(best.get(name, float('inf')), stage['seconds'])
+    return best
+
+
+def current_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def run_suite(repeat, quick=False, pattern=None):
+    results = {}
+    for name, setup in suite_cases(quick):
+        if pattern and pattern not in name:
+            continue
+        results[name] = time_call(setup(), repeat=repeat)
+        print(f"{name:<48} {results[name] * 1000:>10.3f}ms")
+    size = 50 if quick else 100
+    if not pattern or pattern.startswith('stage'):
+        for name, seconds in stage_times(size, 5, repeat).items():
+            if pattern and pattern not in name:
+                continue
+            results[name] = seconds
+            print(f"{name:<48} {seconds * 1000:>10.3f}ms")
+    return {
+        'commit': current_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def save_results(run, directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{run['commit']}.json")
+    with open(path, 'w') as file:
+        json.dump(run, file, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare_results(base, current, threshold, min_delta=0.00025):
+    # Returns the names of cases that got slower by more than threshold (0.1 = 10%); cases that
+    # changed by less than min_delta seconds are within timer noise and never flagged
+    print(f"{base['commit']} -> {current['commit']}")
+    print(f"{'case':<48} {'base ms':>10} {'now ms':>10} {'ratio':>7}")
+    slower = []
+    for name, seconds in sorted(current['results'].items()):
+        before = base['results'].get(name)
+        if before is None:
+            print(f"{name:<48} {'-':>10} {seconds * 1000:>10.3f} {'new':>7}")
+            continue
+        ratio = seconds / before if before else float('inf')
+        flag = ""
+        if ratio > 1 + threshold and seconds - before > min_delta:
+            flag = "  SLOWER"
+            slower.append(name)
+        elif ratio < 1 - threshold and before - seconds > min_delta:
+            flag = "  faster"
+        print(f"{name:<48} {before * 1000:>10.3f} {seconds * 1000:>10.3f} {ratio:>7.2f}{flag}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Map generation benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    scaling = subparsers.add_parser('scaling', help="Grid generation time as map size grows")
+    scaling.add_argument('--sizes', type=int, nargs='+', default=[25, 50, 100, 200, 500])
+    scaling.add_argument('--regions', type=int, default=5)
+    scaling.add_argument('--repeat', type=int, default=1)
+    memory = subparsers.add_parser('memory', help="Resident bytes per cell, legacy objects vs compact arrays")
+    memory.add_argument('--sizes', type=int, nargs='+', default=[25, 100, 300])
+    memory.add_argument('--regions', type=int, default=5)
+    io = subparsers.add_parser('io', help="Saved world size and load time, JSON vs binary")
+    io.add_argument('--count', type=int, default=50)
+    io.add_argument('--size', type=int, default=100)
+    io.add_argument('--regions', type=int, default=5)
+    render = subparsers.add_parser('render', help="Map frame time in a fixed viewport as the map grows")
+    render.add_argument('--sizes', type=int, nargs='+', default=[25, 100, 400, 1000])
+    render.add_argument('--view', type=int, default=800, help="viewport width and height in pixels")
+    render.add_argument('--frames', type=int, default=300)
+    render.add_argument('--move-every', type=int, default=10)
+    navigation = subparsers.add_parser('navigation', help="Route query latency, on-the-fly BFS vs navigation index")
+    navigation.add_argument('--size', type=int, default=100)
+    navigation.add_argument('--regions', type=int, default=8)
+    navigation.add_argument('--queries', type=int, default=200)
+    worlds = subparsers.add_parser('worlds', help="Many worlds under a memory budget, evicting idle ones to disk")
+    worlds.add_argument('--count', type=int, default=2000)
+    worlds.add_argument('--size', type=int, default=48)
+    worlds.add_argument('--budget', type=float, default=16, help="MB of worlds kept in memory")
+    worlds.add_argument('--accesses', type=int, default=20000)
+    worlds.add_argument('--skew', type=float, default=1.3, help="Zipf exponent of which world each access uses")
+    search = subparsers.add_parser('search', help="Room search latency on a large map")
+    search.add_argument('--size', type=int, default=1000)
+    search.add_argument('--regions', type=int, default=64)
+    search.add_argument('--queries', type=int, default=500)
+    input_latency = subparsers.add_parser('input', help="Key press to display latency and CPU, polling vs event-driven UI")
+    input_latency.add_argument('--size', type=int, default=25)
+    input_latency.add_argument('--presses', type=int, default=200)
+    input_latency.add_argument('--interval', type=float, default=0.02, help="mean seconds between presses")
+    input_latency.add_argument('--idle', type=float, default=2.0, help="seconds without input before the presses")
+    export = subparsers.add_parser('export', help="ASCII and PNG export throughput for huge maps")
+    export.add_argument('--size', type=int, default=1000, help="side of the generated map")
+    export.add_argument('--repeat-map', type=int, default=10, help="tile the map this many times per side")
+    export.add_argument('--cell-size', type=int, default=1)
+    export.add_argument('--level', type=int, default=1)
+    parallel = subparsers.add_parser('parallel', help="Grid generation speedup with regions spread over worker processes")
+    parallel.add_argument('--size', type=int, default=1000)
+    parallel.add_argument('--regions', type=int, default=64)
+    parallel.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    parallel.add_argument('--repeat', type=int, default=1)
+    startup = subparsers.add_parser('startup', help="Seconds from process start to the first frame of main.py")
+    startup.add_argument('--repeat', type=int, default=5)
+    pool = subparsers.add_parser('pool', help="World hand-out latency, in-line generation vs a filled pool")
+    pool.add_argument('--size', type=int, default=48)
+    pool.add_argument('--regions', type=int, default=5)
+    pool.add_argument('--count', type=int, default=8)
+    pool.add_argument('--pool-size', type=int, default=8)
+    suite = subparsers.add_parser('suite', help="Run every benchmark case and save the results for this commit")
+    suite.add_argument('--repeat', type=int, default=5, help="best of this many runs per case")
+    suite.add_argument('--quick', action='store_true', help="smaller maps, for a fast check")
+    suite.add_argument('--filter', help="only run cases whose name contains this")
+    suite.add_argument('--out', default="bench_results")
+    compare = subparsers.add_parser('compare', help="Flag cases that got slower than a saved run")
+    compare.add_argument('base', help="results file to compare against")
+    compare.add_argument('current', nargs='?', help="results file to compare; runs the suite when omitted")
+    compare.add_argument('--threshold', type=float, default=0.1, help="slowdown ratio to flag, 0.1 = 10%%")
+    compare.add_argument('--min-delta', type=float, default=0.25, help="ignore changes smaller than this many ms")
+    compare.add_argument('--repeat', type=int, default=5)
+    compare.add_argument('--quick', action='store_true')
+    compare.add_argument('--out', default="bench_results")
+    args = parser.parse_args()
+    if args.command == 'suite':
+        print(f"saved {save_results(run_suite(args.repeat, args.quick, args.filter), args.out)}")
+    elif args.command == 'compare':
+        base = load_results(args.base)
+        if args.current:
+            current = load_results(args.current)
+        else:
+            current = run_suite(args.repeat, args.quick)
+            save_results(current, args.out)
+        slower = compare_results(base, current, args.threshold, args.min_delta / 1000)
+        if slower:
+            print(f"{len(slower)} case(s) slower than {args.base} by more than {args.threshold:.0%}")
+            sys.exit(1)
+    elif args.command == 'pool':
+        bench_pool(args.size, args.regions, args.count, args.pool_size)
+    elif args.command == 'startup':
+        bench_startup(args.repeat)
+    elif args.command == 'input':
+        bench_input(args.size, args.presses, args.interval, args.idle)
+    elif args.command == 'export':
+        bench_export(args.size, args.repeat_map, args.cell_size, args.level)
+    elif args.command == 'parallel':
+        bench_parallel(args.size, args.regions, args.workers, args.repeat)
+    elif args.command == 'scaling':
+        bench_scaling(args.sizes, args.regions, args.repeat)
+    elif args.command == 'memory':
+        bench_memory(args.sizes, args.regions)
+    elif args.command == 'io':
+        bench_io(args.count, args.size, args.regions)
+    elif args.command == 'render':
+        bench_render(args.sizes, args.frames, args.move_every, args.view)
+    elif args.command == 'navigation':
+        bench_navigation(args.size, args.regions, args.queries)
+    elif args.command == 'worlds':
+        bench_worlds(args.count, args.size, args.budget, args.accesses, args.skew)
+    elif args.command == 'search':
+        bench_search(args.size, args.regions, args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+# Room types are stored as small integer codes; ROOM_TYPES[code] gives the map letter
+ROOM_TYPES = ' SDQME'
+EMPTY, SINGLE, DOUBLE, QUAD, MULTI, ENTRY = range(len(ROOM_TYPES))
+ROOM_TYPE_CODES = {room_type: code for code, room_type in enumerate(ROOM_TYPES)}
+
+# Connections are stored as one exit bit per direction, 4 bits per cell
+NORTH, EAST, SOUTH, WEST = 1, 2, 4, 8
+# (d_row, d_col) -> exit bit
+DIRECTION_BITS = {(-1, 0): NORTH, (0, 1): EAST, (1, 0): SOUTH, (0, -1): WEST}
+BIT_OFFSETS = {bit: offset for offset, bit in DIRECTION_BITS.items()}
+OPPOSITE = {NORTH: SOUTH, SOUTH: NORTH, EAST: WEST, WEST: EAST}
+COMPASS_BITS = {'N': NORTH, 'E': EAST, 'S': SOUTH, 'W': WEST}
+# exit bits -> (d_row, d_col) of every exit, for neighbour iteration without testing bits
+EXIT_OFFSETS = [tuple(offset for offset, bit in DIRECTION_BITS.items() if exits & bit) for exits in range(16)]
+DIRECTION_NAMES = {NORTH: 'North', EAST: 'East', SOUTH: 'South', WEST: 'West'}
+
+
+def region_dtype(num_regions):
+    # -1 marks void cells, so int8 holds up to 127 regions
+    return 'int8' if num_regions <= 127 else 'int16'
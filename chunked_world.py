@@ -0,0 +1,146 @@
+import hashlib
+import random
+from collections import OrderedDict
+
+from cells import ENTRY, NORTH, EAST, SOUTH, WEST, COMPASS_BITS, BIT_OFFSETS, OPPOSITE
+from grid import Grid
+from map import Map
+
+
+def derive_seed(*parts):
+    digest = hashlib.sha256(":".join(str(part) for part in parts).encode()).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+
+class ChunkedMap:
+    # An unbounded world made of square chunks, each an ordinary Grid and Map generated
+    # from its own seed when the player comes near it. Chunks are joined through one
+    # pair of "E" rooms per seam, so evicted chunks regenerate identically. A library API for
+    # worlds too big to generate up front; main.py and the UI play a single Map.
+    def __init__(self, seed=None, chunk_size=24, regions_per_chunk=5, genre="fantasy",
+                 max_chunks=64, memory_limit=None, prefetch_margin=3):
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.chunk_size = chunk_size
+        self.regions_per_chunk = regions_per_chunk
+        self.genre = genre
+        self.max_chunks = max_chunks
+        self.memory_limit = memory_limit
+        self.prefetch_margin = prefetch_margin
+        self.chunks = OrderedDict()  # (chunk_x, chunk_y) -> Map, least recently used first
+        self.generated_chunks = 0
+        self.evicted_chunks = 0
+        start = self.get_chunk(0, 0).get_player_location()
+        self.player_position = (start.x, start.y)
+        self.prefetch()
+
+    def chunk_of(self, x, y):
+        return (x // self.chunk_size, y // self.chunk_size)
+
+    def seam_offset(self, chunk_x, chunk_y, side):
+        # Row (side 'E') or column (side 'S') where a chunk meets its east or south neighbour
+        return derive_seed(self.seed, 'seam', chunk_x, chunk_y, side) % self.chunk_size
+
+    def generate_chunk(self, chunk_x, chunk_y):
+        size = self.chunk_size
+        seams = (
+            (self.seam_offset(chunk_x, chunk_y, 'E'), size - 1, EAST),
+            (self.seam_offset(chunk_x - 1, chunk_y, 'E'), 0, WEST),
+            (size - 1, self.seam_offset(chunk_x, chunk_y, 'S'), SOUTH),
+            (0, self.seam_offset(chunk_x, chunk_y - 1, 'S'), NORTH),
+        )
+        grid = ChunkGrid(size, self.regions_per_chunk, derive_seed(self.seed, chunk_x, chunk_y), seams)
+        self.generated_chunks += 1
+        # Only the rooms the player looks at are named; a regenerated chunk names them identically
+        return Map(grid, genre=self.genre, verbose=False, lazy_names=True)
+
+    def get_chunk(self, chunk_x, chunk_y):
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = self.generate_chunk(chunk_x, chunk_y)
+        else:
+            self.chunks.move_to_end(key)
+        return chunk
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def evict(self, pinned):
+        # Drop least recently used chunks beyond the chunk count or memory cap
+        for key in list(self.chunks):
+            over_count = len(self.chunks) > self.max_chunks
+            over_memory = self.memory_limit is not None and self.nbytes > self.memory_limit
+            if not (over_count or over_memory):
+                break
+            if key not in pinned:
+                del self.chunks[key]
+                self.evicted_chunks += 1
+
+    def prefetch(self):
+        # Generate the neighbouring chunks the player is close to, including diagonals at corners
+        x, y = self.player_position
+        chunk_x, chunk_y = self.chunk_of(x, y)
+        local_x, local_y = x - chunk_x * self.chunk_size, y - chunk_y * self.chunk_size
+        margin = self.prefetch_margin
+        steps_x = [0] + [-1] * (local_x < margin) + [1] * (local_x >= self.chunk_size - margin)
+        steps_y = [0] + [-1] * (local_y < margin) + [1] * (local_y >= self.chunk_size - margin)
+        needed = [(chunk_x + dx, chunk_y + dy) for dx in steps_x for dy in steps_y]
+        for key in needed:
+            self.get_chunk(*key)
+        self.chunks.move_to_end((chunk_x, chunk_y))
+        self.evict(set(needed))
+
+    def get_room(self, x, y):
+        # Returns the chunk-local Room view of world cell (x, y)
+        chunk_x, chunk_y = self.chunk_of(x, y)
+        chunk = self.get_chunk(chunk_x, chunk_y)
+        return chunk.get_room(x - chunk_x * self.chunk_size, y - chunk_y * self.chunk_size)
+
+    def get_exits(self, x, y):
+        return self.get_room(x, y).exits
+
+    def get_player_location(self):
+        return self.get_room(*self.player_position)
+
+    def move_player(self, direction):
+        x, y = self.player_position
+        if not self.get_exits(x, y) & COMPASS_BITS[direction]:
+            return "You can't go that way."
+        dx, dy = Map.direction_mapping[direction]
+        self.player_position = (x + dx, y + dy)
+        self.prefetch()
+        return f"You have moved {direction}."
+
+
+class ChunkGrid(Grid):
+    # A chunk's grid: solid edges, and a single "E" room at each seam cell joined across it
+    def __init__(self, size, num_regions, seed, seams):
+        self.seams = seams
+        # Seam cells stay single rooms, so an "E" room never takes one cell of a larger room
+        self.reserved = list(dict.fromkeys((row, col) for row, col, _ in seams))
+        super().__init__(size, size, num_regions, seed=seed, uneven_edges=False)
+        for row, col, bit in seams:
+            # The same rule as mark_unique_edge_rooms/connect_E_rooms: one entry room per border,
+            # joined across it and linked into its own region
+            self.room_grid[row, col] = ENTRY
+            self.exits[row, col] |= bit
+            self.link_entry_rooms((row, col))
+
+    def drop_cut_off_cells(self):
+        super().drop_cut_off_cells()
+        for row, col, bit in self.seams:
+            self.fill_seam_cell(row, col, bit)
+
+    def fill_seam_cell(self, row, col, bit):
+        # A seam cell dropped as cut off from its region joins it again, through the cells inward
+        # from it to the nearest one that is still part of a region. Rooms are fitted afterwards.
+        d_row, d_col = BIT_OFFSETS[OPPOSITE[bit]]
+        path = []
+        while self.grid[row, col] == -1:
+            path.append((row, col))
+            row, col = row + d_row, col + d_col
+            if not (0 <= row < self.height and 0 <= col < self.width):
+                raise ValueError("no region cell inward from seam cell %s" % (path[0],))
+        for cell in path:
+            self.grid[cell] = self.grid[row, col]
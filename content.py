@@ -0,0 +1,124 @@
+import hashlib
+import json
+import marshal
+import os
+import sys
+import tempfile
+from functools import lru_cache
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.json')
+COMPILED_VERSION = 1
+
+
+class GenreContent:
+    # Index tables for one genre: its region names and, per (region, room type), the ids of
+    # the major types to draw from
+    def __init__(self, name, regions, major_types):
+        self.name = name
+        self.regions = regions
+        self.major_types = major_types  # (region, room type) -> [major type id, ...]
+
+
+class Content:
+    # Flat, interned tables of every room name and description in data.json. Each major
+    # type owns a contiguous range of each table, so worlds refer to text by index and
+    # maps draw rooms by index without copying string lists.
+    def __init__(self, names, descs, major_types, genres, data_hash):
+        self.names = [sys.intern(name) for name in names]
+        self.descs = [sys.intern(desc) for desc in descs]
+        # major type id -> (genre, region, room type, major type, name start, name stop, desc start, desc stop)
+        self.major_types = major_types
+        self.genre_tables = genres  # genre -> (regions, {(region, room type): [major type id, ...]})
+        self.data_hash = data_hash
+        self.name_ids = {}
+        self.desc_ids = {}
+        for string_id, name in enumerate(self.names):
+            self.name_ids.setdefault(name, string_id)
+        for string_id, desc in enumerate(self.descs):
+            self.desc_ids.setdefault(desc, string_id)
+        # Ids are signed: -1 means unnamed and lower values refer to a map's own strings
+        self.id_dtype = 'int16' if max(len(self.names), len(self.descs)) < 2 ** 15 else 'int32'
+        self.genres = {}
+
+    @classmethod
+    def from_data(cls, data, data_hash):
+        names, descs, major_types, genres = [], [], [], {}
+        for genre, genre_data in data['genres'].items():
+            regions = genre_data.get('regions', {})
+            tables = {}
+            for region, room_types in regions.items():
+                for room_type, room_data in room_types.items():
+                    major_type_ids = tables[(region, room_type)] = []
+                    for major_type, major_data in room_data.items():
+                        major_type_ids.append(len(major_types))
+                        major_types.append((genre, region, room_type, major_type,
+                                            len(names), len(names) + len(major_data['name']),
+                                            len(descs), len(descs) + len(major_data['desc'])))
+                        names.extend(major_data['name'])
+                        descs.extend(major_data['desc'])
+            genres[genre] = (list(regions), tables)
+        return cls(names, descs, major_types, genres, data_hash)
+
+    def to_compiled(self):
+        return marshal.dumps((COMPILED_VERSION, self.data_hash, self.names, self.descs,
+                              self.major_types, self.genre_tables))
+
+    @classmethod
+    def from_compiled(cls, blob, data_hash):
+        version, compiled_hash, names, descs, major_types, genres = marshal.loads(blob)
+        if version != COMPILED_VERSION or compiled_hash != data_hash:
+            return None
+        return cls(names, descs, major_types, genres, data_hash)
+
+    def playable_genres(self):
+        return [genre for genre, (regions, _) in self.genre_tables.items() if regions]
+
+    def genre(self, genre):
+        # Each genre's tables are assembled once and shared by every map
+        tables = self.genres.get(genre)
+        if tables is None:
+            if genre not in self.genre_tables:
+                raise ValueError(f"unknown genre {genre!r}")
+            regions, major_types = self.genre_tables[genre]
+            if not regions:
+                raise ValueError(f"genre {genre!r} has no room data in data.json")
+            tables = self.genres[genre] = GenreContent(genre, regions, major_types)
+        return tables
+
+    def name_range(self, major_type):
+        return self.major_types[major_type][4:6]
+
+    def desc_range(self, major_type):
+        return self.major_types[major_type][6:8]
+
+
+def compiled_path(path):
+    return os.path.splitext(path)[0] + '.compiled'
+
+
+@lru_cache(maxsize=None)
+def load_content(path=DATA_PATH):
+    # Loads the pre-compiled tables when they match data.json, and compiles them otherwise
+    with open(path, 'rb') as file:
+        raw = file.read()
+    data_hash = hashlib.sha256(raw).hexdigest()
+    try:
+        with open(compiled_path(path), 'rb') as file:
+            content = Content.from_compiled(file.read(), data_hash)
+        if content is not None:
+            return content
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+    content = Content.from_data(json.loads(raw), data_hash)
+    save_compiled(content, compiled_path(path))
+    return content
+
+
+def save_compiled(content, path):
+    try:
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as file:
+            file.write(content.to_compiled())
+        os.replace(temp_path, path)
+    except OSError:
+        pass  # a read-only install just compiles data.json on each start
@@ -0,0 +1,187 @@
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from cells import ROOM_TYPES, EMPTY, EAST, SOUTH
+from world_format import WorldFile
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Rows of cells converted per step; bounded by pixels so wide maps use small steps
+CHUNK_BYTES = 32 * 1024 * 1024
+ASCII_TABLE = np.frombuffer(ROOM_TYPES.encode(), dtype=np.uint8)
+
+
+def world_arrays(source):
+    # (room types, exits, regions, region colours) of a Map, a Grid or a WorldFile. A WorldFile
+    # opened on a saved world maps its arrays from disk, so only the rows being written are read.
+    if isinstance(source, WorldFile):
+        arrays = source.arrays
+        return arrays['room_types'], arrays['exits'], arrays['regions'], source.metadata['colors']
+    if hasattr(source, 'room_grid'):
+        return source.room_grid, source.exits, source.grid, None
+    return source.room_types, source.exits, source.regions, source.generated_colors
+
+
+def row_chunks(height, row_bytes):
+    rows = max(1, CHUNK_BYTES // max(row_bytes, 1))
+    for start in range(0, height, rows):
+        yield start, min(start + rows, height)
+
+
+def ascii_chunk(room_types, exits, last_row):
+    # The same text as Grid.print_map for a block of rows: a line of rooms and east connectors,
+    # then a line of south connectors, each cell followed by one character
+    rows, width = room_types.shape
+    text = np.full((rows, 2, width * 2 + 1), ord(' '), dtype=np.uint8)
+    text[:, :, -1] = ord('\n')
+    text[:, 0, 0:-1:2] = ASCII_TABLE[room_types]
+    text[:, 0, 1:-1:2][(exits & EAST) != 0] = ord('-')
+    text[:, 1, 0:-1:2][(exits & SOUTH) != 0] = ord('|')
+    text = text.reshape(rows * 2, -1)
+    # print_map has no connector line after the last row
+    return text[:-1] if last_row else text
+
+
+def write_ascii(source, file):
+    # Writes the map to a binary or text file object a block of rows at a time
+    room_types, exits = world_arrays(source)[:2]
+    height, width = room_types.shape
+    binary = not hasattr(file, 'encoding')
+    for start, stop in row_chunks(height, width * 4):
+        text = ascii_chunk(room_types[start:stop], exits[start:stop], stop == height).tobytes()
+        file.write(text if binary else text.decode('ascii'))
+
+
+def tile_pixels(colors, cell_size):
+    # RGB pixels of every atlas tile, drawn by the map renderer on an off-screen surface, so
+    # exported images use exactly the colours, borders and labels of visualize_map
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    from renderer import TileAtlas
+    pygame.font.init()
+    atlas = TileAtlas([(255, 255, 255)] + [tuple(color) for color in colors], cell_size)
+    pixels = pygame.surfarray.array3d(atlas.surface).transpose(1, 0, 2)
+    return np.stack([pixels[area.y:area.bottom, area.x:area.right] for area in atlas.areas])
+
+
+class ImageRows:
+    # Converts blocks of map rows into pixel rows, the layout of MapRenderer.draw without the player
+    def __init__(self, source, cell_size=4):
+        from renderer import VOID_TILE, tile_index
+        self.room_types, self.exits, self.regions, colors = world_arrays(source)
+        if colors is None:
+            raise ValueError("image export needs region colours; pass a Map or a saved world")
+        self.cell_size = cell_size
+        self.tiles = tile_pixels(colors, cell_size)
+        self.void_tile = VOID_TILE
+        self.tile_index = tile_index
+        height, width = self.room_types.shape
+        self.size = ((width * 2 - 1) * cell_size, (height * 2 - 1) * cell_size)
+
+    def window(self, top, bottom, left, right):
+        # Pixel rows for cells [top, bottom) x [left, right), trimmed like the full image at its
+        # right and bottom edges
+        height, width = self.room_types.shape
+        cell, pitch = self.cell_size, self.cell_size * 2
+        regions = self.regions[top:bottom, left:right].astype(np.int32)
+        room_types = self.room_types[top:bottom, left:right]
+        exits = self.exits[top:bottom, left:right]
+        rooms = np.where((regions == -1) | (room_types == EMPTY), self.void_tile,
+                         self.tile_index(regions, room_types))
+        connectors = self.tile_index(regions, EMPTY)
+        east = np.where((exits & EAST) != 0, connectors, self.void_tile)
+        south = np.where((exits & SOUTH) != 0, connectors, self.void_tile)
+        if right == width:
+            east[:, -1] = self.void_tile
+        if bottom == height:
+            south[-1, :] = self.void_tile
+        rows, columns = rooms.shape
+        image = np.zeros((rows, 2, cell, columns, 2, cell, 3), dtype=np.uint8)
+        image[:, 0, :, :, 0] = self.tiles[rooms].transpose(0, 2, 1, 3, 4)
+        image[:, 0, :, :, 1] = self.tiles[east].transpose(0, 2, 1, 3, 4)
+        image[:, 1, :, :, 0] = self.tiles[south].transpose(0, 2, 1, 3, 4)
+        image = image.reshape(rows * pitch, columns * pitch, 3)
+        return image[:rows * pitch - (cell if bottom == height else 0),
+                     :columns * pitch - (cell if right == width else 0)]
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def write_png(rows, size, file, level=6):
+    # Streams an 8-bit RGB PNG from an iterable of pixel row blocks, compressing as it goes
+    width, height = size
+    file.write(PNG_SIGNATURE + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+    compressor = zlib.compressobj(level)
+    for block in rows:
+        # Every scanline starts with filter type 0 (none)
+        scanlines = np.zeros((block.shape[0], width * 3 + 1), dtype=np.uint8)
+        scanlines[:, 1:] = block.reshape(block.shape[0], -1)
+        data = compressor.compress(scanlines.tobytes())
+        if data:
+            file.write(png_chunk(b'IDAT', data))
+    file.write(png_chunk(b'IDAT', compressor.flush()) + png_chunk(b'IEND', b''))
+
+
+def write_image(source, file, cell_size=4, level=6):
+    # The whole map as one PNG, written a block of map rows at a time
+    image = ImageRows(source, cell_size)
+    height, width = image.room_types.shape
+    row_bytes = (2 * cell_size) ** 2 * width * 3 * 4
+    blocks = (image.window(start, stop, 0, width) for start, stop in row_chunks(height, row_bytes))
+    write_png(blocks, image.size, file, level)
+    return image.size
+
+
+def write_image_tiles(source, directory, tile_cells=256, cell_size=4, level=6):
+    # The map as a directory of PNG tiles of tile_cells x tile_cells cells, named
+    # <row>_<column>.png, for viewers that load only the part of the map on screen
+    image = ImageRows(source, cell_size)
+    height, width = image.room_types.shape
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for top in range(0, height, tile_cells):
+        for left in range(0, width, tile_cells):
+            bottom, right = min(top + tile_cells, height), min(left + tile_cells, width)
+            pixels = image.window(top, bottom, left, right)
+            path = os.path.join(directory, f"{top // tile_cells}_{left // tile_cells}.png")
+            with open(path, 'wb') as file:
+                write_png([pixels], (pixels.shape[1], pixels.shape[0]), file, level)
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a saved world as ASCII or PNG without loading it whole")
+    parser.add_argument('world', help="a .world file written by generate.py or save_world")
+    parser.add_argument('--ascii', help="text output path, - for stdout")
+    parser.add_argument('--png', help="write the whole map as one PNG")
+    parser.add_argument('--tiles', help="write the map as a directory of PNG tiles")
+    parser.add_argument('--tile-cells', type=int, default=256, help="cells per side of each tile")
+    parser.add_argument('--cell-size', type=int, default=4, help="pixels per cell side")
+    parser.add_argument('--level', type=int, default=6, help="zlib compression level")
+    args = parser.parse_args()
+    world = WorldFile.open(args.world)
+    start = time.perf_counter()
+    if args.ascii == '-':
+        write_ascii(world, sys.stdout.buffer)
+    elif args.ascii:
+        with open(args.ascii, 'wb') as file:
+            write_ascii(world, file)
+    if args.png:
+        with open(args.png, 'wb') as file:
+            write_image(world, file, args.cell_size, args.level)
+    if args.tiles:
+        write_image_tiles(world, args.tiles, args.tile_cells, args.cell_size, args.level)
+    if args.ascii != '-':
+        print(f"exported {world.width}x{world.height} cells in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
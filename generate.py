@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import time
+from functools import partial
+from multiprocessing import Pool
+
+from content import load_content
+from profiler import GenerationProfile
+from world import build_world
+from world_cache import WorldCache
+from world_format import save_world
+
+
+def generate_one(seed, width, height, num_regions, genre, out_dir, cache_dir=None, output_format='binary',
+                 profile=False, profile_allocations=True):
+    start = time.perf_counter()
+    cache = WorldCache(cache_dir) if cache_dir else None
+    generation_profile = GenerationProfile(profile_allocations) if profile else None
+    game_map = build_world(seed, width, height, num_regions, genre, cache=cache, profile=generation_profile)
+    generated = time.perf_counter() - start
+    if generation_profile is not None:
+        with open(os.path.join(out_dir, f"world_{seed}.profile.json"), 'w') as file:
+            file.write(generation_profile.to_json(indent=2))
+    if output_format == 'json':
+        with open(os.path.join(out_dir, f"world_{seed}.json"), 'w') as file:
+            json.dump(game_map.to_dict(), file)
+    else:
+        save_world(game_map, os.path.join(out_dir, f"world_{seed}.world"))
+    return seed, generated, time.perf_counter() - start, game_map.width * game_map.height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate maps headlessly across a process pool")
+    parser.add_argument('--seeds', type=int, nargs=2, metavar=('START', 'STOP'), default=(0, 10),
+                        help="half-open seed range, one map per seed")
+    parser.add_argument('--size', type=int, help="width and height of each map")
+    parser.add_argument('--width', type=int)
+    parser.add_argument('--height', type=int)
+    parser.add_argument('--regions', type=int, default=5)
+    parser.add_argument('--genre', default="fantasy", choices=load_content().playable_genres())
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default="worlds")
+    parser.add_argument('--format', choices=('binary', 'json'), default='binary')
+    parser.add_argument('--cache', help="directory of cached worlds to load from and add to")
+    parser.add_argument('--quiet', action='store_true', help="only print the summary")
+    parser.add_argument('--profile', action='store_true',
+                        help="write per-stage timings, allocations and counters next to each map")
+    parser.add_argument('--no-allocations', action='store_true',
+                        help="with --profile, build each map once and leave out the allocations")
+    args = parser.parse_args()
+    width = args.width or args.size
+    height = args.height or args.size
+    os.makedirs(args.out, exist_ok=True)
+    seeds = range(*args.seeds)
+    job = partial(generate_one, width=width, height=height, num_regions=args.regions,
+                  genre=args.genre, out_dir=args.out, cache_dir=args.cache, output_format=args.format,
+                  profile=args.profile, profile_allocations=not args.no_allocations)
+    start = time.perf_counter()
+    total_cells = 0
+    with Pool(args.workers) as pool:
+        for seed, generated, written, cells in pool.imap_unordered(job, seeds):
+            total_cells += cells
+            if not args.quiet:
+                print(f"seed {seed}: {cells} cells, generated in {generated:.3f}s, written in {written - generated:.3f}s")
+    elapsed = time.perf_counter() - start
+    print(f"{len(seeds)} maps in {elapsed:.2f}s with {args.workers} workers: "
+          f"{len(seeds) / elapsed:.1f} maps/s, {total_cells / elapsed:.0f} cells/s")
+
+
+if __name__ == '__main__':
+    main()
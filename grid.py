@@ -1,319 +1,480 @@
-from collections import deque
 import random
-from random import shuffle
-from scipy.spatial import Voronoi
+import sys
 import numpy as np
-from itertools import chain
-import pygame
-import cProfile
+from cells import (ROOM_TYPES, EMPTY, SINGLE, DOUBLE, QUAD, MULTI, ENTRY,
+                   EAST, SOUTH, DIRECTION_BITS, BIT_OFFSETS, EXIT_OFFSETS, OPPOSITE, region_dtype)
+
+# Room types drawn per cell, with their chances; Q is first so the fallback draw can skip it
+ROOM_TYPE_ORDER = (QUAD, SINGLE, DOUBLE, MULTI)
+ROOM_CHANCES = (0.1, 0.35, 0.3, 0.25)
+ROOM_CHANCES_WITHOUT_Q = tuple(chance / sum(ROOM_CHANCES[1:]) for chance in ROOM_CHANCES[1:])
+MAX_QUADS = 2
+# Per-region random streams: room type draws and "S" room links
+FIT_STREAM, LINK_STREAM = 0, 1
+# (d_row, d_col) cells of each room shape, in the order they are tried
+ROOM_SHAPES = {
+    SINGLE: [((0, 0),)],
+    DOUBLE: [((0, 0), (0, 1)), ((0, 0), (1, 0))],
+    QUAD: [((0, 0), (0, 1), (1, 0), (1, 1))],
+    MULTI: [((0, 0), (0, 1), (0, 2)), ((0, 0), (1, 0), (2, 0)), ((0, 0), (1, 0), (1, 1)), ((0, 0), (0, 1), (1, 1))],
+}
+
 
 class Grid:
-    def __init__(self):
-        self.height = random.randint(22, 25)
-        self.width = random.randint(22, 25)
-        self.grid = [[0 for _ in range(self.width)] for _ in range(self.height)]
-        self.room_grid = [[' ' for _ in range(self.width)] for _ in range(self.height)]
-        unique_regions = set(chain.from_iterable(self.grid))
-        self.room_counts = {region: {'S': 0, 'D': 0, 'M': 0, 'Q': 0} for region in range(5)}
-        self.regions = [None for _ in range(5)]
-        self.directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        self.connections = {}
-        self.generate_voronoi_grid()
-        self.make_uneven_edges()
-        self.fit_rooms()
-        self.mark_unique_edge_rooms()
-        self.make_connections()
+    # (row, col) cells fit_rooms keeps as single rooms, for a subclass to fill in
+    reserved = ()
+
+    def __init__(self, width=None, height=None, num_regions=5, seed=None, uneven_edges=True, profile=None,
+                 workers=None):
+        # Every random draw goes through these generators, so a seed fixes the whole grid
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.random = random.Random(self.seed)
+        self.np_random = np.random.default_rng(self.seed)
+        self.height = height if height is not None else self.random.randint(22, 25)
+        self.width = width if width is not None else self.random.randint(22, 25)
+        self.num_regions = num_regions
+        # Region per cell (-1 for void), room type code per cell and exit bits per cell
+        self.grid = np.zeros((self.height, self.width), dtype=region_dtype(num_regions))
+        self.room_grid = np.zeros((self.height, self.width), dtype=np.int8)
+        self.exits = np.zeros((self.height, self.width), dtype=np.uint8)
+        self.room_counts = {region: {'S': 0, 'D': 0, 'M': 0, 'Q': 0} for region in range(self.num_regions)}
+        self.islands_stitched = 0
+        self.profile = profile
+        self.workers = workers
+        self.run_stage(self.generate_voronoi_grid)
+        if uneven_edges:
+            self.run_stage(self.make_uneven_edges)
+        self.run_stage(self.drop_cut_off_cells)
+        if workers is not None and workers > 1:
+            # Gives the same grid as the serial stages, whatever the number of workers
+            self.run_stage(self.generate_regions_in_parallel)
+            self.run_stage(self.connect_E_rooms)
+            self.run_stage(self.connect_isolated_islands)
+        else:
+            self.run_stage(self.fit_rooms)
+            self.run_stage(self.mark_unique_edge_rooms)
+            self.make_connections()
+        if profile is not None:
+            profile.record_rooms(self)
+            profile.counters['islands_stitched'] = self.islands_stitched
         self.current_cell = None
 
-    def make_uneven_edges(self):
-        for row in range(len(self.grid)):
-            for col in range(len(self.grid[0])):
-                if row == 0 or row == len(self.grid) - 1 or col == 0 or col == len(self.grid[0]) - 1:
-                    if random.random() < 0.2:
-                        self.grid[row][col] = -1
-
-    def divide_grid(self):
-        total_cells = sum([row.count(0) for row in self.grid])
-        region_sizes = [random.randint(total_cells // 10, total_cells // 6) for _ in range(5)]
-        random.shuffle(region_sizes)
-        start_row, start_col = random.randint(1, self.height - 2), random.randint(1, self.width - 2)
-        self.grid[start_row][start_col] = 1
-        region_index = 0
-        queue = deque([(start_row, start_col, region_index)])
-        while queue and region_index < 5:
-            row, col, region_index = queue.popleft()
-            for dr, dc in self.directions:
-                new_row, new_col = row + dr, col + dc
-                if (0 < new_row < self.height - 1) and (0 < new_col < self.width - 1) and self.grid[new_row][new_col] == 0:
-                    self.grid[new_row][new_col] = region_index + 1
-                    region_sizes[region_index] -= 1
-                    if region_sizes[region_index] <= 0:
-                        region_index += 1
-                        if region_index >= 5:
-                            break
-                    queue.append((new_row, new_col, region_index))
-
-    def fit_s(self, row, col, region):
-        if self.grid[row][col] == region and not self.is_cell_occupied(row, col):
-            self.room_grid[row][col] = 'S'
-            self.room_counts[region]['S'] += 1
-            return True
-        return False
-
-    def fit_d(self, row, col, region):
-        if (col + 1 < self.width and
-            self.grid[row][col] == region and self.grid[row][col + 1] == region and
-            not self.is_cell_occupied(row, col) and not self.is_cell_occupied(row, col + 1)):
-            self.room_grid[row][col] = 'D'
-            self.room_grid[row][col + 1] = 'D'
-            self.room_counts[region]['D'] += 1
-            return True
-        elif (row + 1 < self.height and
-            self.grid[row][col] == region and self.grid[row + 1][col] == region and
-            not self.is_cell_occupied(row, col) and not self.is_cell_occupied(row + 1, col)):
-            self.room_grid[row][col] = 'D'
-            self.room_grid[row + 1][col] = 'D'
-            self.room_counts[region]['D'] += 1
-            return True
-        return False
-
-    def fit_q(self, row, col, region):
-        if (row + 1 < self.height and col + 1 < self.width and
-            self.grid[row][col] == region and self.grid[row + 1][col] == region and
-            self.grid[row][col + 1] == region and self.grid[row + 1][col + 1] == region and
-            not self.is_cell_occupied(row, col) and not self.is_cell_occupied(row + 1, col) and
-            not self.is_cell_occupied(row, col + 1) and not self.is_cell_occupied(row + 1, col + 1)):
-            self.room_grid[row][col] = 'Q'
-            self.room_grid[row + 1][col] = 'Q'
-            self.room_grid[row][col + 1] = 'Q'
-            self.room_grid[row + 1][col + 1] = 'Q'
-            self.room_counts[region]['Q'] += 1
-            return True
-        return False
-
-    def fit_m(self, row, col, region):
-        shapes = [[(0, 0), (0, 1), (0, 2)], [(0, 0), (1, 0), (2, 0)], [(0, 0), (1, 0), (1, 1)], [(0,0), (0,1), (1,1)]]
-        for shape in shapes:
-            if all(0 <= row + dr < self.height and 0 <= col + dc < self.width and 
-                self.grid[row + dr][col + dc] == region and 
-                not self.is_cell_occupied(row + dr, col + dc) for dr, dc in shape):
-                for dr, dc in shape:
-                    self.room_grid[row + dr][col + dc] = 'M'
-                    self.room_counts[region]['M'] += 1
-                return True
-        return False
+    @classmethod
+    def for_region(cls, seed, num_regions, regions, region):
+        # A grid over one region's bounding box with every other cell void, so that region's
+        # rooms and inner links can be generated on their own
+        part = cls.__new__(cls)
+        part.seed = seed
+        part.num_regions = num_regions
+        part.height, part.width = regions.shape
+        part.grid = np.where(regions == region, regions, -1).astype(regions.dtype)
+        part.room_grid = np.zeros(regions.shape, dtype=np.int8)
+        part.exits = np.zeros(regions.shape, dtype=np.uint8)
+        part.room_counts = {region: {'S': 0, 'D': 0, 'M': 0, 'Q': 0}}
+        part.profile = None
+        return part
 
-    def fit_rooms(self):
-        self.room_grid = [[' ' for _ in range(self.width)] for _ in range(self.height)]
-        room_type_counts = {region: {'Q': 0, 'S': 0, 'D': 0, 'M': 0} for region in range(5)}
-        for region in range(0, 5):
-            for row in range(self.height):
-                for col in range(self.width):
-                    if self.grid[row][col] != region:
-                        continue
-                    room_type = self.choose_room_type()
-                    while room_type == 'Q' and room_type_counts[region]['Q'] >= 2:
-                        chances_without_q = {'S': 0.35, 'D': 0.3, 'M': 0.25}
-                        room_type = random.choices(list(chances_without_q.keys()), weights=list(chances_without_q.values()))[0]
-                    fitting_method = getattr(self, f'fit_{room_type.lower()}')
-                    if fitting_method(row, col, region):
-                        room_type_counts[region][room_type] += 1
-                        continue
+    def run_stage(self, stage):
+        # Stages run bare unless a profiler.GenerationProfile was passed in
+        if self.profile is None:
+            return stage()
+        result = self.profile.run(stage.__name__, stage)
+        self.profile.record_connections(stage.__name__, self.exits)
+        return result
+
+    def make_uneven_edges(self):
         for row in range(self.height):
             for col in range(self.width):
-                if self.room_grid[row][col] == ' ':
-                    region = self.grid[row][col]
-                    if not region == -1:
-                        self.fit_s(row, col, region)
+                if row == 0 or row == self.height - 1 or col == 0 or col == self.width - 1:
+                    if self.random.random() < 0.2:
+                        self.grid[row, col] = -1
+
+    def drop_cut_off_cells(self):
+        # Voiding edge cells, or the Voronoi split itself, can leave a cell or two that only
+        # touches the rest of its region diagonally, where no connection can reach it. Those
+        # pieces become void as well, so every region is one orthogonally connected piece.
+        labels = self.pieces(self.same_region_neighbours(EAST), self.same_region_neighbours(SOUTH))
+        regions = self.grid.ravel()
+        inside = np.flatnonzero(regions != -1)
+        sizes = np.bincount(labels[inside], minlength=labels.max() + 1)
+        label_regions = np.full(len(sizes), -1, dtype=np.intp)
+        label_regions[labels[inside]] = regions[inside]
+        # The largest piece of each region stays
+        keep = np.zeros(self.num_regions, dtype=np.intp)
+        best = np.zeros(self.num_regions, dtype=np.intp)
+        for label in np.flatnonzero(label_regions != -1).tolist():
+            region = label_regions[label]
+            if sizes[label] > best[region]:
+                best[region], keep[region] = sizes[label], label
+        cut_off = inside[labels[inside] != keep[regions[inside]]]
+        self.grid.ravel()[cut_off] = -1
+        # A whole region can be walled off from the others by void cells as well. Only the
+        # largest group of regions that touch each other stays, so every room can be reached
+        # through the "E" rooms between them.
+        land = self.grid != -1
+        east = np.zeros_like(land)
+        east[:, :-1] = land[:, :-1] & land[:, 1:]
+        south = np.zeros_like(land)
+        south[:-1] = land[:-1] & land[1:]
+        labels = self.pieces(east, south)
+        inside = np.flatnonzero(land)
+        if len(inside):
+            largest = np.argmax(np.bincount(labels[inside]))
+            self.grid.ravel()[inside[labels[inside] != largest]] = -1
+
+    def pieces(self, east, south):
+        # Connected pieces of the cells, joined to the cell to their east or south where masked;
+        # one label per flat cell index
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+        size = self.height * self.width
+        cells = np.arange(size).reshape(self.height, self.width)
+        sources = np.concatenate((cells[east], cells[south]))
+        targets = np.concatenate((cells[east] + 1, cells[south] + self.width))
+        graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(size, size))
+        return connected_components(graph, directed=False)[1]
+
+    def fit_rooms(self):
+        # Every cell of a region draws a room type and tries to place that room with the cell as
+        # its top-left corner, in row-major order. A shape only covers cells of the anchor's
+        # region, so regions never block each other and one pass serves all of them. Where each
+        # shape fits is precomputed with sliding windows and the type draws are made in one
+        # batch; only the occupancy check has to follow the scan order.
+        self.room_grid.fill(EMPTY)
+        height, width = self.height, self.width
+        cells = np.flatnonzero(self.grid.ravel() != -1)
+        fit_bits = np.zeros(height * width, dtype=np.uint8)
+        placements = []  # per drawn type: [(fit bit, flat offsets of the shape), ...] in the order they are tried
+        bit = 1
+        for room_type in ROOM_TYPE_ORDER:
+            shapes = []
+            for shape in ROOM_SHAPES[room_type]:
+                fit_bits[self.shape_fits(shape).ravel()] |= bit
+                shapes.append((bit, [d_row * width + d_col for d_row, d_col in shape]))
+                bit <<= 1
+            placements.append(shapes)
+        regions = self.grid.ravel()[cells]
+        choices = np.empty(len(cells), dtype=np.intp)
+        # Once a region has MAX_QUADS quads, a Q draw is replaced by a draw without Q
+        fallbacks = np.empty(len(cells), dtype=np.intp)
+        for region, members in self.split_by_region(regions):
+            rng = self.region_rng(region, FIT_STREAM)
+            choices[members] = rng.choice(len(ROOM_TYPE_ORDER), size=len(members), p=ROOM_CHANCES)
+            fallbacks[members] = rng.choice(len(ROOM_TYPE_ORDER) - 1, size=len(members), p=ROOM_CHANCES_WITHOUT_Q) + 1
+        occupied = bytearray(height * width)
+        regions = regions.tolist()
+        placed = {region: [0] * len(ROOM_TYPE_ORDER) for region in np.unique(regions).tolist()}
+        for row, col in self.reserved:
+            occupied[row * width + col] = SINGLE
+            placed[int(self.grid[row, col])][1] += 1
+        for cell, choice, fallback, region, fits in zip(cells.tolist(), choices.tolist(), fallbacks.tolist(),
+                                                        regions, fit_bits[cells].tolist()):
+            if occupied[cell]:
+                continue
+            counts = placed[region]
+            if choice == 0 and counts[0] >= MAX_QUADS:
+                choice = fallback
+            code = ROOM_TYPE_ORDER[choice]
+            for bit, offsets in placements[choice]:
+                if fits & bit and not any(occupied[cell + offset] for offset in offsets):
+                    for offset in offsets:
+                        occupied[cell + offset] = code
+                    counts[choice] += 1
+                    break
+        room_grid = np.frombuffer(occupied, dtype=np.int8).reshape(height, width)
+        # Cells left over become single rooms
+        leftover = (room_grid == EMPTY) & (self.grid != -1)
+        self.room_grid[...] = np.where(leftover, SINGLE, room_grid)
+        singles = np.bincount(self.grid[leftover].astype(np.intp), minlength=self.num_regions)
+        for region, counts in placed.items():
+            self.room_counts[region] = {'S': counts[1] + int(singles[region]), 'D': counts[2], 'M': counts[3], 'Q': counts[0]}
+
+    def region_rng(self, region, stream):
+        # Each region draws from its own streams, so a region's rooms and links do not depend on
+        # the other regions or on which process generates it
+        return np.random.default_rng((self.seed, region, stream))
+
+    def split_by_region(self, regions):
+        # (region, positions in regions) for every region, positions kept in their original order
+        regions = regions.astype(np.intp)
+        order = np.argsort(regions, kind='stable')
+        present, starts = np.unique(regions[order], return_index=True)
+        return zip(present.tolist(), np.split(order, starts[1:]))
 
-    def is_cell_occupied(self, row, col):
-        return self.room_grid[row][col] != ' '
+    def shape_fits(self, shape):
+        # Cells where a room of this shape, anchored at its top-left cell, lies inside one region
+        max_row = max(d_row for d_row, _ in shape)
+        max_col = max(d_col for _, d_col in shape)
+        anchors = self.grid[:self.height - max_row, :self.width - max_col]
+        fits = anchors != -1
+        for d_row, d_col in shape:
+            fits &= self.grid[d_row:self.height - max_row + d_row, d_col:self.width - max_col + d_col] == anchors
+        mask = np.zeros((self.height, self.width), dtype=bool)
+        mask[:self.height - max_row, :self.width - max_col] = fits
+        return mask
 
     def print_map(self):
-        for row in range(self.height):
-            row_line = ""
-            for col in range(self.width):
-                room = self.room_grid[row][col]
-                row_line += room
-                # Add horizontal connection if there's a connection to the right
-                if self.is_connected((row, col), (row, col + 1)):
-                    row_line += "-"
-                else:
-                    row_line += " "
-            print(row_line)
-            # Print vertical connections
-            if row < self.height - 1:
-                for col in range(self.width):
-                    if self.is_connected((row, col), (row + 1, col)):
-                        print("|", end=" ")
-                    else:
-                        print(" ", end=" ")
-                print()
+        from export import write_ascii
+        write_ascii(self, sys.stdout)
 
     def get_region(self, x, y):
-        return self.grid[y][x]
+        return self.grid[y, x]
     
     def get_room_type(self, x, y):
-        return self.room_grid[y][x]
-
-    def choose_room_type(self):
-        chances = {'Q': 0.1, 'S': 0.35, 'D': 0.3, 'M': 0.25}
-        return random.choices(list(chances.keys()), weights=list(chances.values()))[0]
+        return ROOM_TYPES[self.room_grid[y, x]]
 
     def generate_voronoi_grid(self):
-        points = np.random.rand(5, 2)
+        points = self.np_random.random((self.num_regions, 2))
         points[:, 0] *= self.width
         points[:, 1] *= self.height
-        vor = Voronoi(points)
-        for y in range(self.height):
-            for x in range(self.width):
-                min_dist = float('inf')
-                region = -1
-                for i, point in enumerate(vor.points):
-                    dist = (x - point[0]) ** 2 + (y - point[1]) ** 2
-                    if dist < min_dist:
-                        min_dist = dist
-                        region = i
-                self.grid[y][x] = region
+        self.grid = self.label_regions(points).astype(self.grid.dtype)
+
+    def label_regions(self, points, rows_per_chunk=1024):
+        # Nearest seed point for every cell, filled into an int array a band of rows at a time
+        from scipy.spatial import cKDTree  # scipy is imported on first generation, not at start-up
+        tree = cKDTree(points)
+        labels = np.empty((self.height, self.width), dtype=np.intp)
+        for start in range(0, self.height, rows_per_chunk):
+            stop = min(start + rows_per_chunk, self.height)
+            ys, cols = np.mgrid[start:stop, 0:self.width]
+            cells = np.column_stack((cols.ravel(), ys.ravel()))
+            _, nearest = tree.query(cells)
+            labels[start:stop] = nearest.reshape(stop - start, self.width)
+        return labels
 
     def mark_unique_edge_rooms(self):
-        borders = {}
-        for row in range(self.height - 1):
-            for col in range(self.width - 1):
-                if 0 <= self.grid[row][col] <= 4 and 0 <= self.grid[row][col + 1] <= 4 and self.grid[row][col] != self.grid[row][col + 1]:
-                    regions = tuple(sorted([self.grid[row][col], self.grid[row][col + 1]]))
-                    borders.setdefault(regions, []).append((row, col, 'H'))
-                if 0 <= self.grid[row][col] <= 4 and 0 <= self.grid[row + 1][col] <= 4 and self.grid[row][col] != self.grid[row + 1][col]:
-                    regions = tuple(sorted([self.grid[row][col], self.grid[row + 1][col]]))
-                    borders.setdefault(regions, []).append((row, col, 'V'))
-        for border_points in borders.values():
-            border_points.sort(key=lambda x: (x[0], x[1]))
-            midpoint_index = len(border_points) // 2
-            row, col, orientation = border_points[midpoint_index]
-            if orientation == 'H':
-                self.room_grid[row][col] = 'E'
-                self.room_grid[row][col + 1] = 'E'
-            elif orientation == 'V':
-                self.room_grid[row][col] = 'E'
-                self.room_grid[row + 1][col] = 'E'
-
-    def connect_within_room_types(self, region):
-        for row in range(len(region)):
-            for col in range(len(region[0])):
-                cell_type = region[row][col]
-                if cell_type in ['D', 'Q', 'M']:
-                    for d_row, d_col in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
-                        next_row, next_col = row + d_row, col + d_col
-                        if 0 <= next_row < len(region) and 0 <= next_col < len(region[0]) and region[next_row][next_col] == cell_type:
-                            self.connect_cells((row, col), (next_row, next_col))
+        self.room_grid[self.entry_cells()] = ENTRY
+
+    def entry_cells(self):
+        # One pair of "E" rooms per pair of neighbouring regions, at the middle of their shared
+        # border in (row, col) order with a horizontal pair before a vertical one at the same cell
+        entry = np.zeros((self.height, self.width), dtype=bool)
+        grid = self.grid.astype(np.int64)
+        rows, cols, kinds, regions, others = [], [], [], [], []
+        # Horizontal pairs run over every row and vertical pairs over every column, the last
+        # ones included
+        for kind, (cells, other) in enumerate(((grid[:, :-1], grid[:, 1:]), (grid[:-1, :], grid[1:, :]))):
+            border = ((cells >= 0) & (cells < self.num_regions) & (other >= 0) & (other < self.num_regions)
+                      & (cells != other))
+            border_rows, border_cols = np.nonzero(border)
+            rows.append(border_rows)
+            cols.append(border_cols)
+            kinds.append(np.full(len(border_rows), kind))
+            regions.append(cells[border])
+            others.append(other[border])
+        rows, cols, kinds, regions, others = (np.concatenate(parts) for parts in (rows, cols, kinds, regions, others))
+        if len(rows) == 0:
+            return entry
+        pairs = np.minimum(regions, others) * (self.num_regions + 1) + np.maximum(regions, others)
+        order = np.lexsort((kinds, cols, rows, pairs))
+        _, starts, counts = np.unique(pairs[order], return_index=True, return_counts=True)
+        chosen = order[starts + counts // 2]
+        rows, cols, kinds = rows[chosen], cols[chosen], kinds[chosen]
+        entry[rows, cols] = True
+        entry[rows + kinds, cols + 1 - kinds] = True
+        return entry
+
+    def generate_regions_in_parallel(self):
+        # Worker processes fit the rooms of whole regions, mark their entry rooms and link their
+        # cells, reading and writing the grid arrays in shared memory. Each region writes only
+        # its own cells, and links between regions are left to connect_E_rooms.
+        from multiprocessing import Pool, shared_memory
+        from scipy.ndimage import find_objects
+        arrays = {'grid': self.grid, 'entry': self.entry_cells(), 'room_grid': self.room_grid, 'exits': self.exits}
+        boxes = find_objects(self.grid.astype(np.intp) + 1, max_label=self.num_regions)
+        jobs = [(region, box) for region, box in enumerate(boxes) if box is not None]
+        blocks = {name: shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1)) for name, array in arrays.items()}
+        try:
+            specs = {}
+            for name, array in arrays.items():
+                np.ndarray(array.shape, array.dtype, buffer=blocks[name].buf)[...] = array
+                specs[name] = (blocks[name].name, array.shape, array.dtype.str)
+            chunksize = max(1, len(jobs) // (self.workers * 4))
+            with Pool(self.workers, initializer=attach_shared_arrays, initargs=(specs, self.seed, self.num_regions)) as pool:
+                for region, counts in pool.imap_unordered(generate_region, jobs, chunksize):
+                    self.room_counts[region] = counts
+            for name in ('room_grid', 'exits'):
+                array = arrays[name]
+                array[...] = np.ndarray(array.shape, array.dtype, buffer=blocks[name].buf)
+        finally:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
 
     def make_connections(self):
-        # Loop through the entire grid
-        for row in range(self.height):
-            for col in range(self.width):
-                # Identify the room type at the current cell
-                cell_type = self.room_grid[row][col]
-                # Skip if the cell is not of a type that can connect
-                if cell_type not in ['D', 'Q', 'M']:
-                    continue
-                # Check neighboring cells in all four directions
-                for d_row, d_col in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
-                    next_row, next_col = row + d_row, col + d_col
-                    # If the neighboring cell is within bounds, of the same type, and in the same region, connect the cells
-                    if (0 <= next_row < self.height and 0 <= next_col < self.width
-                        and self.room_grid[next_row][next_col] == cell_type
-                        and self.is_same_region((row, col), (next_row, next_col))):
-                        self.connect_cells((row, col), (next_row, next_col))
-        self.connect_S_rooms()
-        self.connect_E_rooms()
-        self.connect_isolated_islands()
-    
-    def connect_cells(self, cell1, cell2):
-        if cell1 not in self.connections:
-            self.connections[cell1] = set()
-        self.connections[cell1].add(cell2)
+        self.run_stage(self.connect_room_cells)
+        self.run_stage(self.connect_S_rooms)
+        self.run_stage(self.connect_E_rooms)
+        self.run_stage(self.connect_isolated_islands)
+
+    def same_region_neighbours(self, bit):
+        # Cells whose neighbour through this exit is inside the grid and in the same region
+        d_row, d_col = BIT_OFFSETS[bit]
+        mask = np.zeros((self.height, self.width), dtype=bool)
+        rows = slice(max(-d_row, 0), self.height - max(d_row, 0))
+        cols = slice(max(-d_col, 0), self.width - max(d_col, 0))
+        next_rows = slice(rows.start + d_row, rows.stop + d_row)
+        next_cols = slice(cols.start + d_col, cols.stop + d_col)
+        mask[rows, cols] = (self.grid[rows, cols] == self.grid[next_rows, next_cols]) & (self.grid[rows, cols] != -1)
+        return mask
+
+    def connect_many(self, rows, cols, bit):
+        # connect_cells for many cells at once, each through the same exit; cells must be distinct
+        d_row, d_col = BIT_OFFSETS[bit]
+        self.exits[rows, cols] |= bit
+        self.exits[rows + d_row, cols + d_col] |= OPPOSITE[bit]
 
-        if cell2 not in self.connections:
-            self.connections[cell2] = set()
-        self.connections[cell2].add(cell1)
+    def connect_room_cells(self):
+        # Neighbouring cells of the same multi-cell room type and region are joined
+        types = self.room_grid
+        linkable = np.isin(types, (DOUBLE, QUAD, MULTI))
+        for bit in (EAST, SOUTH):
+            d_row, d_col = BIT_OFFSETS[bit]
+            same_type = np.zeros_like(linkable)
+            same_type[:self.height - d_row, :self.width - d_col] = types[:self.height - d_row, :self.width - d_col] == types[d_row:, d_col:]
+            self.connect_many(*np.nonzero(linkable & same_type & self.same_region_neighbours(bit)), bit)
+
+    def connect_S_rooms(self):
+        # Each "S" room links to 2, 3 or 4 of its same-region neighbours, taken in a random order
+        rows, cols = np.nonzero(self.room_grid == SINGLE)
+        bits = list(BIT_OFFSETS)
+        valid = np.column_stack([self.same_region_neighbours(bit)[rows, cols] for bit in bits])
+        keys = np.empty(valid.shape)
+        counts = np.empty(len(rows), dtype=np.intp)
+        for region, members in self.split_by_region(self.grid[rows, cols]):
+            rng = self.region_rng(region, LINK_STREAM)
+            keys[members] = rng.random((len(members), len(bits)))
+            counts[members] = rng.choice([2, 3, 4], size=len(members), p=[0.2, 0.5, 0.3])
+        order = np.argsort(keys, axis=1)
+        valid_in_order = np.take_along_axis(valid, order, axis=1)
+        chosen_in_order = valid_in_order & (np.cumsum(valid_in_order, axis=1) <= counts[:, None])
+        chosen = np.zeros_like(valid)
+        np.put_along_axis(chosen, order, chosen_in_order, axis=1)
+        for index, bit in enumerate(bits):
+            self.connect_many(rows[chosen[:, index]], cols[chosen[:, index]], bit)
+
+    def connect_E_rooms(self):
+        # "E" rooms facing an "E" room of another region are joined to it and to all their own
+        # region's neighbours
+        entry = self.room_grid == ENTRY
+        linked = np.zeros_like(entry)
+        for bit in (EAST, SOUTH):
+            d_row, d_col = BIT_OFFSETS[bit]
+            cross = np.zeros_like(entry)
+            cross[:self.height - d_row, :self.width - d_col] = (
+                entry[:self.height - d_row, :self.width - d_col] & entry[d_row:, d_col:]
+                & (self.grid[:self.height - d_row, :self.width - d_col] != self.grid[d_row:, d_col:]))
+            rows, cols = np.nonzero(cross)
+            self.connect_many(rows, cols, bit)
+            linked[rows, cols] = True
+            linked[rows + d_row, cols + d_col] = True
+        self.link_within_region(linked)
+
+    def link_within_region(self, mask):
+        # Connect every masked cell to each of its neighbours in the same region
+        for bit in BIT_OFFSETS:
+            self.connect_many(*np.nonzero(mask & self.same_region_neighbours(bit)), bit)
+
+    def link_entry_rooms(self, *cells):
+        mask = np.zeros((self.height, self.width), dtype=bool)
+        for row, col in cells:
+            mask[row, col] = True
+        self.link_within_region(mask)
+
+    def connect_cells(self, cell1, cell2):
+        (row1, col1), (row2, col2) = cell1, cell2
+        bit = DIRECTION_BITS[(row2 - row1, col2 - col1)]
+        self.exits[row1, col1] |= bit
+        self.exits[row2, col2] |= OPPOSITE[bit]
 
     def is_connected(self, cell1, cell2):
-        return cell2 in self.connections.get(cell1, []) or cell1 in self.connections.get(cell2, [])
+        (row1, col1), (row2, col2) = cell1, cell2
+        bit = DIRECTION_BITS.get((row2 - row1, col2 - col1))
+        return bit is not None and bool(self.exits[row1, col1] & bit)
 
     def is_same_region(self, cell1, cell2):
         row1, col1 = cell1
         row2, col2 = cell2
-        return self.grid[row1][col1] == self.grid[row2][col2]
+        return self.grid[row1, col1] == self.grid[row2, col2]
 
-    def connect_E_rooms(self):
-        for row in range(self.height):
-            for col in range(self.width):
-                if self.room_grid[row][col] == 'E':
-                    for d_row, d_col in self.directions:
-                        next_row, next_col = row + d_row, col + d_col
-                        if (0 <= next_row < self.height and 0 <= next_col < self.width
-                            and self.room_grid[next_row][next_col] == 'E'
-                            and not self.is_same_region((row, col), (next_row, next_col))):
-                            # Connect "E" rooms to each other
-                            self.connect_cells((row, col), (next_row, next_col))
-                            # Make up to 3 additional random connections within the region for both "E" rooms
-                            for _ in range(3):
-                                random.shuffle(self.directions)
-                                for dr, dc in self.directions:
-                                    r1, c1 = row + dr, col + dc
-                                    r2, c2 = next_row + dr, next_col + dc
-                                    if (0 <= r1 < self.height and 0 <= c1 < self.width
-                                        and self.is_same_region((row, col), (r1, c1))):
-                                        self.connect_cells((row, col), (r1, c1))
-                                    if (0 <= r2 < self.height and 0 <= c2 < self.width
-                                        and self.is_same_region((next_row, next_col), (r2, c2))):
-                                        self.connect_cells((next_row, next_col), (r2, c2))
-
-    def connect_S_rooms(self):
-        for row in range(self.height):
-            for col in range(self.width):
-                if self.room_grid[row][col] == 'S':
-                    random.shuffle(self.directions)  # Shuffle directions to add randomness
-                    connections_count = random.choices([2, 3, 4], weights=[0.2, 0.5, 0.3])[0]
-                    connected = 0
-                    for d_row, d_col in self.directions:
-                        next_row, next_col = row + d_row, col + d_col
-                        if (0 <= next_row < self.height and 0 <= next_col < self.width
-                            and self.is_same_region((row, col), (next_row, next_col))):
-                            self.connect_cells((row, col), (next_row, next_col))
-                            connected += 1
-                            if connected == connections_count:
-                                break
+    def neighbours(self, row, col):
+        # Cells reachable through the exits of (row, col)
+        return [(row + d_row, col + d_col) for d_row, d_col in EXIT_OFFSETS[self.exits[row, col]]]
 
     def connect_isolated_islands(self):
-        for row in range(self.height):
-            for col in range(self.width):
-                # Find a connected room to start BFS
-                start_cell = (row, col)
-                start_region = self.grid[row][col]
-                visited = set(start_cell)
-                queue = deque([start_cell])
-                while queue:
-                    current_cell = queue.popleft()
-                    for dr, dc in self.directions:
-                        next_row, next_col = current_cell[0] + dr, current_cell[1] + dc
-                        next_cell = (next_row, next_col)
-                        if (0 <= next_row < self.height and 0 <= next_col < self.width
-                            and next_cell not in visited
-                            and self.is_same_region(current_cell, next_cell)
-                            and self.is_connected(current_cell, next_cell)):
-                            visited.add(next_cell)
-                            queue.append(next_cell)
-                region_cells = {(r, c) for r in range(self.height) for c in range(self.width) if self.grid[r][c] == start_region}
-                isolated_cells = region_cells - visited
-                for cell in isolated_cells:
-                    for dr, dc in self.directions:
-                        next_row, next_col = cell[0] + dr, cell[1] + dc
-                        next_cell = (next_row, next_col)
-                        if (0 <= next_row < self.height and 0 <= next_col < self.width
-                            and self.grid[next_row][next_col] == start_region
-                            and next_cell in visited):
-                            self.connect_cells(cell, next_cell)
-                            break
+        # Label the pieces each region is already split into, then stitch them together in one
+        # sweep with a single connection per merge, to the east or south, in row-major order
+        east = (self.exits & EAST).astype(bool) & self.same_region_neighbours(EAST)
+        south = (self.exits & SOUTH).astype(bool) & self.same_region_neighbours(SOUTH)
+        labels = self.pieces(east, south)
+        cells = np.arange(self.height * self.width).reshape(self.height, self.width)
+        label_grid = labels.reshape(self.height, self.width)
+        candidates = []
+        for kind, (bit, step) in enumerate(((EAST, 1), (SOUTH, self.width))):
+            d_row, d_col = BIT_OFFSETS[bit]
+            split = np.zeros((self.height, self.width), dtype=bool)
+            split[:self.height - d_row, :self.width - d_col] = (
+                label_grid[:self.height - d_row, :self.width - d_col] != label_grid[d_row:, d_col:])
+            split_cells = cells[split & self.same_region_neighbours(bit)]
+            candidates.append(np.column_stack((split_cells, np.full(len(split_cells), kind), split_cells + step)))
+        candidates = np.concatenate(candidates)
+        candidates = candidates[np.lexsort((candidates[:, 1], candidates[:, 0]))]
+        components = DisjointSet(int(labels.max()) + 1)
+        for cell, _, next_cell in candidates.tolist():
+            if components.union(labels[cell], labels[next_cell]):
+                self.connect_cells(divmod(cell, self.width), divmod(next_cell, self.width))
+                self.islands_stitched += 1
+
+
+# Worker process state for Grid.generate_regions_in_parallel
+shared_arrays = {}
+
+
+def attach_shared_arrays(specs, seed, num_regions):
+    from multiprocessing import shared_memory
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        shared_arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+        shared_arrays[name + '_block'] = block  # keeps the mapping open
+    shared_arrays['seed'] = seed
+    shared_arrays['num_regions'] = num_regions
+
+
+def generate_region(job):
+    # The serial fit_rooms, mark_unique_edge_rooms, connect_room_cells and connect_S_rooms, for one region
+    region, box = job
+    part = Grid.for_region(shared_arrays['seed'], shared_arrays['num_regions'], shared_arrays['grid'][box], region)
+    mask = part.grid == region
+    part.fit_rooms()
+    part.room_grid[shared_arrays['entry'][box] & mask] = ENTRY
+    part.connect_room_cells()
+    part.connect_S_rooms()
+    shared_arrays['room_grid'][box][mask] = part.room_grid[mask]
+    shared_arrays['exits'][box][mask] = part.exits[mask]
+    return region, part.room_counts[region]
+
+
+class DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.rank = [0] * size
 
+    def find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
 
+    def union(self, item1, item2):
+        # Returns True when the two items were in different sets
+        root1, root2 = self.find(item1), self.find(item2)
+        if root1 == root2:
+            return False
+        if self.rank[root1] < self.rank[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        if self.rank[root1] == self.rank[root2]:
+            self.rank[root1] += 1
+        return True
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import random
+import time
+
+from world_pool import percentile
+
+COMMANDS = ('look', 'exits', 'n', 'e', 's', 'w')
+
+
+async def request(reader, writer, line):
+    writer.write(line.encode() + b"\n")
+    await writer.drain()
+    return await reader.readuntil(b"\n\n")
+
+
+async def player(args, number, latencies, join_latencies):
+    # One simulated session: connect, enter a world, then send random commands back to back
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    rng = random.Random(number)
+    await reader.readuntil(b"\n\n")
+    start = time.perf_counter()
+    if args.pooled:
+        await request(reader, writer, "new")
+    elif args.private:
+        await request(reader, writer, f"new {args.seed + number}")
+    else:
+        await request(reader, writer, f"join {args.seed + number % args.worlds}")
+    join_latencies.append(time.perf_counter() - start)
+    for _ in range(args.commands):
+        start = time.perf_counter()
+        await request(reader, writer, rng.choice(COMMANDS))
+        latencies.append(time.perf_counter() - start)
+    await request(reader, writer, "quit")
+    writer.close()
+
+
+def report(name, times):
+    times.sort()
+    print(f"{name}: {len(times)} samples, p50 {percentile(times, 0.5) * 1000:.2f}ms, "
+          f"p99 {percentile(times, 0.99) * 1000:.2f}ms, max {times[-1] * 1000:.2f}ms")
+
+
+async def run(args):
+    latencies, join_latencies = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(player(args, number, latencies, join_latencies) for number in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    print(f"{args.sessions} sessions, {len(latencies)} commands in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} commands/s)")
+    report("world entry", join_latencies)
+    report("commands", latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive server.py with many concurrent sessions")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('--unix', help="connect to this local socket path instead of TCP")
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--commands', type=int, default=50, help="commands per session after entering a world")
+    parser.add_argument('--worlds', type=int, default=10, help="shared worlds the sessions are spread over")
+    parser.add_argument('--private', action='store_true', help="give every session its own world instead")
+    parser.add_argument('--pooled', action='store_true', help="give every session an unseeded world from the server's pool")
+    parser.add_argument('--seed', type=int, default=0, help="first world seed")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
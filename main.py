@@ -1,12 +1,41 @@
-from map import Map
-from grid import Grid
-from UI import UI
-
-grid = Grid()
-map = Map(grid)
-game_time = UI(map)
-
-
-
+import argparse
 
+from content import load_content
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frame-stats', action='store_true', help="print frame time and CPU use on exit")
+    parser.add_argument('--genre', default="fantasy", choices=load_content().playable_genres())
+    parser.add_argument('--profile', action='store_true', help="print where map generation time went")
+    parser.add_argument('--no-allocations', action='store_true',
+                        help="with --profile, build the map once and only time the stages")
+    parser.add_argument('--fast-start', action='store_true',
+                        help="show a pre-generated world from the pool and build the next one in the background")
+    parser.add_argument('--event-driven', action='store_true',
+                        help="sleep until there is input instead of redrawing 30 times a second")
+    parser.add_argument('--latency', action='store_true', help="print a key press to display latency histogram on exit")
+    parser.add_argument('--exit-after-first-frame', action='store_true', help="quit once the first frame is shown")
+    args = parser.parse_args()
+    map = None
+    # Generation pulls in scipy, so it is only imported when a world has to be built here
+    if args.fast_start and not args.profile:
+        from world_pool import WorldPool
+        pool = WorldPool(directory=".world_pool")
+        map = pool.take(genre=args.genre, refill=False)
+        pool.refill_in_background(genre=args.genre)
+    if map is None:
+        from world import build_world
+        from profiler import GenerationProfile
+        profile = GenerationProfile(not args.no_allocations) if args.profile else None
+        map = build_world(genre=args.genre, verbose=True, profile=profile)
+        if profile is not None:
+            print(profile.summary())
+    from UI import UI, FrameStats, LatencyHistogram
+    frame_stats = FrameStats() if args.frame_stats else None
+    latency = LatencyHistogram() if args.latency else None
+    game_time = UI(map, frame_hook=frame_stats, max_frames=1 if args.exit_after_first_frame else None,
+                   event_driven=args.event_driven, latency=latency)
+    if frame_stats is not None:
+        print(frame_stats.summary())
+    if latency is not None:
+        print(latency.summary())
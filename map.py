@@ -1,121 +1,311 @@
-import json
 from player import Player
-import pygame
 import random
-from room import Room
+import numpy as np
+from cells import EMPTY, COMPASS_BITS, DIRECTION_BITS, OPPOSITE
+from content import load_content
+from room import Room, RoomGrid
 
 class Map:
-    def __init__(self, grid):
+    room_type_mapping = {
+        'E': 'entry',
+        'S': 'single',
+        'D': 'double',
+        'Q': 'quad',
+        'M': 'multi',
+    }
+    direction_mapping = {
+    "N": (0, -1),
+    "S": (0, 1),
+    "E": (1, 0),
+    "W": (-1, 0)
+    }
+
+    # Arrays and strings a WorldManager drops when it evicts an idle map to disk
+    evictable = ('regions', 'room_types', 'exits', 'name_ids', 'desc_ids', 'custom_strings', 'custom_string_ids')
+
+    def __init__(self, grid, genre="fantasy", verbose=True, rng=None, lazy_names=False):
+        self.genre = genre
+        self.verbose = verbose
         self.player = None
         self.player_location = None
         self.height = grid.height
         self.width = grid.width
-        self.room_type_mapping = {
-            'E': 'entry',
-            'S': 'single',
-            'D': 'double',
-            'Q': 'quad',
-            'M': 'multi',
-        }
-        self.direction_mapping = {
-        "N": (0, -1),
-        "S": (0, 1),
-        "E": (1, 0),
-        "W": (-1, 0)
-        }
-        self.rooms = [[None for _ in range(grid.width)] for _ in range(grid.height)]
-        for y in range(grid.height):
-            for x in range(grid.width):
-                region = grid.grid[y][x]
-                room_type = grid.room_grid[y][x]
-                self.rooms[y][x] = Room(x, y, region, room_type)
-        # Connecting the rooms
-        for cell1, connected_cells in grid.connections.items():
-            room1 = self.rooms[cell1[0]][cell1[1]]
-            for cell2 in connected_cells:
-                room2 = self.rooms[cell2[0]][cell2[1]]
-                room1.add_connection(room2)
-                room2.add_connection(room1)
-        self.used_major_types = {}
-        self.used_names_and_descs = {}
-        self.load_json()
+        self.num_regions = grid.num_regions
+        self.seed = grid.seed
+        # Region names, the player start and colours draw from a stream derived from the grid's seed
+        self.random = rng if rng is not None else random.Random(f"{grid.seed}:map")
+        # The map shares the grid's arrays; Room objects are views created on demand
+        self.regions = grid.grid
+        self.room_types = grid.room_grid
+        self.exits = grid.exits
+        # Names and descriptions are indices into the data.json tables in content.py
+        self.content = load_content()
+        self.genre_content = self.content.genre(genre)
+        self.name_ids = np.full((grid.height, grid.width), -1, dtype=self.content.id_dtype)
+        self.desc_ids = np.full((grid.height, grid.width), -1, dtype=self.content.id_dtype)
+        self.custom_strings = []
+        self.custom_string_ids = {}
+        self.rooms = RoomGrid(self)
+        self.renderer = None
+        self.navigation = None
+        self.search_index = None
+        self.namer = None
+        self.manager = None
+        # Lazily named maps name each room the first time it is read, with the same result
+        self.lazy_names = lazy_names
         self.get_regions_mapping()
-        self.major_types_mapping = {}
-        for region in self.regions_mapping.values():
-            self.major_types_mapping[region] = {}
-            for room_type in self.room_type_mapping.values():
-                self.major_types_mapping[region][room_type] = list(self.data['genres']["fantasy"]['regions'][region][room_type].keys())
-                random.shuffle(self.major_types_mapping[region][room_type])
-        self.set_room_descriptions()
-        self.choose_player_start()
-        self.generated_colors = self.generate_colors(5)
+        self.profile = grid.profile
+        if not lazy_names:
+            self.run_stage(self.set_room_descriptions)
+        self.run_stage(self.choose_player_start)
+        self.generated_colors = self.run_stage(self.generate_colors, self.num_regions)
+        if self.profile is not None:
+            self.profile.counters['rooms_named'] = int(np.count_nonzero(self.name_ids != -1))
+
+    def run_stage(self, stage, *args):
+        # Naming continues the grid's profile when generation is being profiled
+        if self.profile is None:
+            return stage(*args)
+        return self.profile.run(stage.__name__, stage, *args)
         
+    @classmethod
+    def from_state(cls, state):
+        # Rebuilds a generated map from get_state() output without re-running naming
+        self = cls.__new__(cls)
+        self.genre = state['genre']
+        self.verbose = False
+        self.seed = state['seed']
+        self.width = state['width']
+        self.height = state['height']
+        self.num_regions = state['num_regions']
+        self.content = load_content()
+        self.genre_content = self.content.genre(self.genre)
+        self.reload(state)
+        self.rooms = RoomGrid(self)
+        self.renderer = None
+        self.navigation = None
+        self.search_index = None
+        self.profile = None
+        self.namer = None
+        self.manager = None
+        self.lazy_names = state.get('lazy_names', False)
+        self.regions_mapping = dict(enumerate(state['regions_mapping']))
+        self.generated_colors = [tuple(color) for color in state['colors']]
+        self.player_location = Room(self, *state['player_start'])
+        self.player = Player(self.player_location)
+        return self
+
+    def reload(self, state):
+        # The cell arrays and map-specific strings of get_state() output
+        self.regions = state['regions']
+        self.room_types = state['room_types']
+        self.exits = state['exits']
+        self.name_ids = state['name_ids']
+        self.desc_ids = state['desc_ids']
+        self.custom_strings = list(state['custom_strings'])
+        self.custom_string_ids = {text: index for index, text in enumerate(self.custom_strings)}
+
+    def unload(self):
+        # Drops the arrays and every index built on them once the map is saved; see WorldManager
+        for name in self.evictable:
+            del self.__dict__[name]
+        self.renderer = self.navigation = self.search_index = self.namer = None
+
+    def __getattr__(self, name):
+        # Only reached for attributes the map does not have. An evicted map has dropped its
+        # arrays, so the first read of one of them has the manager load the map back.
+        manager = self.__dict__.get('manager')
+        if manager is None or name not in self.evictable:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        manager.restore(self)
+        return self.__dict__[name]
+
+    def get_state(self, name_rooms=True):
+        # A snapshot taken without naming keeps unnamed rooms unnamed, to be named lazily later
+        if name_rooms:
+            self.name_all_rooms()
+        return {
+            'genre': self.genre,
+            'seed': self.seed,
+            'width': self.width,
+            'height': self.height,
+            'num_regions': self.num_regions,
+            'regions': self.regions,
+            'room_types': self.room_types,
+            'exits': self.exits,
+            'name_ids': self.name_ids,
+            'desc_ids': self.desc_ids,
+            'custom_strings': self.custom_strings,
+            'regions_mapping': [self.regions_mapping[region] for region in range(self.num_regions)],
+            'colors': self.generated_colors,
+            'player_start': (self.player_location.x, self.player_location.y),
+            'lazy_names': self.lazy_names,
+        }
+
+    @property
+    def nbytes(self):
+        # Approximate resident size of the map's own data; the shared data.json tables are not counted
+        arrays = (self.regions, self.room_types, self.exits, self.name_ids, self.desc_ids)
+        return sum(array.nbytes for array in arrays) + sum(len(text) for text in self.custom_strings)
+
+    def get_room(self, x, y):
+        return Room(self, x, y)
+
+    def custom_string_id(self, text):
+        # Text that is not in data.json is kept on the map under ids -2, -3, ...
+        index = self.custom_string_ids.get(text)
+        if index is None:
+            index = self.custom_string_ids[text] = len(self.custom_strings)
+            self.custom_strings.append(text)
+        return -2 - index
+
+    def name_id(self, name):
+        string_id = self.content.name_ids.get(name)
+        return string_id if string_id is not None else self.custom_string_id(name)
+
+    def desc_id(self, desc):
+        string_id = self.content.desc_ids.get(desc)
+        return string_id if string_id is not None else self.custom_string_id(desc)
+
+    def room_name_id(self, x, y):
+        if self.lazy_names and self.name_ids[y, x] == -1:
+            self.name_ids[y, x], self.desc_ids[y, x] = self.get_namer().name_room(x, y)
+        return self.name_ids[y, x]
+
+    def room_desc_id(self, x, y):
+        if self.lazy_names and self.name_ids[y, x] == -1:
+            self.name_ids[y, x], self.desc_ids[y, x] = self.get_namer().name_room(x, y)
+        return self.desc_ids[y, x]
+
+    def get_name(self, string_id):
+        if string_id == -1:
+            return ""
+        name = self.content.names[string_id] if string_id >= 0 else self.custom_strings[-2 - string_id]
+        return name.title()
+
+    def get_desc(self, string_id):
+        if string_id == -1:
+            return ""
+        return self.content.descs[string_id] if string_id >= 0 else self.custom_strings[-2 - string_id]
+
+    def rename_room(self, room, name, description):
+        self.name_ids[room.y, room.x] = self.name_id(name)
+        self.desc_ids[room.y, room.x] = self.desc_id(description)
+        if self.search_index is not None:
+            self.search_index.rename(room.x, room.y)
+
+    def connect_rooms(self, room1, room2):
+        bit = DIRECTION_BITS[(room2.y - room1.y, room2.x - room1.x)]
+        self.exits[room1.y, room1.x] |= bit
+        self.exits[room2.y, room2.x] |= OPPOSITE[bit]
+        if self.navigation is not None:
+            self.navigation.add_connection(room1, room2)
+
+    def get_navigation(self):
+        # The navigation index is built on the first route query and kept up to date afterwards
+        if self.navigation is None:
+            from navigation import NavigationIndex
+            self.navigation = NavigationIndex(self)
+        return self.navigation
+
+    def find_path(self, start_room, goal_room):
+        return self.get_navigation().find_path(start_room, goal_room)
+
+    def distance(self, start_room, goal_room):
+        return self.get_navigation().distance(start_room, goal_room)
+
+    def is_reachable(self, room1, room2):
+        return self.get_navigation().is_reachable(room1, room2)
+
+    def nearest_entry_room(self, room):
+        return self.get_navigation().nearest_entry_room(room)
+
+    def region_route(self, start_region, goal_region):
+        return self.get_navigation().region_route(start_region, goal_region)
+
+    def region_distance(self, room1, room2):
+        return self.get_navigation().region_distance(room1, room2)
+
+    def get_search_index(self):
+        # Built on the first search, naming any unnamed rooms, and kept up to date by rename_room
+        if self.search_index is None:
+            from search import SearchIndex
+            self.search_index = SearchIndex(self)
+        return self.search_index
+
+    def search(self, text="", region=None, room_type=None, major_type=None, near=None, distance=None, limit=None):
+        # Rooms with every word of text in their name, description, major type or region name,
+        # narrowed by region (index or name), room type (letter or name) and major type
+        return self.get_search_index().search(text, region, room_type, major_type, near, distance, limit)
+
+    def rooms_within(self, room, distance, limit=None):
+        # Rooms within a straight-line distance of room, nearest first
+        return self.search(near=room, distance=distance, limit=limit)
+
+    def to_dict(self):
+        self.name_all_rooms()
+        names = [[room.name for room in row] for row in self.rooms]
+        descs = [[room.desc for room in row] for row in self.rooms]
+        return {
+            'width': self.width,
+            'height': self.height,
+            'genre': self.genre,
+            'seed': self.seed,
+            'regions': self.regions.tolist(),
+            'room_types': self.room_types.tolist(),
+            'exits': self.exits.tolist(),
+            'regions_mapping': [self.regions_mapping[region] for region in range(self.num_regions)],
+            'names': names,
+            'descs': descs,
+            'player_start': [self.player_location.x, self.player_location.y],
+        }
+
     def print_map_info(self):
         for row in self.rooms:
             for room in row:
                 connections = room.get_connections()
                 print(f"Region: {room.region}, Coordinates: ({room.x}, {room.y}), Room Type: {room.room_type}, Connections: {connections}")
                 print(f"Room Name: {room.name}, Desc: {room.desc}")
-    def load_json(self):
-        with open('data.json', 'r') as file:
-            self.data = json.load(file)
 
     def get_regions_mapping(self):
-        regions_data = list(self.data['genres']["fantasy"]['regions'].keys())
-        random.shuffle(regions_data)
-        self.regions_mapping = {idx: region for idx, region in enumerate(regions_data)}
-
-    def generate_room_name_and_description(self, region_index, room_type):
-        region_name = self.regions_mapping[region_index]
-        room_data_type = self.room_type_mapping[room_type]
-        room_data = self.data['genres']["fantasy"]['regions'][region_name][room_data_type]
-        major_types = self.major_types_mapping[region_name][room_data_type]
-        major_type = major_types.pop()
-        if not major_types:
-            self.major_types_mapping[region_name][room_data_type] = list(room_data.keys())
-            random.shuffle(self.major_types_mapping[region_name][room_data_type])
-        # Get the major type's name and description data
-        name_data = list(room_data[major_type]['name'])
-        desc_data = list(room_data[major_type]['desc'])
-        # Check if shuffled lists for name and description exist for this major_type, if not create them
-        if major_type not in self.used_names_and_descs:
-            random.shuffle(name_data)
-            random.shuffle(desc_data)
-            self.used_names_and_descs[major_type] = (name_data, desc_data)
-        else:
-            name_data, desc_data = self.used_names_and_descs[major_type]
-        # If all names/descs are used, reshuffle and start from the beginning
-        if not name_data:
-            name_data = list(room_data[major_type]['name'])
-            random.shuffle(name_data)
-        if not desc_data:
-            desc_data = list(room_data[major_type]['desc'])
-            random.shuffle(desc_data)
-        # Pick a non-repeating name and description
-        name = name_data.pop()
-        desc = desc_data.pop()
-        # Store the updated lists back into used_names_and_descs
-        self.used_names_and_descs[major_type] = (name_data, desc_data)
-        return name, desc
-    
+        regions_data = list(self.genre_content.regions)
+        self.random.shuffle(regions_data)
+        # Grids with more regions than the genre defines reuse the genre's regions in turn
+        self.regions_mapping = {idx: regions_data[idx % len(regions_data)] for idx in range(self.num_regions)}
+
+    def get_namer(self):
+        if self.namer is None:
+            from naming import RoomNamer
+            self.namer = RoomNamer(self)
+        return self.namer
+
     def set_room_descriptions(self):
-        for row in self.rooms:
-            for room in row:
-                if room.region == -1:
-                    continue
-                name, desc = self.generate_room_name_and_description(room.region, room.room_type)
-                room.set_name_and_description(name, desc)
+        # Names every room that has no name yet, all at once
+        unnamed = (self.name_ids == -1) & (self.regions != -1)
+        name_ids, desc_ids = self.get_namer().name_all()
+        self.name_ids[unnamed] = name_ids[unnamed]
+        self.desc_ids[unnamed] = desc_ids[unnamed]
+
+    def name_all_rooms(self):
+        # Saving or exporting a lazily named map names the rest of its rooms first
+        if self.lazy_names:
+            self.set_room_descriptions()
+            self.lazy_names = False
+            self.namer = None
 
     def choose_player_start(self):
-        valid_rooms = [(y, x) for y in range(self.height) for x in range(self.width) if self.rooms[y][x].room_type != ' ']
-        if valid_rooms:
-            current_y, current_x = random.choice(valid_rooms)
+        valid_rooms = np.flatnonzero(self.room_types != EMPTY)
+        if len(valid_rooms):
+            # Same draw as random.choice over the rooms in row-major order, without listing them
+            current_y, current_x = divmod(int(valid_rooms[self.random.randrange(len(valid_rooms))]), self.width)
             self.player_location = self.rooms[current_y][current_x]
             self.player = Player(self.player_location) # ***** create the Player at this point *****
-            print(f"Player starting room randomly selected at ({self.player_location.x}, {self.player_location.y})")
+            if self.verbose:
+                print(f"Player starting room randomly selected at ({self.player_location.x}, {self.player_location.y})")
             return True
         else:
-            print("No valid rooms found!")
+            if self.verbose:
+                print("No valid rooms found!")
             return False
     
     def get_player_location(self):
@@ -128,7 +318,7 @@ class Map:
             max_attempts = 100
             attempts = 0
             while attempts < max_attempts:
-                color = (random.randint(100,255), random.randint(100,255), random.randint(100,255))
+                color = (self.random.randint(100,255), self.random.randint(100,255), self.random.randint(100,255))
                 if all(sum(abs(c1 - c2) for c1, c2 in zip(color, existing_color)) > min_distance for existing_color in colors):
                     break
                 attempts += 1
@@ -136,88 +326,23 @@ class Map:
         return colors
     
     def visualize_map(self, screen):
-        player_location = self.get_player_location()
-        player_color = (255, 0, 0)
-        player_border_color = (255, 255, 255)
-        player_border_thickness = 3
-        base_colors = [(255, 255, 255)] + self.generated_colors
-        cell_size = 25
-        font_size = 14
-        font = pygame.font.SysFont("Helvetica", font_size)
-        for row in range(len(self.rooms) * 2 - 1): # Draw the grid
-            for col in range(len(self.rooms[0]) * 2 - 1):
-                original_row = row // 2
-                original_col = col // 2
-                room = self.rooms[original_row][original_col]
-                # If this is a non-room cell, fill it with black
-                if (row % 2 == 0 and col % 2 == 0) and (room.region == -1 or room.room_type == ""):
-                    pygame.draw.rect(screen, (0, 0, 0), (col * cell_size, row * cell_size, cell_size, cell_size))
-                    continue
-                if room is None:
-                    continue
-                base_color = base_colors[room.region + 1]
-                color = base_color
-                # draw cells (actual rooms)
-                if row % 2 == 0 and col % 2 == 0:
-                    if room.room_type in 'SDMQE':
-                        color = base_color
-                    pygame.draw.rect(screen, color, (col * cell_size, row * cell_size, cell_size, cell_size)) # Draw cells
-                    pygame.draw.rect(screen, (192, 192, 192), (col * cell_size, row * cell_size, cell_size, cell_size), 1) # Draw borders
-                    if room == player_location:
-                        pygame.draw.rect(screen, player_color, (col * cell_size, row * cell_size, cell_size, cell_size)) # Draw player's cell
-                        pygame.draw.rect(screen, player_border_color, (col * cell_size, row * cell_size, cell_size, cell_size), player_border_thickness) # Draw unique border for player's cell
-                # draw connections, horizontal and vertical
-                elif row % 2 == 0 and col % 2 == 1:
-                    next_room = self.rooms[original_row][original_col + 1] if original_col + 1 < len(self.rooms[0]) else None
-                    if next_room and next_room in room.connections:
-                        color = tuple(min(c + 50, 255) for c in base_color)
-                        pygame.draw.rect(screen, color, (col * cell_size, row * cell_size, cell_size, cell_size)) # Draw cells
-                        pygame.draw.rect(screen, (192, 192, 192), (col * cell_size, row * cell_size, cell_size, cell_size), 1) # Draw borders
-                elif row % 2 == 1 and col % 2 == 0:
-                    next_room = self.rooms[original_row + 1][original_col] if original_row + 1 < len(self.rooms) else None
-                    if next_room and next_room in room.connections:
-                        color = tuple(min(c + 50, 255) for c in base_color)
-                        pygame.draw.rect(screen, color, (col * cell_size, row * cell_size, cell_size, cell_size)) # Draw cells
-                        pygame.draw.rect(screen, (192, 192, 192), (col * cell_size, row * cell_size, cell_size, cell_size), 1) # Draw borders
-                # draw room labels
-                if row % 2 == 0 and col % 2 == 0:
-                    if room == player_location:
-                        room_label = "P"
-                    else:
-                        room_label = room.room_type
-                    text_surface = font.render(room_label, True, (0, 0, 0))
-                    # Get the size of the text surface
-                    text_width, text_height = text_surface.get_size()
-                    # Calculate the centered position for the text
-                    text_x = col * cell_size + (cell_size - text_width) // 2
-                    text_y = row * cell_size + (cell_size - text_height) // 2
-                    screen.blit(text_surface, (text_x, text_y))
-        pygame.display.flip()
+        # Draws from a static layer built on first use; the caller updates the display
+        if self.renderer is None:
+            from renderer import MapRenderer  # only the interactive UI draws; generation stays headless
+            self.renderer = MapRenderer(self)
+        self.renderer.draw(screen)
+
+    def step(self, room, direction):
+        # The room through room's exit in direction (N, E, S or W), or None when there is no exit
+        dx, dy = self.direction_mapping[direction]
+        new_x, new_y = room.x + dx, room.y + dy
+        if 0 <= new_x < self.width and 0 <= new_y < self.height and self.exits[room.y, room.x] & COMPASS_BITS[direction]:
+            return Room(self, new_x, new_y)
+        return None
 
     def move_player(self, direction):
-        # Get the current coordinates of the player
-        current_x, current_y = self.player_location.x, self.player_location.y
-        # Define the changes in coordinates for each direction
-        direction_mapping = {
-            "N": (0, -1),
-            "S": (0, 1),
-            "E": (1, 0),
-            "W": (-1, 0)
-        }
-        # Get the change in coordinates for the specified direction
-        dx, dy = direction_mapping[direction]
-        # Compute the new coordinates
-        new_x, new_y = current_x + dx, current_y + dy
-        # Check if the new coordinates are within the bounds of the map
-        if 0 <= new_x < self.width and 0 <= new_y < self.height:
-            # Get the room object at the new coordinates
-            new_room = self.rooms[new_y][new_x]
-            # Check if there is a connection to the new room
-            if new_room in self.player_location.connections:
-                # Update the player's location
-                self.player_location = new_room
-                return f"You have moved {direction}."
-            else:
-                return "You can't go that way."
-        else:
-            return "You can't go that way."
\ No newline at end of file
+        room = self.step(self.player_location, direction)
+        if room is None:
+            return "You can't go that way."
+        self.player_location = room
+        return f"You have moved {direction}."
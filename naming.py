@@ -0,0 +1,108 @@
+import numpy as np
+
+from cells import ROOM_TYPES, EMPTY
+
+# Random streams for the naming permutations
+MAJOR_STREAM, NAME_STREAM, DESC_STREAM = 0, 1, 2
+
+
+def permutation_rows(seed, stream, key, size, cycles):
+    # One random permutation of range(size) per cycle, drawn as rows of one random matrix
+    rng = np.random.Generator(np.random.PCG64((seed, stream, key)))
+    return np.argsort(rng.random((cycles, size)), axis=1)
+
+
+def permutation_row(seed, stream, key, size, cycle):
+    # Row `cycle` of permutation_rows, found by jumping the generator ahead instead of drawing
+    # the rows before it
+    bit_generator = np.random.PCG64((seed, stream, key))
+    bit_generator.advance(cycle * size)
+    return np.argsort(np.random.Generator(bit_generator).random(size))
+
+
+def group_positions(values):
+    # (value, positions of that value) for every distinct value, positions in their original order
+    order = np.argsort(values, kind='stable')
+    present, starts = np.unique(values[order], return_index=True)
+    return zip(present.tolist(), np.split(order, starts[1:]))
+
+
+class RoomNamer:
+    # Names rooms from their position instead of from the order they are generated in. The k-th
+    # room (row-major) of a region name and room type takes major type perm_c[k % L] of that
+    # key's L major types, with c = k // L. Every major type appears once per cycle, so c is
+    # also how often the room's major type was used before it, and the room takes the c-th entry
+    # of that major type's own cycles of name and description permutations. Naming one room
+    # or all rooms at once gives the same ids.
+    def __init__(self, game_map):
+        self.seed = game_map.seed
+        self.content = game_map.content
+        genre_content = game_map.genre_content
+        region_names = genre_content.regions
+        room_type_mapping = type(game_map).room_type_mapping
+        region_keys = np.array([region_names.index(game_map.regions_mapping[region])
+                                for region in range(game_map.num_regions)] or [0], dtype=np.int32)
+        regions = game_map.regions.astype(np.intp)
+        named = (regions != -1) & (game_map.room_types != EMPTY)
+        keys = np.where(named, region_keys[np.maximum(regions, 0)] * len(ROOM_TYPES) + game_map.room_types, -1)
+        self.keys = keys.astype(np.int32)
+        # Row-major rank of every room among the rooms with the same key
+        self.ordinals = np.full(keys.shape, -1, dtype=np.int32)
+        cells = np.flatnonzero(named)
+        for _, members in group_positions(self.keys.ravel()[cells]):
+            self.ordinals.ravel()[cells[members]] = np.arange(len(members))
+        self.key_major_types = {}
+        for key in np.unique(self.keys[named]).tolist():
+            region_index, code = divmod(key, len(ROOM_TYPES))
+            room_data_type = room_type_mapping[ROOM_TYPES[code]]
+            self.key_major_types[key] = np.array(genre_content.major_types[(region_names[region_index], room_data_type)])
+        self.permutations = {}
+
+    def permutation(self, stream, key, size, cycle):
+        permutation = self.permutations.get((stream, key, cycle))
+        if permutation is None:
+            permutation = self.permutations[(stream, key, cycle)] = permutation_row(self.seed, stream, key, size, cycle)
+        return permutation
+
+    def name_room(self, x, y):
+        # (name id, desc id) of one room, or (-1, -1) for a cell that is not a room
+        key = int(self.keys[y, x])
+        if key == -1:
+            return -1, -1
+        major_types = self.key_major_types[key]
+        cycle, position = divmod(int(self.ordinals[y, x]), len(major_types))
+        major_type = int(major_types[self.permutation(MAJOR_STREAM, key, len(major_types), cycle)[position]])
+        ids = []
+        for stream, (start, stop) in ((NAME_STREAM, self.content.name_range(major_type)),
+                                      (DESC_STREAM, self.content.desc_range(major_type))):
+            string_cycle, string_position = divmod(cycle, stop - start)
+            ids.append(start + int(self.permutation(stream, major_type, stop - start, string_cycle)[string_position]))
+        return tuple(ids)
+
+    def draw_major_types(self):
+        # (flat cell index, major type, cycle) of every room. The major type depends only on
+        # the room's position, so it stays the same when the room is renamed.
+        cells = np.flatnonzero(self.keys != -1)
+        keys, ordinals = self.keys.ravel()[cells], self.ordinals.ravel()[cells]
+        major_types = np.empty(len(cells), dtype=np.intp)
+        cycles = np.empty(len(cells), dtype=np.intp)
+        for key, members in group_positions(keys):
+            options = self.key_major_types[key]
+            cycle, position = np.divmod(ordinals[members], len(options))
+            permutations = permutation_rows(self.seed, MAJOR_STREAM, key, len(options), int(cycle.max()) + 1)
+            major_types[members] = options[permutations[cycle, position]]
+            cycles[members] = cycle
+        return cells, major_types, cycles
+
+    def name_all(self):
+        # Name and desc id arrays for the whole map, -1 where there is no room
+        name_ids = np.full(self.keys.shape, -1, dtype=self.content.id_dtype)
+        desc_ids = np.full(self.keys.shape, -1, dtype=self.content.id_dtype)
+        cells, major_types, cycles = self.draw_major_types()
+        for major_type, members in group_positions(major_types):
+            for stream, (start, stop), ids in ((NAME_STREAM, self.content.name_range(major_type), name_ids),
+                                               (DESC_STREAM, self.content.desc_range(major_type), desc_ids)):
+                string_cycle, string_position = np.divmod(cycles[members], stop - start)
+                permutations = permutation_rows(self.seed, stream, major_type, stop - start, int(string_cycle.max()) + 1)
+                ids.ravel()[cells[members]] = start + permutations[string_cycle, string_position]
+        return name_ids, desc_ids
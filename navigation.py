@@ -0,0 +1,293 @@
+import heapq
+from collections import deque
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra, shortest_path
+
+from cells import ENTRY, EAST, SOUTH, EXIT_OFFSETS
+from grid import DisjointSet
+
+UNREACHABLE = -1
+
+
+def exit_graph(exits, mask=None):
+    # Undirected sparse graph over flat cell indices with one edge per east/south exit bit
+    height, width = exits.shape
+    cells = np.arange(height * width).reshape(height, width)
+    east = (exits[:, :-1] & EAST).astype(bool)
+    south = (exits[:-1, :] & SOUTH).astype(bool)
+    if mask is not None:
+        east &= mask[:, :-1] & mask[:, 1:]
+        south &= mask[:-1, :] & mask[1:, :]
+    sources = np.concatenate((cells[:, :-1][east], cells[:-1, :][south]))
+    targets = np.concatenate((cells[:, 1:][east], cells[1:, :][south]))
+    data = np.ones(len(sources), dtype=np.int8)
+    return coo_matrix((data, (sources, targets)), shape=(height * width, height * width)).tocsr()
+
+
+def bfs_distances(graph, sources):
+    distances = shortest_path(graph, directed=False, unweighted=True, indices=sources)
+    distances[np.isinf(distances)] = UNREACHABLE
+    return distances.astype(np.int32)
+
+
+class NavigationIndex:
+    # Precomputed reachability, landmark distances, per-region distance tables and the
+    # region graph through "E" rooms. Adding a connection updates each of them in place.
+    def __init__(self, game_map, num_landmarks=8, all_pairs_limit=1024):
+        self.map = game_map
+        self.width = game_map.width
+        self.height = game_map.height
+        self.num_landmarks = num_landmarks
+        self.all_pairs_limit = all_pairs_limit
+        graph = exit_graph(game_map.exits)
+        _, labels = connected_components(graph, directed=False)
+        self.component_labels = labels
+        self.components = DisjointSet(int(labels.max()) + 1)
+        self.region_tables = {}
+        self.build_distance_tables(graph)
+
+    def build_distance_tables(self, graph=None):
+        if graph is None:
+            graph = exit_graph(self.map.exits)
+        # Adjacency as plain lists: the A* inner loop slices these instead of decoding exit bits
+        symmetric = (graph + graph.T).tocsr()
+        self.indptr = symmetric.indptr.tolist()
+        self.indices = symmetric.indices.tolist()
+        self.landmarks, self.landmark_distances = self.choose_landmarks(graph)
+        # One memoryview per landmark, so the A* heuristic reads distances as plain ints
+        self.landmark_rows = [memoryview(distances) for distances in self.landmark_distances]
+        # Connections added since the lists were built, per cell
+        self.added = {}
+        self.nearest_entry_distance, self.nearest_entry = self.nearest_entries(graph)
+        self.region_graph = self.build_region_graph()
+        self.region_tables = {}
+
+    def choose_landmarks(self, graph):
+        # Farthest-point selection, so landmarks spread out over the map
+        rooms = np.flatnonzero(self.map.regions.ravel() != -1)
+        if len(rooms) == 0:
+            return [], np.zeros((0, self.width * self.height), dtype=np.int32)
+        landmarks = [int(rooms[0])]
+        distances = bfs_distances(graph, landmarks)
+        while len(landmarks) < self.num_landmarks:
+            closest = np.where(distances == UNREACHABLE, np.iinfo(np.int32).max, distances).min(axis=0)
+            closest[self.map.regions.ravel() == -1] = -1
+            candidate = int(closest.argmax())
+            if closest[candidate] <= 0:
+                break
+            landmarks.append(candidate)
+            distances = np.vstack((distances, bfs_distances(graph, [candidate])))
+        return landmarks, distances
+
+    def nearest_entries(self, graph):
+        # Distance from every cell to its nearest "E" room, and which one that is
+        entries = np.flatnonzero(self.map.room_types == ENTRY)
+        if len(entries) == 0:
+            unreachable = np.full(self.width * self.height, UNREACHABLE, dtype=np.int32)
+            return unreachable, unreachable.copy()
+        distances, _, sources = dijkstra(graph, directed=False, unweighted=True, indices=entries,
+                                         min_only=True, return_predecessors=True)
+        distances[np.isinf(distances)] = UNREACHABLE
+        return distances.astype(np.int32), sources.astype(np.int32)
+
+    def build_region_graph(self):
+        # region -> {neighbouring region: [(entry cell, entry cell), ...]}
+        regions = self.map.regions
+        region_graph = {region: {} for region in range(self.map.num_regions)}
+        for cell in np.flatnonzero(self.map.room_types == ENTRY):
+            row, col = divmod(int(cell), self.width)
+            for neighbour in self.neighbours(int(cell)):
+                other_row, other_col = divmod(neighbour, self.width)
+                region, other = int(regions[row, col]), int(regions[other_row, other_col])
+                if region != other:
+                    region_graph[region].setdefault(other, []).append((int(cell), neighbour))
+        return region_graph
+
+    def neighbours(self, cell):
+        row, col = divmod(cell, self.width)
+        for d_row, d_col in EXIT_OFFSETS[self.map.exits[row, col]]:
+            next_row, next_col = row + d_row, col + d_col
+            if 0 <= next_row < self.height and 0 <= next_col < self.width:
+                yield next_row * self.width + next_col
+
+    def cell(self, room):
+        return room.y * self.width + room.x
+
+    def adjacent(self, cell):
+        neighbours = self.indices[self.indptr[cell]:self.indptr[cell + 1]]
+        added = self.added.get(cell)
+        return neighbours + added if added else neighbours
+
+    def add_connection(self, room1, room2):
+        # A new connection can only shorten distances, so each table is lowered from the new
+        # edge outwards and only the cells it brings closer are visited
+        cell1, cell2 = self.cell(room1), self.cell(room2)
+        self.components.union(self.component_labels[cell1], self.component_labels[cell2])
+        self.added.setdefault(cell1, []).append(cell2)
+        self.added.setdefault(cell2, []).append(cell1)
+        for distances in self.landmark_rows:
+            self.lower_distances(distances, cell1, cell2)
+        self.lower_distances(memoryview(self.nearest_entry_distance), cell1, cell2, self.nearest_entry)
+        regions = self.map.regions.ravel()
+        region1, region2 = int(regions[cell1]), int(regions[cell2])
+        if region1 == region2:
+            self.lower_region_table(region1, cell1, cell2)
+            return
+        # The same rule as build_region_graph: region graph edges leave from "E" rooms
+        room_types = self.map.room_types.ravel()
+        for cell, region, other, other_region in ((cell1, region1, cell2, region2), (cell2, region2, cell1, region1)):
+            if room_types[cell] == ENTRY:
+                self.region_graph[region].setdefault(other_region, []).append((cell, other))
+
+    def lower_distances(self, distances, cell1, cell2, sources=None):
+        # Breadth-first from whichever end the new edge brings closer; UNREACHABLE counts as
+        # infinitely far. sources, when given, follows the distances along.
+        start, end = (cell1, cell2) if self.closer(distances, cell1, cell2) else (cell2, cell1)
+        if not self.closer(distances, start, end):
+            return
+        distances[end] = distances[start] + 1
+        if sources is not None:
+            sources[end] = sources[start]
+        queue = deque([end])
+        while queue:
+            cell = queue.popleft()
+            for neighbour in self.adjacent(cell):
+                if self.closer(distances, cell, neighbour):
+                    distances[neighbour] = distances[cell] + 1
+                    if sources is not None:
+                        sources[neighbour] = sources[cell]
+                    queue.append(neighbour)
+
+    def closer(self, distances, cell, neighbour):
+        # Whether stepping from cell shortens the distance to neighbour
+        return distances[cell] != UNREACHABLE and (
+            distances[neighbour] == UNREACHABLE or distances[cell] + 1 < distances[neighbour])
+
+    def lower_region_table(self, region, cell1, cell2):
+        # A path through the new edge from any room to any other, if that is shorter
+        table = self.region_tables.get(region)
+        if table is None:
+            return
+        positions, distances = table
+        far = np.iinfo(np.int32).max // 4
+        current = np.where(distances == UNREACHABLE, far, distances.astype(np.int32))
+        to1, to2 = current[:, positions[cell1]], current[:, positions[cell2]]
+        lowered = np.minimum(current, np.minimum(to1[:, None] + 1 + to2[None, :], to2[:, None] + 1 + to1[None, :]))
+        distances[...] = np.where(lowered >= far, UNREACHABLE, lowered)
+
+    def is_reachable(self, room1, room2):
+        labels = self.component_labels
+        return self.components.find(labels[self.cell(room1)]) == self.components.find(labels[self.cell(room2)])
+
+    def heuristic(self, cell, goal, goal_landmarks):
+        # Lower bound on the steps from cell to goal: Manhattan distance or the landmark (ALT)
+        # triangle bound, whichever is larger. Cells on one path share a component, so each
+        # landmark reaches both ends or neither. Worked out per cell as A* reaches it, since
+        # a query only ever looks at a small part of the map.
+        row, col = divmod(cell, self.width)
+        goal_row, goal_col = divmod(goal, self.width)
+        estimate = abs(row - goal_row) + abs(col - goal_col)
+        for distances, goal_distance in zip(self.landmark_rows, goal_landmarks):
+            bound = abs(distances[cell] - goal_distance)
+            if bound > estimate:
+                estimate = bound
+        return estimate
+
+    def find_path(self, start_room, goal_room):
+        # A* over the exit graph with landmark (ALT) and Manhattan lower bounds
+        if not self.is_reachable(start_room, goal_room):
+            return None
+        start, goal = self.cell(start_room), self.cell(goal_room)
+        goal_landmarks = [distances[goal] for distances in self.landmark_rows]
+        came_from = {start: None}
+        cost = {start: 0}
+        frontier = [(self.heuristic(start, goal, goal_landmarks), 0, start)]
+        while frontier:
+            _, steps, cell = heapq.heappop(frontier)
+            if cell == goal:
+                break
+            if steps > cost[cell]:
+                continue
+            for neighbour in self.adjacent(cell):
+                if steps + 1 < cost.get(neighbour, steps + 2):
+                    cost[neighbour] = steps + 1
+                    came_from[neighbour] = cell
+                    estimate = self.heuristic(neighbour, goal, goal_landmarks)
+                    heapq.heappush(frontier, (steps + 1 + estimate, steps + 1, neighbour))
+        path = []
+        cell = goal
+        while cell is not None:
+            path.append(cell)
+            cell = came_from[cell]
+        return [self.map.get_room(cell % self.width, cell // self.width) for cell in reversed(path)]
+
+    def distance(self, start_room, goal_room):
+        path = self.find_path(start_room, goal_room)
+        return len(path) - 1 if path is not None else None
+
+    def nearest_entry_room(self, room):
+        entry = self.nearest_entry[self.cell(room)]
+        if entry == UNREACHABLE:
+            return None
+        return self.map.get_room(int(entry) % self.width, int(entry) // self.width)
+
+    def region_table(self, region):
+        # All-pairs distances for paths that stay inside one region, for regions small enough
+        table = self.region_tables.get(region)
+        if table is None:
+            mask = self.map.regions == region
+            cells = np.flatnonzero(mask)
+            if len(cells) > self.all_pairs_limit:
+                return None
+            graph = exit_graph(self.map.exits, mask)[cells][:, cells]
+            distances = bfs_distances(graph, np.arange(len(cells)))
+            table = self.region_tables[region] = (
+                {int(cell): index for index, cell in enumerate(cells)}, distances.astype(np.int16))
+        return table
+
+    def region_distance(self, room1, room2):
+        # Shortest number of steps between two rooms of one region without leaving it
+        if room1.region != room2.region:
+            return None
+        table = self.region_table(room1.region)
+        if table is None:
+            return self.region_bfs(room1, room2)
+        positions, distances = table
+        distance = int(distances[positions[self.cell(room1)], positions[self.cell(room2)]])
+        return distance if distance != UNREACHABLE else None
+
+    def region_bfs(self, room1, room2):
+        # Used for regions too large for an all-pairs table
+        regions = self.map.regions.ravel()
+        start, goal = self.cell(room1), self.cell(room2)
+        distance = {start: 0}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            if cell == goal:
+                return distance[cell]
+            for neighbour in self.neighbours(cell):
+                if neighbour not in distance and regions[neighbour] == regions[start]:
+                    distance[neighbour] = distance[cell] + 1
+                    queue.append(neighbour)
+        return None
+
+    def region_route(self, start_region, goal_region):
+        # Regions to pass through, via entry rooms, from one region to another
+        previous = {start_region: None}
+        queue = deque([start_region])
+        while queue:
+            region = queue.popleft()
+            if region == goal_region:
+                route = []
+                while region is not None:
+                    route.append(region)
+                    region = previous[region]
+                return route[::-1]
+            for neighbour in self.region_graph.get(region, {}):
+                if neighbour not in previous:
+                    previous[neighbour] = region
+                    queue.append(neighbour)
+        return None
@@ -0,0 +1,108 @@
+import importlib
+import json
+import time
+import tracemalloc
+
+from cells import ROOM_TYPES, EMPTY
+
+# Imported by generation on first use; imported up front so no stage is charged for them
+HEAVY_MODULES = ('scipy.spatial', 'scipy.sparse', 'scipy.sparse.csgraph', 'scipy.ndimage')
+
+
+class GenerationProfile:
+    # Per-stage wall time, allocations and domain counters for one Grid and Map. Pass an
+    # instance as Grid(profile=...), or build through measure(); without one the pipeline runs
+    # with no instrumentation.
+    def __init__(self, track_allocations=True):
+        self.track_allocations = track_allocations
+        self.tracing = False
+        self.stages = []
+        self.counters = {}
+        for module in HEAVY_MODULES:
+            importlib.import_module(module)
+
+    def measure(self, build):
+        # tracemalloc slows every allocation, so stage times come from a pass with it off and
+        # allocations from a second pass over the same seed. build() must make the same world
+        # each time it is called; the first pass's result is returned. With track_allocations
+        # off the world is built once, for the times only.
+        result = build()
+        if self.track_allocations:
+            stages, counters = self.stages, self.counters
+            self.stages, self.counters = [], {}
+            self.tracing = True
+            try:
+                build()
+            finally:
+                self.tracing = False
+            for stage, traced in zip(stages, self.stages):
+                stage.update((key, traced[key]) for key in ('allocations', 'allocated_bytes', 'peak_bytes'))
+            self.stages, self.counters = stages, counters
+        return result
+
+    def run(self, name, func, *args):
+        if not self.tracing:
+            start = time.perf_counter()
+            result = func(*args)
+            self.stages.append({'name': name, 'seconds': time.perf_counter() - start})
+            return result
+        started_tracing = False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = func(*args)
+        stage = {'name': name, 'seconds': time.perf_counter() - start}
+        after = tracemalloc.take_snapshot()
+        differences = after.compare_to(before, 'filename')
+        stage['allocations'] = sum(max(diff.count_diff, 0) for diff in differences)
+        stage['allocated_bytes'] = sum(max(diff.size_diff, 0) for diff in differences)
+        stage['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        self.stages.append(stage)
+        return result
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_connections(self, stage, exits):
+        # Each connection sets one bit on both of its cells
+        total = sum(int(((exits >> bit) & 1).sum()) for bit in range(4)) // 2
+        added = total - self.counters.get('connections', 0)
+        if added:
+            self.counters[f'connections.{stage}'] = added
+        self.counters['connections'] = total
+
+    def record_rooms(self, grid):
+        for region_counts in grid.room_counts.values():
+            for room_type, count in region_counts.items():
+                self.count(f'rooms.{room_type}', count)
+        for code, room_type in enumerate(ROOM_TYPES):
+            if code != EMPTY:
+                self.counters[f'cells.{room_type}'] = int((grid.room_grid == code).sum())
+
+    @property
+    def total_seconds(self):
+        return sum(stage['seconds'] for stage in self.stages)
+
+    def to_dict(self):
+        return {'total_seconds': self.total_seconds, 'stages': self.stages, 'counters': self.counters}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def summary(self):
+        total = self.total_seconds or 1.0
+        lines = [f"{'stage':<24}{'ms':>10}{'%':>7}{'allocs':>10}{'KiB':>10}"]
+        for stage in self.stages:
+            allocations = stage.get('allocations', '-')
+            kib = f"{stage['allocated_bytes'] / 1024:.1f}" if 'allocated_bytes' in stage else '-'
+            lines.append(f"{stage['name']:<24}{stage['seconds'] * 1000:>10.2f}"
+                         f"{stage['seconds'] / total * 100:>7.1f}{allocations:>10}{kib:>10}")
+        lines.append(f"{'total':<24}{self.total_seconds * 1000:>10.2f}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"  {name}: {value}")
+        return "\n".join(lines)
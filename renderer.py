@@ -0,0 +1,262 @@
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+from cells import ROOM_TYPES, EMPTY, SINGLE, EAST, SOUTH
+
+CELL_SIZE = 25
+FONT_SIZE = 14
+BORDER_COLOR = (192, 192, 192)
+PLAYER_COLOR = (255, 0, 0)
+PLAYER_BORDER_COLOR = (255, 255, 255)
+PLAYER_BORDER_THICKNESS = 3
+FONT_NAME = "Helvetica"
+# Cell sizes in pixels, from zoomed out to zoomed in
+ZOOM_LEVELS = (3, 5, 8, 12, 18, 25, 35)
+LABEL_MIN_CELL_SIZE = 10
+
+# System font lookups are slow, so each size is loaded once per process
+fonts = {}
+
+
+def get_font(size, name=FONT_NAME):
+    font = fonts.get((name, size))
+    if font is None:
+        font = fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+
+class TextCache:
+    # LRU caches of rendered text surfaces and of word-wrapped layouts
+    def __init__(self, max_surfaces=1024, max_layouts=256):
+        self.max_surfaces = max_surfaces
+        self.max_layouts = max_layouts
+        self.surfaces = OrderedDict()
+        self.layouts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, cache, key, limit, build):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = cache[key] = build()
+        if len(cache) > limit:
+            cache.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.surfaces.clear()
+        self.layouts.clear()
+
+    def render(self, text, size, color):
+        return self.lookup(self.surfaces, (text, size, color), self.max_surfaces,
+                           lambda: get_font(size).render(text, True, color))
+
+    def wrap(self, text, size, max_width):
+        return self.lookup(self.layouts, (text, size, max_width), self.max_layouts,
+                           lambda: self.layout(text, size, max_width))
+
+    def layout(self, text, size, max_width):
+        # Greedy word wrap in one pass over the words; a line is only measured against its
+        # box width, so the cost is linear in the length of the text
+        font = get_font(size)
+        lines = []
+        for paragraph in text.split('\n'):
+            line = ''
+            for word in paragraph.split(' '):
+                if line and font.size(line + word)[0] > max_width:
+                    lines.append(line)
+                    line = ''
+                line += word + ' '
+            lines.append(line)
+        return tuple(lines)
+
+
+text_cache = TextCache()
+
+
+class TileAtlas:
+    # Every tile for one cell size on a single surface: a room tile per region and room type,
+    # a connector tile per region, the void and the player. Cells are drawn by blitting areas
+    # of the atlas, so nothing is drawn with pygame.draw or rendered as text per frame.
+    columns = 16
+
+    def __init__(self, base_colors, cell_size):
+        self.cell_size = cell_size
+        count = len(base_colors) * len(ROOM_TYPES)
+        rows = -(-count // self.columns)
+        self.surface = pygame.Surface((self.columns * cell_size, rows * cell_size))
+        self.areas = [pygame.Rect(index % self.columns * cell_size, index // self.columns * cell_size,
+                                  cell_size, cell_size) for index in range(count)]
+        self.surface.fill((0, 0, 0))
+        self.draw_tile(PLAYER_TILE, PLAYER_COLOR, PLAYER_BORDER_COLOR, PLAYER_BORDER_THICKNESS, "P")
+        for region, base_color in enumerate(base_colors[1:]):
+            # Connectors take a lighter shade of the room they leave from
+            connector_color = tuple(min(c + 50, 255) for c in base_color)
+            self.draw_tile(tile_index(region, EMPTY), connector_color, BORDER_COLOR, 1)
+            for room_type in range(1, len(ROOM_TYPES)):
+                self.draw_tile(tile_index(region, room_type), base_color, BORDER_COLOR, 1, ROOM_TYPES[room_type])
+
+    def draw_tile(self, index, color, border_color, border, label=None):
+        rect = self.areas[index]
+        pygame.draw.rect(self.surface, color, rect)
+        pygame.draw.rect(self.surface, border_color, rect, border)
+        # Labels only fit from middle zoom levels up
+        if label is not None and self.cell_size >= LABEL_MIN_CELL_SIZE:
+            text_surface = text_cache.render(label, min(FONT_SIZE, self.cell_size), (0, 0, 0))
+            text_width, text_height = text_surface.get_size()
+            self.surface.blit(text_surface, (rect.x + (rect.width - text_width) // 2,
+                                             rect.y + (rect.height - text_height) // 2))
+
+
+def tile_index(region, room_type):
+    # Atlas slot of a cell; region -1 holds the void (type EMPTY) and the player
+    return (region + 1) * len(ROOM_TYPES) + room_type
+
+
+VOID_TILE = tile_index(-1, EMPTY)
+PLAYER_TILE = tile_index(-1, SINGLE)
+
+
+class MapRenderer:
+    # Draws the part of a Map inside a viewport of view_size pixels (the whole map when it is
+    # None), through a camera that follows the player. Only visible cells are drawn, as one
+    # batch of atlas blits, so the cost of a frame depends on the viewport and not on the map.
+    # Between camera moves only the cells the player leaves and enters are redrawn.
+    def __init__(self, game_map, cell_size=CELL_SIZE, view_size=None):
+        self.map = game_map
+        self.cell_size = cell_size
+        self.view_size = view_size
+        self.base_colors = [(255, 255, 255)] + list(game_map.generated_colors)
+        self.atlases = {}
+        # Atlas slot of every cell, with void and empty cells on the void tile
+        regions = game_map.regions.astype(np.int32)
+        tiles = tile_index(regions, game_map.room_types)
+        self.tiles = np.where((regions == -1) | (game_map.room_types == EMPTY), VOID_TILE, tiles).astype(np.int16)
+        # Connector slot of the region each exit leaves from
+        self.connectors = tile_index(regions, EMPTY).astype(np.int16)
+        self.camera = None
+        self.drawn_camera = None
+        self.drawn_player = None
+
+    @property
+    def atlas(self):
+        atlas = self.atlases.get(self.cell_size)
+        if atlas is None:
+            atlas = self.atlases[self.cell_size] = TileAtlas(self.base_colors, self.cell_size)
+        return atlas
+
+    @property
+    def map_size(self):
+        return ((self.map.width * 2 - 1) * self.cell_size, (self.map.height * 2 - 1) * self.cell_size)
+
+    @property
+    def size(self):
+        if self.view_size is None:
+            return self.map_size
+        return tuple(min(view, full) for view, full in zip(self.view_size, self.map_size))
+
+    def view_cells(self):
+        # Cells across and down the viewport, counting the ones cut off at the edges
+        pitch = self.cell_size * 2
+        return tuple(-(-length // pitch) for length in self.size)
+
+    def cell_rect(self, x, y, offset=(0, 0)):
+        camera_x, camera_y = self.camera or (0, 0)
+        return pygame.Rect(offset[0] + (x - camera_x) * 2 * self.cell_size,
+                           offset[1] + (y - camera_y) * 2 * self.cell_size, self.cell_size, self.cell_size)
+
+    def follow(self, room):
+        # Recentre the camera once the player is within a quarter of the view of its edge
+        camera = list(self.camera or (-1, -1))
+        pitch = self.cell_size * 2
+        for axis, (position, view, cells) in enumerate(((room.x, self.size[0], self.map.width),
+                                                        (room.y, self.size[1], self.map.height))):
+            shown = (view - self.cell_size) // pitch + 1  # cells that fit whole
+            margin = shown // 4
+            if self.camera is None or not camera[axis] + margin <= position < camera[axis] + shown - margin:
+                camera[axis] = position - shown // 2
+            camera[axis] = max(0, min(camera[axis], cells - shown))
+        self.camera = tuple(camera)
+
+    def zoom(self, step):
+        # Moves one zoom level in or out; the next update redraws the whole view
+        levels = sorted(set(ZOOM_LEVELS) | {self.cell_size})
+        index = min(max(levels.index(self.cell_size) + step, 0), len(levels) - 1)
+        if levels[index] != self.cell_size:
+            self.cell_size = levels[index]
+            self.camera = None
+            self.drawn_player = None
+        return self.cell_size
+
+    def visible_tiles(self, window, tiles, exits, columns, rows):
+        # (atlas slots, which of them to draw, x and y shift) for the rooms, then the east and
+        # south connectors; a connector off the last column or row of the map leads nowhere
+        camera_x, camera_y = self.camera
+        connectors = self.connectors[window]
+        yield tiles, tiles != VOID_TILE, 0, 0
+        east = (exits & EAST) != 0
+        if camera_x + columns >= self.map.width:
+            east[:, -1] = False
+        yield connectors, east, self.cell_size, 0
+        south = (exits & SOUTH) != 0
+        if camera_y + rows >= self.map.height:
+            south[-1, :] = False
+        yield connectors, south, 0, self.cell_size
+
+    def draw(self, surface, offset=(0, 0)):
+        # Full draw of the visible cells and connectors plus the player
+        player = self.map.get_player_location()
+        self.follow(player)
+        atlas, pitch = self.atlas, self.cell_size * 2
+        camera_x, camera_y = self.camera
+        columns, rows = self.view_cells()
+        view = pygame.Rect(offset, self.size)
+        window = (slice(camera_y, camera_y + rows), slice(camera_x, camera_x + columns))
+        tiles, exits = self.tiles[window], self.map.exits[window]
+        rows, columns = tiles.shape
+        # Screen position of every visible room and connector; void cells are left as background
+        source, areas = atlas.surface, atlas.areas
+        blits = []
+        for tile_grid, mask, dx, dy in self.visible_tiles(window, tiles, exits, columns, rows):
+            ys, xs = np.nonzero(mask)
+            blits += [(source, position, areas[tile]) for tile, position in
+                      zip(tile_grid[mask].tolist(), zip((xs * pitch + offset[0] + dx).tolist(),
+                                                        (ys * pitch + offset[1] + dy).tolist()))]
+        surface.set_clip(view)
+        surface.fill((0, 0, 0), view)
+        surface.blits(blits, doreturn=False)
+        surface.set_clip(None)
+        self.drawn_camera = self.camera
+        self.drawn_player = player
+        self.draw_player(surface, offset, player)
+        return [view]
+
+    def draw_player(self, surface, offset, room):
+        rect = self.cell_rect(room.x, room.y, offset)
+        surface.blit(self.atlas.surface, rect, self.atlas.areas[PLAYER_TILE])
+        return rect
+
+    def restore_cell(self, surface, offset, room):
+        rect = self.cell_rect(room.x, room.y, offset)
+        surface.blit(self.atlas.surface, rect, self.atlas.areas[int(self.tiles[room.y, room.x])])
+        return rect
+
+    def update(self, surface, offset=(0, 0)):
+        # Returns the rectangles that changed; empty when the player has not moved
+        if self.drawn_player is None:
+            return self.draw(surface, offset)
+        player = self.map.get_player_location()
+        if player == self.drawn_player:
+            return []
+        self.follow(player)
+        if self.camera != self.drawn_camera:
+            return self.draw(surface, offset)
+        dirty = [self.restore_cell(surface, offset, self.drawn_player), self.draw_player(surface, offset, player)]
+        self.drawn_player = player
+        return dirty
@@ -1,19 +1,98 @@
+from cells import ROOM_TYPES, EXIT_OFFSETS, DIRECTION_NAMES
+
+
 class Room:
-    def __init__(self, x, y, region, room_type):
+    # A lightweight view of one cell of a Map; all state lives in the Map's arrays
+    __slots__ = ('map', 'x', 'y')
+
+    def __init__(self, map, x, y):
+        self.map = map
         self.x = x
         self.y = y
-        self.region = region
-        self.room_type = room_type  # S, D, M, Q, E, or blank
-        self.connections = set()
-        self.name = ""
-        self.desc = ""
+
+    def __eq__(self, other):
+        return isinstance(other, Room) and self.map is other.map and self.x == other.x and self.y == other.y
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    def __repr__(self):
+        return f"Room({self.x}, {self.y})"
+
+    @property
+    def region(self):
+        return int(self.map.regions[self.y, self.x])
+
+    @property
+    def room_type(self):
+        return ROOM_TYPES[self.map.room_types[self.y, self.x]]  # S, D, M, Q, E, or blank
+
+    @property
+    def exits(self):
+        return int(self.map.exits[self.y, self.x])
+
+    @property
+    def connections(self):
+        return [Room(self.map, self.x + d_col, self.y + d_row)
+                for d_row, d_col in EXIT_OFFSETS[self.map.exits[self.y, self.x]]]
+
+    @property
+    def directions(self):
+        # Exit names in the same order as UI.get_directions lists them
+        exits = self.exits
+        return [name for bit, name in DIRECTION_NAMES.items() if exits & bit]
+
+    @property
+    def name(self):
+        return self.map.get_name(self.map.room_name_id(self.x, self.y))
+
+    @property
+    def desc(self):
+        return self.map.get_desc(self.map.room_desc_id(self.x, self.y))
 
     def add_connection(self, room):
-        self.connections.add(room)
+        self.map.connect_rooms(self, room)
 
     def get_connections(self):
-        return [(conn.x, conn.y) for conn in self.connections]
-    
+        return [(self.x + d_col, self.y + d_row) for d_row, d_col in EXIT_OFFSETS[self.map.exits[self.y, self.x]]]
+
     def set_name_and_description(self, name, description):
-        self.name = name.title()
-        self.desc = description
+        self.map.rename_room(self, name, description)
+
+
+class RoomRow:
+    # rooms[y][x] indexing over a Map without materialising Room objects
+    __slots__ = ('map', 'y')
+
+    def __init__(self, map, y):
+        self.map = map
+        self.y = y
+
+    def __len__(self):
+        return self.map.width
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.map.width:
+            raise IndexError(x)
+        return Room(self.map, x, self.y)
+
+    def __iter__(self):
+        return (Room(self.map, x, self.y) for x in range(self.map.width))
+
+
+class RoomGrid:
+    __slots__ = ('map',)
+
+    def __init__(self, map):
+        self.map = map
+
+    def __len__(self):
+        return self.map.height
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.map.height:
+            raise IndexError(y)
+        return RoomRow(self.map, y)
+
+    def __iter__(self):
+        return (RoomRow(self.map, y) for y in range(self.map.height))
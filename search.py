@@ -0,0 +1,268 @@
+import re
+
+import numpy as np
+
+from cells import ROOM_TYPES, EMPTY
+from room import Room
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+NO_IDS = np.zeros(0, dtype=np.int64)
+# Word tables of the data.json strings, shared by every map built from the same data
+shared_word_tables = {}
+
+
+def words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def word_table(strings, ids):
+    # word -> sorted array of the ids of the strings containing it
+    table = {}
+    for string_id, text in zip(ids, strings):
+        for word in set(words(text)):
+            table.setdefault(word, []).append(string_id)
+    return {word: np.array(sorted(ids), dtype=np.int64) for word, ids in table.items()}
+
+
+def shared_words(content):
+    # (name words, desc words, major type words) over the whole of data.json, built once
+    tables = shared_word_tables.get(content.data_hash)
+    if tables is None:
+        tables = shared_word_tables[content.data_hash] = (
+            word_table(content.names, range(len(content.names))),
+            word_table(content.descs, range(len(content.descs))),
+            word_table([major_type[3] for major_type in content.major_types], range(len(content.major_types))),
+        )
+    return tables
+
+
+def slices(starts, stops):
+    # Indices of the concatenated ranges [start, stop), without a Python loop over the ranges
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if not total:
+        return NO_IDS
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return offsets + np.arange(total)
+
+
+def member(values, ids, low, high):
+    # np.isin for values in [low, high): a lookup in a table of that range instead of a sort
+    table = np.zeros(high - low, dtype=bool)
+    table[ids - low] = True
+    return table[values.astype(np.int64) - low]
+
+
+class Groups:
+    # Cells sorted by a key, so the cells with any set of keys are a few slices of one array
+    def __init__(self, keys, cells):
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.cells = cells[order]
+
+    def find(self, keys):
+        # Searching with the sorted keys' own dtype keeps numpy from converting the whole array
+        keys = np.asarray(keys).astype(self.keys.dtype)
+        return self.cells[slices(np.searchsorted(self.keys, keys, 'left'), np.searchsorted(self.keys, keys, 'right'))]
+
+    def count(self, keys):
+        keys = np.asarray(keys).astype(self.keys.dtype)
+        return int((np.searchsorted(self.keys, keys, 'right') - np.searchsorted(self.keys, keys, 'left')).sum())
+
+
+class SearchIndex:
+    # Rooms by the words of their name, description, major type and region name, facets by
+    # region, room type and major type, and rooms near a point. Text lookups go through the
+    # string ids the map already stores: a word maps to string ids and each id to a slice of
+    # cells. A renamed room is added to a small overlay under its new ids, and every text
+    # match is checked against the map's current ids, so renames never return stale rooms.
+    def __init__(self, game_map):
+        game_map.name_all_rooms()
+        self.map = game_map
+        self.width = game_map.width
+        self.height = game_map.height
+        self.rooms = (game_map.regions != -1) & (game_map.room_types != EMPTY)
+        cells, major_types, _ = game_map.get_namer().draw_major_types()
+        self.major_types = np.full(self.rooms.size, -1, dtype=np.int32)
+        self.major_types[cells] = major_types
+        self.names = Groups(game_map.name_ids.ravel()[cells], cells)
+        self.descs = Groups(game_map.desc_ids.ravel()[cells], cells)
+        facets = game_map.regions.ravel()[cells].astype(np.int64) * len(ROOM_TYPES) + game_map.room_types.ravel()[cells]
+        self.facets = Groups(facets, cells)
+        self.kinds = Groups(major_types, cells)
+        self.name_words, self.desc_words, self.kind_words = shared_words(game_map.content)
+        self.region_words = word_table([game_map.regions_mapping[region] for region in range(game_map.num_regions)],
+                                       range(game_map.num_regions))
+        self.custom_words = {}
+        self.custom_count = 0
+        self.renamed_names = {}  # name id -> cells renamed to it since the index was built
+        self.renamed_descs = {}
+
+    def rename(self, x, y):
+        # Called by Map.rename_room after the room's ids have changed
+        cell = y * self.width + x
+        self.renamed_names.setdefault(int(self.map.name_ids[y, x]), []).append(cell)
+        self.renamed_descs.setdefault(int(self.map.desc_ids[y, x]), []).append(cell)
+
+    def index_custom_strings(self):
+        # Map-specific strings are added to the map as rooms are renamed
+        strings = self.map.custom_strings
+        if self.custom_count < len(strings):
+            table = word_table(strings[self.custom_count:], range(-2 - self.custom_count, -2 - len(strings), -1))
+            for word, ids in table.items():
+                self.custom_words[word] = np.concatenate((self.custom_words.get(word, NO_IDS), ids))
+            self.custom_count = len(strings)
+
+    def word_ids(self, word):
+        # (name ids, desc ids, major types, regions) whose text contains the word
+        self.index_custom_strings()
+        custom = self.custom_words.get(word, NO_IDS)
+        regions = self.region_words.get(word)
+        return (np.concatenate((self.name_words.get(word, NO_IDS), custom)),
+                np.concatenate((self.desc_words.get(word, NO_IDS), custom)),
+                self.kind_words.get(word, NO_IDS),
+                self.facet_keys(regions, None) if regions is not None else NO_IDS)
+
+    def text_cells(self, groups, renamed, live_ids, ids):
+        cells = groups.find(ids)
+        if not renamed:
+            return cells
+        extra = [cell for string_id in ids.tolist() for cell in renamed.get(string_id, ())]
+        if extra:
+            cells = np.concatenate((cells, extra))
+        # Rooms renamed since the index was built are still filed under their old ids
+        return cells[self.has_id(live_ids.ravel()[cells], ids)]
+
+    def word_cells(self, ids):
+        # Sorted cells of every room with the word in any of its text
+        name_ids, desc_ids, kinds, facets = ids
+        cells = np.sort(np.concatenate((self.text_cells(self.names, self.renamed_names, self.map.name_ids, name_ids),
+                                        self.text_cells(self.descs, self.renamed_descs, self.map.desc_ids, desc_ids),
+                                        self.kinds.find(kinds), self.facets.find(facets))))
+        first = np.ones(len(cells), dtype=bool)
+        first[1:] = cells[1:] != cells[:-1]
+        return cells[first]
+
+    def word_count(self, ids):
+        # Upper bound on the rooms word_cells returns, without collecting them
+        name_ids, desc_ids, kinds, facets = ids
+        return (self.names.count(name_ids) + self.descs.count(desc_ids) + self.kinds.count(kinds)
+                + self.facets.count(facets) + len(self.renamed_names) + len(self.renamed_descs))
+
+    def has_word(self, cells, ids):
+        # Which of cells have the word in their current text
+        name_ids, desc_ids, kinds, facets = ids
+        found = self.has_id(self.map.name_ids.ravel()[cells], name_ids)
+        found |= self.has_id(self.map.desc_ids.ravel()[cells], desc_ids)
+        found |= self.has_kind(cells, kinds)
+        if len(facets):
+            found |= member(self.map.regions.ravel()[cells].astype(np.int64) * len(ROOM_TYPES)
+                            + self.map.room_types.ravel()[cells], facets, 0, self.map.num_regions * len(ROOM_TYPES))
+        return found
+
+    def has_id(self, values, ids):
+        # String ids run from the lowest custom string id up to the end of data.json
+        low = -2 - len(self.map.custom_strings)
+        return member(values, ids, low, max(len(self.map.content.names), len(self.map.content.descs)))
+
+    def has_kind(self, cells, kinds):
+        return member(self.major_types[cells], kinds, -1, len(self.map.content.major_types))
+
+    def region_ids(self, region):
+        if region is None or isinstance(region, (int, np.integer)):
+            return None if region is None else np.array([region])
+        ids = [index for index, name in self.map.regions_mapping.items() if name.lower() == region.lower()]
+        if not ids:
+            raise ValueError(f"unknown region {region!r}")
+        return np.array(ids)
+
+    def room_type_code(self, room_type):
+        if room_type is None:
+            return None
+        letters = {name: letter for letter, name in type(self.map).room_type_mapping.items()}
+        letter = letters.get(room_type.lower(), room_type.upper())
+        if len(letter) != 1 or letter == ' ' or letter not in ROOM_TYPES:
+            raise ValueError(f"unknown room type {room_type!r}")
+        return ROOM_TYPES.index(letter)
+
+    def major_type_ids(self, major_type):
+        if major_type is None or isinstance(major_type, (int, np.integer)):
+            return None if major_type is None else np.array([major_type])
+        ids = [index for index, entry in enumerate(self.map.content.major_types)
+               if entry[0] == self.map.genre and entry[3].lower() == major_type.lower()]
+        if not ids:
+            # Major types with spaces can be written with underscores, as in town_gate
+            wanted = major_type.lower().replace('_', ' ')
+            ids = [index for index, entry in enumerate(self.map.content.major_types)
+                   if entry[0] == self.map.genre and entry[3].lower() == wanted]
+        if not ids:
+            raise ValueError(f"unknown major type {major_type!r}")
+        return np.array(ids)
+
+    def facet_keys(self, regions, code):
+        if regions is None:
+            regions = np.arange(self.map.num_regions)
+        codes = np.arange(1, len(ROOM_TYPES)) if code is None else np.array([code])
+        return (regions[:, None] * len(ROOM_TYPES) + codes[None, :]).ravel()
+
+    def window(self, room, distance):
+        # Rooms in the square around room that holds every cell within distance, row-major
+        reach = int(distance)
+        top, left = max(room.y - reach, 0), max(room.x - reach, 0)
+        rows, columns = np.nonzero(self.rooms[top:room.y + reach + 1, left:room.x + reach + 1])
+        return (rows + top) * self.width + columns + left
+
+    def find(self, text="", region=None, room_type=None, major_type=None, near=None, distance=None):
+        # Flat cell indices of the rooms matching every word of text and every given facet.
+        # With near (a Room) they are nearest first, optionally within a straight-line
+        # distance; otherwise in row-major order.
+        regions = self.region_ids(region)
+        code = self.room_type_code(room_type)
+        kinds = self.major_type_ids(major_type)
+        # Collect the rooms of the most selective part of the query, then check the rest of
+        # the query against the map's arrays for just those rooms
+        terms = [self.word_ids(word) for word in words(text)]
+        sources = [(self.word_count(ids), 'word', ids) for ids in terms]
+        if regions is not None or code is not None:
+            keys = self.facet_keys(regions, code)
+            sources.append((self.facets.count(keys), 'facet', keys))
+        if kinds is not None:
+            sources.append((self.kinds.count(kinds), 'kind', kinds))
+        if near is not None and distance is not None:
+            sources.append(((2 * int(distance) + 1) ** 2, 'window', None))
+        if not sources:
+            cells = np.flatnonzero(self.rooms)
+        else:
+            _, source, ids = min(sources, key=lambda source: source[0])
+            if source == 'word':
+                cells = self.word_cells(ids)
+                terms = [term for term in terms if term is not ids]
+            elif source == 'facet':
+                cells = np.sort(self.facets.find(ids))
+            elif source == 'kind':
+                cells = np.sort(self.kinds.find(ids))
+            else:
+                cells = self.window(near, distance)
+        for ids in terms:
+            cells = cells[self.has_word(cells, ids)]
+        if regions is not None:
+            cells = cells[member(self.map.regions.ravel()[cells], regions, -1, self.map.num_regions)]
+        if code is not None:
+            cells = cells[self.map.room_types.ravel()[cells] == code]
+        if kinds is not None:
+            cells = cells[self.has_kind(cells, kinds)]
+        if near is not None:
+            rows, columns = np.divmod(cells, self.width)
+            squared = (columns - near.x) ** 2 + (rows - near.y) ** 2
+            if distance is not None:
+                cells, squared = cells[squared <= distance ** 2], squared[squared <= distance ** 2]
+            cells = cells[np.argsort(squared, kind='stable')]
+        return cells
+
+    def search(self, text="", region=None, room_type=None, major_type=None, near=None, distance=None, limit=None):
+        cells = self.find(text, region, room_type, major_type, near, distance)
+        return [Room(self.map, cell % self.width, cell // self.width) for cell in cells[:limit].tolist()]
+
+    def major_type(self, room):
+        major_type = int(self.major_types[room.y * self.width + room.x])
+        return self.map.content.major_types[major_type][3] if major_type != -1 else ""
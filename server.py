@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+
+from content import load_content
+from world_format import decode_world
+from world_manager import WorldManager
+from world_pool import WorldPool, generate_world
+
+logger = logging.getLogger(__name__)
+
+FIND_LIMIT = 10
+DIRECTIONS = {
+    'n': 'N', 'north': 'N',
+    'e': 'E', 'east': 'E',
+    's': 'S', 'south': 'S',
+    'w': 'W', 'west': 'W',
+}
+HELP = """Commands:
+  new [seed]      start a world of your own
+  join <seed>     enter the world shared by everyone who joins that seed
+  look            describe the current room
+  exits           list the exits of the current room
+  move <N|E|S|W>  walk through an exit (n, e, s and w also work)
+  find <words>    rooms named or described with all the words, nearest first;
+                  narrow with region:<name>, type:<E|S|D|Q|M>, kind:<major type>, within:<distance>
+  stats           server counters
+  quit            disconnect"""
+
+
+class Session:
+    # One connected player: the world they are in and the room they stand in. Players in a
+    # shared world each keep their own position, so the Map's own player is never moved.
+    __slots__ = ('map', 'room', 'shared_seed', 'key')
+
+    def __init__(self):
+        self.map = None
+        self.room = None
+        self.shared_seed = None
+        self.key = None  # the world's key in the server's WorldManager
+
+
+class GameServer:
+    # Line-based text protocol: every command is one line and every response ends with a
+    # blank line. Worlds are generated in a process pool so the event loop only ever does
+    # cheap work, and a single process can keep thousands of sessions open.
+    def __init__(self, workers=None, width=24, height=24, num_regions=5, genre="fantasy", pool_size=8,
+                 memory_budget=None):
+        load_content().genre(genre)  # fail at start-up, not on the first join
+        self.executor = ProcessPoolExecutor(workers)
+        # Unseeded worlds come ready-made from the pool; refills share the generation processes
+        # but leave at least one of them free for seeded worlds
+        workers = workers or os.cpu_count()
+        self.pool = WorldPool(pool_size, workers, max_pending=max(1, workers - 1), executor=self.executor)
+        if pool_size:
+            self.pool.warm(width, height, num_regions, genre)
+        self.width = width
+        self.height = height
+        self.num_regions = num_regions
+        self.genre = genre
+        self.shared_worlds = {}  # seed -> [future of the Map, sessions in it]
+        # Worlds nobody has used for a while are saved to disk when they go over the budget
+        self.worlds = WorldManager(memory_budget)
+        self.world_numbers = count()
+        self.sessions = 0
+        self.total_sessions = 0
+        self.commands = 0
+        self.worlds_generated = 0
+
+    async def generate(self, seed):
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.executor, generate_world, seed, self.width, self.height,
+                                          self.num_regions, self.genre)
+        self.worlds_generated += 1
+        return decode_world(data)
+
+    async def join_shared(self, seed):
+        # Sessions joining a world that is still being generated wait on the same future
+        entry = self.shared_worlds.get(seed)
+        if entry is None:
+            entry = self.shared_worlds[seed] = [asyncio.ensure_future(self.generate(seed)), 0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except BaseException:
+            self.leave_shared(seed)
+            raise
+
+    def leave_shared(self, seed):
+        entry = self.shared_worlds[seed]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self.shared_worlds[seed]
+            self.worlds.discard(('shared', seed))
+
+    def leave(self, session):
+        if session.shared_seed is not None:
+            self.leave_shared(session.shared_seed)
+        elif session.key is not None:
+            self.worlds.discard(session.key)
+        session.map = session.room = session.shared_seed = session.key = None
+
+    def enter(self, session, game_map, shared_seed=None):
+        session.key = ('shared', shared_seed) if shared_seed is not None else ('session', next(self.world_numbers))
+        if session.key not in self.worlds:
+            self.worlds.add(session.key, game_map)
+        session.map = game_map
+        session.room = game_map.get_player_location()
+        session.shared_seed = shared_seed
+        return f"You arrive in world {game_map.seed}.\n" + self.describe(session.room)
+
+    def describe(self, room):
+        return (f"Coordinates: ({room.x}, {room.y})\nRegion: {room.region}\nType: {room.room_type}\n"
+                f"Name: {room.name}\nDescription: {room.desc}\nYou can see exits: {room.directions}")
+
+    async def command_new(self, session, seed=None):
+        if seed is not None:
+            game_map = await self.generate(int(seed))
+        else:
+            game_map = self.pool.take(self.width, self.height, self.num_regions, self.genre)
+            if game_map is None:
+                game_map = await self.generate(random.randrange(2 ** 32))
+        self.leave(session)
+        return self.enter(session, game_map)
+
+    async def command_join(self, session, seed=None):
+        if seed is None:
+            return "Join which seed?"
+        seed = int(seed)
+        game_map = await self.join_shared(seed)
+        self.leave(session)
+        return self.enter(session, game_map, seed)
+
+    async def command_look(self, session):
+        return self.describe(session.room)
+
+    async def command_exits(self, session):
+        return f"You can see exits: {session.room.directions}"
+
+    async def command_move(self, session, direction=None):
+        direction = DIRECTIONS.get((direction or '').lower())
+        if direction is None:
+            return "Move which way? (N, E, S or W)"
+        room = session.map.step(session.room, direction)
+        if room is None:
+            return "You can't go that way."
+        session.room = room
+        return f"You have moved {direction}."
+
+    async def command_find(self, session, *terms):
+        words, filters = [], {}
+        for term in terms:
+            key, separator, value = term.partition(':')
+            if separator and key.lower() in ('region', 'type', 'kind', 'within'):
+                filters[key.lower()] = value
+            else:
+                words.append(term)
+        if not words and not filters:
+            return "Find what?"
+        within = float(filters['within']) if 'within' in filters else None
+        rooms = session.map.search(' '.join(words), filters.get('region'), filters.get('type'), filters.get('kind'),
+                                   session.room, within, FIND_LIMIT + 1)
+        if not rooms:
+            return "No rooms match."
+        index = session.map.get_search_index()
+        lines = [f"({room.x}, {room.y}) {room.name} - {index.major_type(room)}, "
+                 f"{session.map.regions_mapping[room.region]}, {math.hypot(room.x - session.room.x, room.y - session.room.y):.1f} away"
+                 for room in rooms[:FIND_LIMIT]]
+        if len(rooms) > FIND_LIMIT:
+            lines.append("...")
+        return "\n".join(lines)
+
+    async def command_stats(self, session):
+        pool = self.pool.metrics()
+        worlds = self.worlds.metrics()
+        return (f"sessions {self.sessions} (total {self.total_sessions}), shared worlds {len(self.shared_worlds)}, "
+                f"worlds generated {self.worlds_generated}, commands {self.commands}\n"
+                f"pool hit rate {pool['hit_rate']:.0%} ({pool['hits']} hits, {pool['misses']} misses), "
+                f"ready {sum(pool['depth'].values())}, generating {pool['pending']}, "
+                f"refill p50 {pool['refill_seconds']['p50'] * 1000:.0f}ms p99 {pool['refill_seconds']['p99'] * 1000:.0f}ms, "
+                f"failed {pool['failures']}\n"
+                f"worlds resident {worlds['resident_maps']} ({worlds['resident_bytes'] / 2 ** 20:.1f}MB), "
+                f"on disk {worlds['evicted_maps']}, evictions {worlds['evictions']}, restores {worlds['restores']}, "
+                f"restore p50 {worlds['restore_seconds']['p50'] * 1000:.1f}ms p99 {worlds['restore_seconds']['p99'] * 1000:.1f}ms")
+
+    async def command_help(self, session):
+        return HELP
+
+    async def handle_command(self, session, line):
+        words = line.split()
+        if not words:
+            return ""
+        verb, args = words[0].lower(), words[1:]
+        if verb in DIRECTIONS:
+            verb, args = 'move', [verb]
+        command = getattr(self, f'command_{verb}', None)
+        if command is None:
+            return f"Unknown command {verb!r}. Type help for a list."
+        if session.map is None and verb not in ('new', 'join', 'stats', 'help'):
+            return "You are not in a world yet. Use new or join <seed>."
+        try:
+            return await command(session, *args)
+        except (TypeError, ValueError):
+            return "Usage error. Type help for a list."
+        except Exception:
+            # One failed command must not end the session
+            logger.exception("command %r failed", line)
+            return "Something went wrong with that command."
+        finally:
+            if session.map is not None:
+                self.worlds.touch(session.map)
+
+    async def handle_client(self, reader, writer):
+        session = Session()
+        self.sessions += 1
+        self.total_sessions += 1
+        try:
+            writer.write(b"Welcome. Type help for a list of commands.\n\n")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode(errors='replace').strip()
+                if line.lower() == 'quit':
+                    writer.write(b"Goodbye.\n\n")
+                    await writer.drain()
+                    break
+                self.commands += 1
+                response = await self.handle_command(session, line)
+                writer.write(response.encode() + b"\n\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.leave(session)
+            self.sessions -= 1
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=4000, unix_path=None, backlog=4096):
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_client, unix_path, backlog=backlog)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port, backlog=backlog)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.close()
+        self.worlds.close()
+        self.executor.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve worlds to many players over a line-based text protocol")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('--unix', help="listen on this local socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="world generation processes")
+    parser.add_argument('--size', type=int, default=24, help="width and height of generated worlds")
+    parser.add_argument('--regions', type=int, default=5)
+    parser.add_argument('--genre', default="fantasy", choices=load_content().playable_genres())
+    parser.add_argument('--pool', type=int, default=8, help="ready worlds kept for new without a seed, 0 to disable")
+    parser.add_argument('--memory', type=float, help="MB of worlds kept in memory; idle worlds beyond it are saved to disk")
+    args = parser.parse_args()
+    budget = int(args.memory * 2 ** 20) if args.memory is not None else None
+    server = GameServer(args.workers, args.size, args.size, args.regions, args.genre, args.pool, budget)
+    print(f"Serving on {args.unix or f'{args.host}:{args.port}'}")
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
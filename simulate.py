@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.sparse import block_diag
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from cells import ENTRY, EMPTY, NORTH, EAST, SOUTH, WEST
+from content import load_content
+from navigation import exit_graph
+
+DIRECTIONS = (NORTH, EAST, SOUTH, WEST)
+# Exits per exit value, and the direction (index into DIRECTIONS) of the k-th exit of each
+# value, so a random exit is two table lookups
+EXIT_COUNTS = np.array([bin(exits).count('1') for exits in range(16)], dtype=np.int64)
+EXIT_CHOICES = np.array([[index for index, bit in enumerate(DIRECTIONS) if exits & bit] + [0] * (4 - bin(exits).count('1'))
+                         for exits in range(16)], dtype=np.intp)
+EXIT_MASKS = np.array([[bool(exits & bit) for bit in DIRECTIONS] for exits in range(16)])
+STATISTICS = ('rooms', 'coverage', 'dead_end_density', 'hitting_time', 'hit_rate', 'goal_hit_rate',
+              'goal_hitting_time')
+
+
+def neighbour_table(exits, offset):
+    # Flat index of the cell through each exit direction, or the cell itself where there is no exit
+    height, width = exits.shape
+    cells = np.arange(height * width) + offset
+    table = np.repeat(cells[:, None], 4, axis=1)
+    for column, (bit, step) in enumerate(zip(DIRECTIONS, (-width, 1, width, -1))):
+        has_exit = (exits.ravel() & bit) != 0
+        table[has_exit, column] += step
+    return table
+
+
+class WalkSimulation:
+    # Walkers over the connection graphs of one or many maps at once. The maps are laid side by
+    # side in flat arrays and every walker is an entry in a few more, so one step of every
+    # walker on every map is a handful of numpy operations. Reachability and dead ends come
+    # straight from the graph.
+    def __init__(self, maps):
+        # maps: (regions, room_types, exits, (start x, start y)) per map
+        sizes = [exits.size for _, _, exits, _ in maps]
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.num_maps = len(maps)
+        self.map_of_cell = np.repeat(np.arange(self.num_maps), sizes)
+        self.regions = np.concatenate([regions.ravel() for regions, _, _, _ in maps]).astype(np.intp)
+        room_types = np.concatenate([room_types.ravel() for _, room_types, _, _ in maps])
+        self.exits = np.concatenate([exits.ravel() for _, _, exits, _ in maps])
+        self.rooms = (self.regions != -1) & (room_types != EMPTY)
+        self.entries = room_types == ENTRY
+        self.num_regions = np.array([int(regions.max()) + 1 for regions, _, _, _ in maps])
+        self.max_regions = int(self.num_regions.max())
+        self.starts = np.array([offset + y * exits.shape[1] + x
+                                for offset, (_, _, exits, (x, y)) in zip(offsets, maps)])
+        self.neighbours = np.concatenate([neighbour_table(exits, offset)
+                                          for offset, (_, _, exits, _) in zip(offsets, maps)])
+        self.graph = block_diag([exit_graph(exits) for _, _, exits, _ in maps], format='csr')
+
+    @classmethod
+    def from_maps(cls, game_maps):
+        starts = [game_map.get_player_location() for game_map in game_maps]
+        return cls([(game_map.regions, game_map.room_types, game_map.exits, (start.x, start.y))
+                    for game_map, start in zip(game_maps, starts)])
+
+    def per_map(self, mask):
+        return np.bincount(self.map_of_cell[mask], minlength=self.num_maps)
+
+    def reachable(self):
+        # Rooms connected to their map's start room
+        _, labels = connected_components(self.graph, directed=False)
+        return self.rooms & (labels == labels[self.starts[self.map_of_cell]])
+
+    def dead_ends(self):
+        return self.rooms & (EXIT_COUNTS[self.exits] == 1)
+
+    def region_directions(self):
+        # The exit (index into DIRECTIONS) on a shortest path from every cell to each region of
+        # its own map, -1 where the region cannot be reached or the cell is already in it
+        directions = np.full((self.max_regions, self.regions.size), -1, dtype=np.int8)
+        has_exit = EXIT_MASKS[self.exits]
+        for region in range(self.max_regions):
+            sources = np.flatnonzero(self.regions == region)
+            if not len(sources):
+                continue
+            distances = dijkstra(self.graph, directed=False, indices=sources, unweighted=True, min_only=True)
+            through = np.where(has_exit, distances[self.neighbours], np.inf)
+            best = through.argmin(axis=1)
+            closer = through[np.arange(len(best)), best] < distances
+            directions[region, closer] = best[closer]
+        return directions
+
+    def walk(self, starts, steps, rng, goals=None, greed=0.9, counted=None):
+        # Moves every walker `steps` times from `starts`. Random walkers take a random exit.
+        # Walkers with a goal region take the exit closest to it with probability `greed` (one
+        # value or one per walker). Returns the cells visited by the `counted` walkers (all by
+        # default) and each walker's first step in each region of its map, -1 if never.
+        positions = np.array(starts, dtype=np.intp)
+        counted = np.ones(len(starts), dtype=bool) if counted is None else counted
+        visited = np.zeros(self.regions.size, dtype=bool)
+        visited[positions[counted]] = True
+        first_hits = np.full((len(starts), self.max_regions), -1, dtype=np.int32)
+        # Flat index of each walker's row in first_hits
+        rows = np.arange(len(starts)) * self.max_regions
+        first_hits.ravel()[rows + self.regions[positions]] = 0
+        if goals is not None:
+            towards = self.region_directions()
+            greed = np.broadcast_to(np.asarray(greed, dtype=np.float32), positions.shape)
+            goal_walkers = np.flatnonzero(greed > 0)
+            goals, greed = goals[goal_walkers], greed[goal_walkers]
+        for step in range(1, steps + 1):
+            exits = self.exits[positions]
+            choice = (rng.random(len(positions), dtype=np.float32) * EXIT_COUNTS[exits]).astype(np.intp)
+            directions = EXIT_CHOICES[exits, choice]
+            if goals is not None and len(goal_walkers):
+                best = towards[goals, positions[goal_walkers]]
+                greedy = (rng.random(len(goal_walkers), dtype=np.float32) < greed) & (best != -1)
+                directions[goal_walkers[greedy]] = best[greedy]
+            positions = self.neighbours[positions, directions]
+            visited[positions[counted]] = True
+            hits = rows + self.regions[positions]
+            hits = hits[first_hits.ravel()[hits] == -1]
+            first_hits.ravel()[hits] = step
+        return visited, first_hits
+
+    def hitting_times(self, first_hits, starts):
+        # Per map, the mean steps from a region to another one over the walkers that got there
+        # (averaged over region pairs), and the share of walkers that got there
+        maps, start_regions = self.map_of_cell[starts], self.regions[starts]
+        shape = (self.num_maps, self.max_regions, self.max_regions)
+        sums, counts = np.zeros(shape), np.zeros(shape)
+        started = np.zeros(shape[:2])
+        np.add.at(started, (maps, start_regions), 1)
+        walkers, targets = np.nonzero(first_hits > 0)
+        np.add.at(sums, (maps[walkers], start_regions[walkers], targets), first_hits[walkers, targets])
+        np.add.at(counts, (maps[walkers], start_regions[walkers], targets), 1)
+        pairs = ~np.eye(self.max_regions, dtype=bool) & (started[:, :, None] > 0)
+        pairs &= np.arange(self.max_regions)[None, None, :] < self.num_regions[:, None, None]
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            # A map with one region has no pairs, and its means are NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            means = np.where(pairs & (counts > 0), sums / counts, np.nan)
+            rates = np.where(pairs, counts / started[:, :, None], np.nan)
+            return np.nanmean(means, axis=(1, 2)), np.nanmean(rates, axis=(1, 2))
+
+
+def analyse(simulation, walkers=256, steps=400, seed=0, greed=0.9):
+    # Statistics per map from three groups of `walkers` walkers that all move together: random
+    # walkers from the start room for coverage, random walkers from "E" rooms for hitting times
+    # between regions, and walkers from "E" rooms heading for a random other region
+    rng = np.random.default_rng(seed)
+    num_maps = simulation.num_maps
+    reachable = simulation.reachable()
+    rooms = simulation.per_map(simulation.rooms)
+    reachable_rooms = simulation.per_map(reachable)
+    dead_ends = simulation.per_map(simulation.dead_ends())
+    own_map = np.repeat(np.arange(num_maps), walkers)
+    # A random "E" room of each walker's map, or the start room on a map without any
+    entries = np.flatnonzero(simulation.entries)
+    entry_counts = np.bincount(simulation.map_of_cell[entries], minlength=num_maps)
+    first_entry = np.concatenate(([0], np.cumsum(entry_counts)))[:-1]
+    picks = first_entry[own_map] + (rng.random(len(own_map)) * entry_counts[own_map]).astype(np.intp)
+    from_entries = np.where(entry_counts[own_map] > 0, entries[np.minimum(picks, max(len(entries) - 1, 0))]
+                            if len(entries) else 0, simulation.starts[own_map])
+    start_regions = simulation.regions[from_entries]
+    # A map with a single region has no other region to head for; its walkers aim for their own
+    regions = simulation.num_regions[own_map]
+    goals = (start_regions + rng.integers(1, np.maximum(regions, 2))) % regions
+    starts = np.concatenate((simulation.starts[own_map], from_entries, from_entries))
+    group = np.repeat(np.arange(3), len(own_map))
+    visited, first_hits = simulation.walk(starts, steps, rng, np.tile(goals, 3), np.where(group == 2, greed, 0.0),
+                                          counted=group == 0)
+    covered = simulation.per_map(visited & reachable)
+    hitting_time, hit_rate = simulation.hitting_times(first_hits[group == 1], from_entries)
+    goal_hits = first_hits[group == 2][np.arange(len(goals)), goals]
+    reached = goal_hits > 0
+    goal_hit_rate = np.bincount(own_map, weights=reached, minlength=num_maps) / walkers
+    with np.errstate(invalid='ignore', divide='ignore'):
+        goal_hitting_time = (np.bincount(own_map, weights=np.where(reached, goal_hits, 0), minlength=num_maps)
+                             / np.bincount(own_map, weights=reached, minlength=num_maps))
+    results = []
+    for index in range(num_maps):
+        stats = {
+            'rooms': int(rooms[index]),
+            'unreachable_rooms': int(rooms[index] - reachable_rooms[index]),
+            'dead_end_density': float(dead_ends[index] / rooms[index]) if rooms[index] else 0.0,
+            'coverage': float(covered[index] / reachable_rooms[index]) if reachable_rooms[index] else 0.0,
+        }
+        if simulation.num_regions[index] > 1 and entry_counts[index]:
+            stats.update({
+                'hitting_time': float(hitting_time[index]),
+                'hit_rate': float(hit_rate[index]),
+                'goal_hit_rate': float(goal_hit_rate[index]),
+                'goal_hitting_time': float(goal_hitting_time[index]),
+            })
+        results.append({key: (None if isinstance(value, float) and np.isnan(value) else value)
+                        for key, value in stats.items()})
+    return results
+
+
+def simulate_seeds(seeds, width, height, num_regions, genre, walkers, steps, greed):
+    # Runs in a worker process; names are never read, so maps are built without naming
+    from world import build_world
+    game_maps = [build_world(seed, width, height, num_regions, genre, lazy_names=True) for seed in seeds]
+    results = analyse(WalkSimulation.from_maps(game_maps), walkers, steps, seeds[0], greed)
+    for seed, stats in zip(seeds, results):
+        stats['seed'] = seed
+    return results
+
+
+def summarize(results):
+    # Aggregate report: mean, standard deviation and range of every statistic, plus the seeds of
+    # maps with rooms the player can never reach
+    report = {'maps': len(results)}
+    for key in STATISTICS:
+        values = np.array([result[key] for result in results if result.get(key) is not None], dtype=float)
+        if len(values):
+            report[key] = {'mean': float(values.mean()), 'std': float(values.std()),
+                           'min': float(values.min()), 'max': float(values.max())}
+    report['unreachable_rooms'] = sum(result['unreachable_rooms'] for result in results)
+    report['maps_with_unreachable_rooms'] = sorted(result['seed'] for result in results if result['unreachable_rooms'])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk random and goal-directed players over many maps")
+    parser.add_argument('--seeds', type=int, nargs=2, metavar=('START', 'STOP'), default=(0, 1000),
+                        help="half-open seed range, one map per seed")
+    parser.add_argument('--size', type=int, help="width and height of each map")
+    parser.add_argument('--regions', type=int, default=5)
+    parser.add_argument('--genre', default="fantasy", choices=load_content().playable_genres())
+    parser.add_argument('--walkers', type=int, default=256, help="walkers per map in each group")
+    parser.add_argument('--steps', type=int, default=400)
+    parser.add_argument('--greed', type=float, default=0.9,
+                        help="chance a goal-directed walker takes the exit closest to its goal")
+    parser.add_argument('--batch', type=int, default=32, help="maps simulated together in one set of arrays")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--out', help="write the per-map results and the report to this JSON file")
+    args = parser.parse_args()
+    seeds = list(range(*args.seeds))
+    batches = [seeds[start:start + args.batch] for start in range(0, len(seeds), args.batch)]
+    job = partial(simulate_seeds, width=args.size, height=args.size, num_regions=args.regions, genre=args.genre,
+                  walkers=args.walkers, steps=args.steps, greed=args.greed)
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        results = [stats for batch in pool.imap(job, batches) for stats in batch]
+    elapsed = time.perf_counter() - start
+    report = summarize(results)
+    report['seconds'] = elapsed
+    print(f"{len(results)} maps in {elapsed:.1f}s ({len(results) / elapsed * 60:.0f} maps/minute)")
+    for key in STATISTICS:
+        if key in report:
+            value = report[key]
+            print(f"{key:>20}: mean {value['mean']:.3f}  std {value['std']:.3f}  "
+                  f"min {value['min']:.3f}  max {value['max']:.3f}")
+    broken = report['maps_with_unreachable_rooms']
+    print(f"{'unreachable rooms':>20}: {report['unreachable_rooms']} in {len(broken)} maps"
+          + (f" (seeds {broken[:10]})" if broken else ""))
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump({'report': report, 'maps': results}, file, indent=2)
+    # A map with unreachable rooms is a generation bug, so scripts can fail on it
+    sys.exit(1 if report['unreachable_rooms'] else 0)
+
+
+if __name__ == '__main__':
+    main()
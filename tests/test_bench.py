@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+import bench
+
+
+def results(commit, **cases):
+    return {'commit': commit, 'results': cases}
+
+
+def run_bench(*args):
+    # In a child process: the suite draws with pygame, which must not be running in a process
+    # that later forks generation workers
+    return subprocess.run([sys.executable, 'bench.py', *args], cwd=os.path.dirname(bench.__file__),
+                          capture_output=True, text=True)
+
+
+def run_suite(tmp_path, *args):
+    saved = run_bench('suite', '--quick', '--repeat', '1', '--out', str(tmp_path), *args)
+    assert saved.returncode == 0, saved.stderr
+    path = saved.stdout.strip().splitlines()[-1].split()[-1]
+    assert os.path.dirname(path) == str(tmp_path)
+    return bench.load_results(path)
+
+
+def test_the_quick_suite_times_every_case(tmp_path):
+    run = run_suite(tmp_path)
+    names = [name for name, _ in bench.suite_cases(quick=True)]
+    assert len(names) == len(set(names))
+    assert set(names) <= set(run['results'])
+    assert any(name.startswith('stage/50x50/') for name in run['results'])
+    assert all(seconds > 0 for seconds in run['results'].values())
+    assert run['repeat'] == 1 and run['commit']
+
+
+def test_a_filter_runs_only_matching_cases(tmp_path):
+    run = run_suite(tmp_path, '--filter', 'grid/25x25')
+    assert sorted(run['results']) == ['grid/25x25/10', 'grid/25x25/5']
+
+
+def test_results_are_saved_per_commit(tmp_path):
+    run = results('abc123', case=0.5)
+    path = bench.save_results(run, str(tmp_path))
+    assert path == str(tmp_path / 'abc123.json')
+    assert bench.load_results(path) == run
+
+
+def test_only_real_slowdowns_are_flagged(capsys):
+    base = results('a', slower=0.010, noise=0.0001, faster=0.010, same=0.010)
+    current = results('b', slower=0.012, noise=0.0002, faster=0.005, same=0.0105, added=0.3)
+    assert bench.compare_results(base, current, 0.1, min_delta=0.00025) == ['slower']
+    output = capsys.readouterr().out
+    assert 'SLOWER' in output and 'faster' in output and 'new' in output
+
+
+def test_compare_exits_with_status_1_on_a_slowdown(tmp_path):
+    paths = {}
+    for name, seconds in (('base', 0.010), ('same', 0.010), ('slow', 0.020)):
+        paths[name] = tmp_path / f"{name}.json"
+        paths[name].write_text(json.dumps(results(name, case=seconds)))
+
+    def compare(current):
+        return run_bench('compare', str(paths['base']), str(paths[current]))
+    assert compare('same').returncode == 0
+    slow = compare('slow')
+    assert slow.returncode == 1 and "1 case(s) slower" in slow.stdout
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from cells import EMPTY, SINGLE, ENTRY, NORTH, EAST, SOUTH, WEST
+from chunked_world import ChunkedMap, ChunkGrid
+from grid import Grid
+from navigation import bfs_distances, exit_graph
+
+
+def seam_cells(world, chunk_x, chunk_y):
+    size = world.chunk_size
+    return [
+        (world.seam_offset(chunk_x, chunk_y, 'E'), size - 1, EAST),
+        (world.seam_offset(chunk_x - 1, chunk_y, 'E'), 0, WEST),
+        (size - 1, world.seam_offset(chunk_x, chunk_y, 'S'), SOUTH),
+        (0, world.seam_offset(chunk_x, chunk_y - 1, 'S'), NORTH),
+    ]
+
+
+def test_every_room_of_a_chunk_is_reachable_from_its_entry_room():
+    for seed in range(40):
+        world = ChunkedMap(seed=seed, chunk_size=16, regions_per_chunk=6)
+        for chunk_x, chunk_y in ((0, 0), (1, 0), (0, 1), (-1, -1)):
+            chunk = world.get_chunk(chunk_x, chunk_y)
+            seams = seam_cells(world, chunk_x, chunk_y)
+            row, col, _ = seams[0]
+            distances = bfs_distances(exit_graph(chunk.exits), [row * world.chunk_size + col])
+            rooms = (chunk.regions != -1) & (chunk.room_types != EMPTY)
+            reached = distances.reshape(chunk.exits.shape) >= 0
+            assert not (rooms & ~reached).any(), (seed, chunk_x, chunk_y)
+            for row, col, bit in seams:
+                assert rooms[row, col] and chunk.exits[row, col] & bit, (seed, chunk_x, chunk_y, bit)
+
+
+def test_walking_across_a_seam():
+    world = ChunkedMap(seed=3, chunk_size=12)
+    row = world.seam_offset(0, 0, 'E')
+    world.player_position = (11, row)
+    assert world.move_player('E') == "You have moved E."
+    assert world.player_position == (12, row)
+    assert world.move_player('W') == "You have moved W."
+
+
+def seam_chunk(grid):
+    chunk = ChunkGrid.__new__(ChunkGrid)
+    chunk.grid, chunk.height, chunk.width = grid.grid, grid.height, grid.width
+    return chunk
+
+
+def test_a_dropped_seam_cell_joins_its_region_again():
+    grid = Grid(12, 12, 4, seed=5)
+    row = int(np.flatnonzero(grid.grid[:, -1] == -1)[0])
+    inward = int(np.flatnonzero(grid.grid[row] != -1)[-1])
+    seam_chunk(grid).fill_seam_cell(row, 11, EAST)
+    assert (grid.grid[row, inward:] == grid.grid[row, inward]).all()
+
+
+def test_a_seam_cell_with_no_region_inward_fails_loudly():
+    grid = Grid(12, 12, 4, seed=5)
+    grid.grid[3] = -1
+    with pytest.raises(ValueError):
+        seam_chunk(grid).fill_seam_cell(3, 11, EAST)
+    with pytest.raises(ValueError):
+        seam_chunk(grid).fill_seam_cell(3, 0, WEST)
+
+
+def test_reserved_cells_are_fitted_as_single_rooms():
+    for seed in range(20):
+        grid = Grid(12, 12, 4, seed=seed, uneven_edges=False)
+        grid.reserved = [(0, 5), (11, 7), (4, 0), (6, 11)]
+        grid.fit_rooms()
+        assert (grid.room_grid[tuple(zip(*grid.reserved))] == SINGLE).all()
+        for region, counts in grid.room_counts.items():
+            cells = counts['S'] + 2 * counts['D'] + 3 * counts['M'] + 4 * counts['Q']
+            assert cells == (grid.grid == region).sum(), (seed, region)
+
+
+def test_entry_rooms_at_seams_take_no_cell_of_a_larger_room():
+    world = ChunkedMap(seed=1, chunk_size=12)
+    for seed in range(20):
+        seams = seam_cells(world, seed, 0)
+        grid = ChunkGrid(12, 5, seed, seams)
+        cells = tuple(zip(*[(row, col) for row, col, _ in seams]))
+        assert (grid.room_grid[cells] == ENTRY).all()
+        # Fitting again gives the rooms the entry rooms were written over
+        grid.fit_rooms()
+        assert (grid.room_grid[cells] == SINGLE).all(), seed
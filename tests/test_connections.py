@@ -0,0 +1,69 @@
+import numpy as np
+
+from cells import DOUBLE, QUAD, MULTI, SINGLE, ENTRY, EAST, SOUTH, OPPOSITE, BIT_OFFSETS
+from grid import Grid
+
+
+def unlinked(seed):
+    grid = Grid(24, 24, 6, seed=seed)
+    grid.exits[...] = 0
+    return grid
+
+
+def pairs(grid):
+    # Every pair of orthogonal neighbours inside the grid, with the exit bit between them
+    for row in range(grid.height):
+        for col in range(grid.width):
+            for bit in (EAST, SOUTH):
+                d_row, d_col = BIT_OFFSETS[bit]
+                if row + d_row < grid.height and col + d_col < grid.width:
+                    yield (row, col), (row + d_row, col + d_col), bit
+
+
+def assert_symmetric(grid):
+    for cell, other, bit in pairs(grid):
+        assert bool(grid.exits[cell] & bit) == bool(grid.exits[other] & OPPOSITE[bit])
+
+
+def test_room_cells_are_joined_within_their_room_type_and_region():
+    for seed in range(5):
+        grid = unlinked(seed)
+        grid.connect_room_cells()
+        assert_symmetric(grid)
+        for cell, other, bit in pairs(grid):
+            expected = (grid.room_grid[cell] in (DOUBLE, QUAD, MULTI) and grid.room_grid[cell] == grid.room_grid[other]
+                        and grid.grid[cell] == grid.grid[other] != -1)
+            assert bool(grid.exits[cell] & bit) == expected, (seed, cell, other)
+
+
+def test_single_rooms_link_to_at_least_two_neighbours_of_their_region():
+    for seed in range(5):
+        grid = unlinked(seed)
+        grid.connect_S_rooms()
+        assert_symmetric(grid)
+        for row, col in zip(*np.nonzero(grid.room_grid == SINGLE)):
+            bits = [bit for bit in BIT_OFFSETS if grid.same_region_neighbours(bit)[row, col]]
+            assert all(bit in bits for bit in BIT_OFFSETS if grid.exits[row, col] & bit)
+            assert bin(int(grid.exits[row, col])).count('1') >= min(2, len(bits)), (seed, row, col)
+        # The links come from per-region streams, so they repeat exactly
+        again = unlinked(seed)
+        again.connect_S_rooms()
+        assert np.array_equal(grid.exits, again.exits)
+
+
+def test_facing_entry_rooms_are_joined_and_linked_into_their_regions():
+    for seed in range(5):
+        grid = unlinked(seed)
+        grid.connect_E_rooms()
+        assert_symmetric(grid)
+        linked = set()
+        for cell, other, bit in pairs(grid):
+            if grid.room_grid[cell] == grid.room_grid[other] == ENTRY and grid.grid[cell] != grid.grid[other]:
+                assert grid.exits[cell] & bit
+                linked.update((cell, other))
+        assert linked
+        for cell, other, bit in pairs(grid):
+            if grid.grid[cell] == grid.grid[other] != -1:
+                assert bool(grid.exits[cell] & bit) == (cell in linked or other in linked), (seed, cell, other)
+            elif not (cell in linked and other in linked):
+                assert not grid.exits[cell] & bit
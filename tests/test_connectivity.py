@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from scipy.ndimage import label
+from scipy.sparse.csgraph import connected_components
+
+from cells import EMPTY
+from grid import Grid
+from map import Map
+from navigation import exit_graph
+
+
+def unreachable_rooms(game_map):
+    start = game_map.get_player_location()
+    _, labels = connected_components(exit_graph(game_map.exits), directed=False)
+    labels = labels.reshape(game_map.exits.shape)
+    rooms = (game_map.regions != -1) & (game_map.room_types != EMPTY)
+    return int(np.count_nonzero(rooms & (labels != labels[start.y, start.x])))
+
+
+@pytest.mark.parametrize('uneven_edges', [True, False])
+@pytest.mark.parametrize('width, height', [(6, 6), (12, 12), (18, 8), (25, 25)])
+@pytest.mark.parametrize('num_regions', [1, 2, 5, 18])
+def test_every_room_is_reachable(width, height, num_regions, uneven_edges):
+    for seed in range(25):
+        game_map = Map(Grid(width, height, num_regions, seed=seed, uneven_edges=uneven_edges), verbose=False)
+        assert unreachable_rooms(game_map) == 0, seed
+
+
+def test_borders_on_the_last_row_and_column_get_entry_rooms():
+    # Reported with regions that only meet along the bottom row or the right-hand column
+    game_map = Map(Grid(18, 8, 18, seed=65), verbose=False)
+    assert unreachable_rooms(game_map) == 0
+
+
+def test_every_region_is_one_piece():
+    for seed in range(50):
+        grid = Grid(18, 18, 18, seed=seed, uneven_edges=seed % 2 == 0)
+        for region in np.unique(grid.grid[grid.grid != -1]).tolist():
+            _, pieces = label(grid.grid == region)
+            assert pieces == 1, (seed, region)
+
+
+def hand_made(regions):
+    grid = Grid.__new__(Grid)
+    grid.grid = np.array(regions, dtype=np.int8)
+    grid.height, grid.width = grid.grid.shape
+    grid.num_regions = int(grid.grid.max()) + 1
+    return grid
+
+
+def test_regions_meeting_only_on_the_last_row_get_an_entry_pair():
+    # Regions 0 and 2 only touch along the bottom row, 1 and 2 only along the right-hand column.
+    # Before the fix neither border got its pair of "E" rooms.
+    grid = hand_made([[0, 0, 0, 1],
+                      [0, -1, -1, 1],
+                      [0, 2, 2, 2]])
+    entry = grid.entry_cells()
+    assert entry[2, 0] and entry[2, 1]
+    assert entry[1, 3] and entry[2, 3]
+
+
+def test_a_region_walled_off_by_void_is_dropped():
+    # Region 1 touches the others only diagonally, through void cells, so no "E" room can join
+    # it to them. Before the fix it stayed, and its rooms could never be reached.
+    grid = hand_made([[0, 0, -1, -1],
+                      [0, 0, -1, -1],
+                      [-1, -1, 1, 1]])
+    grid.drop_cut_off_cells()
+    assert (grid.grid[:2, :2] == 0).all()
+    assert (grid.grid[2] == -1).all()
+
+
+def test_cut_off_cells_are_dropped_without_uneven_edges():
+    # Solid-edged grids used to skip drop_cut_off_cells; the Voronoi split alone can leave a
+    # diagonal-only piece, as in these maps, which all had unreachable rooms before the fix
+    for width, height, num_regions, seed in ((18, 8, 18, 65), (18, 18, 18, 64)):
+        game_map = Map(Grid(width, height, num_regions, seed=seed, uneven_edges=False), verbose=False)
+        assert unreachable_rooms(game_map) == 0
@@ -0,0 +1,73 @@
+import hashlib
+import json
+
+import pytest
+
+from content import DATA_PATH, Content, compiled_path, load_content
+from grid import Grid
+from map import Map
+
+DATA = {'genres': {
+    'tiny': {'regions': {'Cellar': {'S': {'Barrel Room': {'name': ['Dusty Barrels'], 'desc': ['Old casks.']}}}}},
+    'empty': {},
+}}
+
+
+def write_data(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_loading_compiles_the_tables_next_to_the_data(tmp_path):
+    path = write_data(tmp_path / 'data.json', DATA)
+    content = load_content.__wrapped__(path)
+    assert compiled_path(path) == str(tmp_path / 'data.compiled')
+    with open(compiled_path(path), 'rb') as file:
+        compiled = Content.from_compiled(file.read(), content.data_hash)
+    assert compiled.names == content.names == ['Dusty Barrels']
+    assert compiled.genre_tables == content.genre_tables
+
+
+def test_compiled_tables_are_loaded_without_parsing_the_data(tmp_path, monkeypatch):
+    path = write_data(tmp_path / 'data.json', DATA)
+    load_content.__wrapped__(path)
+
+    def parse(*args):
+        raise AssertionError("data.json parsed again")
+    monkeypatch.setattr(Content, 'from_data', parse)
+    assert load_content.__wrapped__(path).descs == ['Old casks.']
+
+
+def test_stale_compiled_tables_are_rebuilt(tmp_path):
+    path = write_data(tmp_path / 'data.json', DATA)
+    load_content.__wrapped__(path)
+    changed = json.loads(json.dumps(DATA))
+    changed['genres']['tiny']['regions']['Cellar']['S']['Barrel Room']['name'] = ['Damp Barrels']
+    write_data(tmp_path / 'data.json', changed)
+    assert load_content.__wrapped__(path).names == ['Damp Barrels']
+    with open(compiled_path(path), 'rb') as file:
+        assert Content.from_compiled(file.read(), load_content.__wrapped__(path).data_hash).names == ['Damp Barrels']
+
+
+def test_the_shipped_compiled_tables_match_data_json():
+    with open(DATA_PATH, 'rb') as file:
+        data = file.read()
+    with open(compiled_path(DATA_PATH), 'rb') as file:
+        content = Content.from_compiled(file.read(), hashlib.sha256(data).hexdigest())
+    assert content is not None
+    assert content.names == Content.from_data(json.loads(data), content.data_hash).names
+
+
+def test_genre_parameter():
+    content = Content.from_data(DATA, 'hash')
+    assert content.playable_genres() == ['tiny']
+    assert content.genre('tiny') is content.genre('tiny')
+    assert content.genre('tiny').regions == ['Cellar']
+    with pytest.raises(ValueError, match="no room data"):
+        content.genre('empty')
+    with pytest.raises(ValueError, match="unknown genre"):
+        content.genre('opera')
+    grid = Grid(10, 10, 3, seed=1)
+    assert Map(grid, genre='fantasy', verbose=False).genre_content.name == 'fantasy'
+    with pytest.raises(ValueError):
+        Map(grid, genre='opera', verbose=False)
@@ -0,0 +1,34 @@
+import numpy as np
+
+from grid import Grid
+from map import Map
+from world import build_world
+
+ARRAYS = ('regions', 'room_types', 'exits', 'name_ids', 'desc_ids')
+
+
+def test_same_seed_same_world():
+    for seed in (0, 1, 12345, 2 ** 32 - 1):
+        first, second = build_world(seed, 20, 15, 5), build_world(seed, 20, 15, 5)
+        for name in ARRAYS:
+            assert np.array_equal(getattr(first, name), getattr(second, name)), (seed, name)
+        assert first.to_dict() == second.to_dict()
+        start, other_start = first.get_player_location(), second.get_player_location()
+        assert (start.x, start.y) == (other_start.x, other_start.y)
+        assert first.generated_colors == second.generated_colors
+
+
+def test_seed_picks_the_size_when_none_is_given():
+    assert Grid(seed=7).grid.shape == Grid(seed=7).grid.shape
+
+
+def test_other_seeds_differ():
+    worlds = [build_world(seed, 20, 15, 5) for seed in range(4)]
+    assert len({world.exits.tobytes() for world in worlds}) == len(worlds)
+
+
+def test_seeded_grid_is_reproduced_by_its_seed():
+    grid = Grid(16, 12, 4)
+    again = Grid(16, 12, 4, seed=grid.seed)
+    assert np.array_equal(grid.exits, again.exits)
+    assert Map(grid, verbose=False).to_dict() == Map(again, verbose=False).to_dict()
@@ -0,0 +1,53 @@
+import io
+
+from cells import ROOM_TYPES, EAST, SOUTH
+from export import write_ascii
+from grid import Grid
+from map import Map
+
+# Grid(8, 5, 3, seed=11).print_map(), with the trailing spaces of every line
+GOLDEN = "".join(line + "\n" for line in [
+    'S-D-D S-M-M   D ',
+    '| |   | | |   | ',
+    'S-S M E-M-M-M D ',
+    '  | | | | | | | ',
+    '  S-M-E M-M-M-S ',
+    '  | | | |   | | ',
+    '  S-M-E S-S-M-S ',
+    '      |   |     ',
+    '    M-E-E-E     ',
+])
+
+
+def baseline_print_map(grid):
+    # Grid.print_map as it was before export.write_ascii: one letter per room, "-" after it when
+    # it connects east, then a line of "|" under rooms that connect south
+    out = io.StringIO()
+    for row in range(grid.height):
+        row_line = ""
+        for col in range(grid.width):
+            row_line += ROOM_TYPES[grid.room_grid[row, col]]
+            row_line += "-" if grid.exits[row, col] & EAST else " "
+        print(row_line, file=out)
+        if row < grid.height - 1:
+            for col in range(grid.width):
+                print("|" if grid.exits[row, col] & SOUTH else " ", end=" ", file=out)
+            print(file=out)
+    return out.getvalue()
+
+
+def test_ascii_export_matches_the_golden_map(capsys):
+    grid = Grid(8, 5, 3, seed=11)
+    grid.print_map()
+    assert capsys.readouterr().out == GOLDEN
+
+
+def test_ascii_export_matches_the_baseline_print_map():
+    for seed in range(10):
+        grid = Grid(30, 20, 5, seed=seed)
+        expected = baseline_print_map(grid)
+        text, binary = io.StringIO(), io.BytesIO()
+        write_ascii(grid, text)
+        write_ascii(Map(grid, verbose=False, lazy_names=True), binary)
+        assert text.getvalue() == expected
+        assert binary.getvalue().decode('ascii') == expected
@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+
+from generate import generate_one
+from world import build_world
+from world_format import load_world
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_generate_one_writes_the_seeded_world(tmp_path):
+    seed, generated, written, cells = generate_one(4, 16, 12, 4, "fantasy", str(tmp_path))
+    assert (seed, cells) == (4, 16 * 12) and 0 <= generated <= written
+    assert load_world(str(tmp_path / "world_4.world")).to_dict() == build_world(4, 16, 12, 4).to_dict()
+
+
+def test_json_output(tmp_path):
+    generate_one(5, 10, 9, 3, "fantasy", str(tmp_path), output_format='json')
+    with open(tmp_path / "world_5.json") as file:
+        assert json.load(file) == json.loads(json.dumps(build_world(5, 10, 9, 3).to_dict()))
+
+
+def test_command_line(tmp_path):
+    result = subprocess.run([sys.executable, "generate.py", "--seeds", "0", "3", "--size", "12", "--regions", "3",
+                             "--workers", "2", "--out", str(tmp_path), "--quiet", "--profile"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.startswith("3 maps in ")
+    assert sorted(os.listdir(tmp_path)) == sorted(f"world_{seed}.{kind}" for seed in range(3)
+                                                  for kind in ("world", "profile.json"))
+    for seed in range(3):
+        assert load_world(str(tmp_path / f"world_{seed}.world")).to_dict() == build_world(seed, 12, 12, 3).to_dict()
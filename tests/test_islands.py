@@ -0,0 +1,42 @@
+import numpy as np
+
+from cells import EAST, SOUTH
+from grid import Grid
+
+
+def region_pieces(grid, region):
+    # Pieces of one region joined by its own exits
+    mask = grid.grid == region
+    east = (grid.exits & EAST).astype(bool) & grid.same_region_neighbours(EAST)
+    south = (grid.exits & SOUTH).astype(bool) & grid.same_region_neighbours(SOUTH)
+    labels = grid.pieces(east, south).reshape(grid.grid.shape)
+    return len(np.unique(labels[mask]))
+
+
+def test_every_region_is_linked_into_one_piece():
+    for seed in range(20):
+        grid = Grid(22, 18, 6, seed=seed)
+        for region in np.unique(grid.grid[grid.grid != -1]).tolist():
+            assert region_pieces(grid, region) == 1, (seed, region)
+
+
+def test_one_connection_per_merge():
+    # From no connections at all, stitching must join each region with a spanning tree
+    grid = Grid(16, 12, 4, seed=3)
+    grid.exits[...] = 0
+    grid.islands_stitched = 0
+    grid.connect_isolated_islands()
+    land = grid.grid != -1
+    regions = np.unique(grid.grid[land])
+    assert grid.islands_stitched == np.count_nonzero(land) - len(regions)
+    for region in regions.tolist():
+        assert region_pieces(grid, region) == 1
+    links = sum(int(np.count_nonzero(grid.exits & bit)) for bit in (EAST, SOUTH))
+    assert links == grid.islands_stitched
+
+
+def test_stitching_leaves_connected_regions_alone():
+    grid = Grid(16, 12, 4, seed=5)
+    exits = grid.exits.copy()
+    grid.connect_isolated_islands()
+    assert np.array_equal(grid.exits, exits)
@@ -0,0 +1,32 @@
+import numpy as np
+
+from grid import Grid
+from map import Map
+from world_format import decode_world, encode_world
+
+
+def test_lazy_names_match_eager_names():
+    for seed in range(5):
+        eager = Map(Grid(18, 14, 5, seed=seed), verbose=False)
+        lazy = Map(Grid(18, 14, 5, seed=seed), verbose=False, lazy_names=True)
+        # Read a few rooms out of order first, then the rest
+        for x, y in ((17, 13), (3, 9), (0, 0)):
+            assert lazy.get_room(x, y).name == eager.get_room(x, y).name
+            assert lazy.get_room(x, y).desc == eager.get_room(x, y).desc
+        lazy.name_all_rooms()
+        assert np.array_equal(lazy.name_ids, eager.name_ids)
+        assert np.array_equal(lazy.desc_ids, eager.desc_ids)
+        assert lazy.to_dict() == eager.to_dict()
+
+
+def test_saving_a_lazy_map_names_every_room():
+    eager = Map(Grid(18, 14, 5, seed=1), verbose=False)
+    lazy = Map(Grid(18, 14, 5, seed=1), verbose=False, lazy_names=True)
+    assert decode_world(encode_world(lazy)).to_dict() == eager.to_dict()
+
+
+def test_quiet_map_prints_nothing(capsys):
+    game_map = Map(Grid(10, 8, 3, seed=4), verbose=False)
+    game_map.room_types[...] = 0
+    assert game_map.choose_player_start() is False
+    assert capsys.readouterr().out == ""
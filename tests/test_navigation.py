@@ -0,0 +1,57 @@
+import random
+
+from cells import EAST, SOUTH
+from grid import Grid
+from map import Map
+from navigation import NavigationIndex, bfs_distances, exit_graph
+
+
+def test_distance_matches_a_breadth_first_search():
+    game_map = Map(Grid(30, 30, 6, seed=4), verbose=False, lazy_names=True)
+    graph = exit_graph(game_map.exits)
+    rooms = [(x, y) for y in range(30) for x in range(30) if game_map.room_types[y, x] != 0]
+    rng = random.Random(4)
+    for _ in range(50):
+        start, goal = game_map.get_room(*rng.choice(rooms)), game_map.get_room(*rng.choice(rooms))
+        expected = int(bfs_distances(graph, [start.y * 30 + start.x])[0][goal.y * 30 + goal.x])
+        assert game_map.distance(start, goal) == (expected if expected != -1 else None)
+        assert game_map.distance(start, start) == 0
+
+
+def unconnected_pairs(game_map, rng, count):
+    height, width = game_map.exits.shape
+    pairs = []
+    while len(pairs) < count:
+        x, y = rng.randrange(width - 1), rng.randrange(height - 1)
+        dx, dy = rng.choice(((1, 0), (0, 1)))
+        room, other = game_map.get_room(x, y), game_map.get_room(x + dx, y + dy)
+        bit = EAST if dx else SOUTH
+        if room is not None and other is not None and not game_map.exits[y, x] & bit:
+            pairs.append((room, other))
+    return pairs
+
+
+def test_added_connections_update_the_tables_in_place():
+    game_map = Map(Grid(24, 24, 5, seed=9), verbose=False, lazy_names=True)
+    navigation = game_map.get_navigation()
+    rooms = [game_map.get_room(x, y) for y in range(24) for x in range(24) if game_map.room_types[y, x] != 0]
+    rng = random.Random(9)
+    # Region tables are only kept up to date once they exist
+    for region in range(5):
+        navigation.region_table(region)
+    for room, other in unconnected_pairs(game_map, rng, 30):
+        game_map.connect_rooms(room, other)
+    rebuilt = NavigationIndex(game_map)
+    assert (navigation.nearest_entry_distance == rebuilt.nearest_entry_distance).all()
+    assert navigation.region_graph == rebuilt.region_graph
+    graph = exit_graph(game_map.exits)
+    for landmark, distances in zip(navigation.landmarks, navigation.landmark_distances):
+        assert (distances == bfs_distances(graph, [landmark])[0]).all()
+    for region, (positions, distances) in navigation.region_tables.items():
+        assert (distances == rebuilt.region_table(region)[1]).all()
+    for _ in range(50):
+        start, goal = rng.choice(rooms), rng.choice(rooms)
+        expected = int(bfs_distances(graph, [start.y * 24 + start.x])[0][goal.y * 24 + goal.x])
+        assert game_map.distance(start, goal) == (expected if expected != -1 else None)
+        if start.region == goal.region:
+            assert game_map.region_distance(start, goal) == rebuilt.region_distance(start, goal)
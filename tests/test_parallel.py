@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from grid import Grid
+from map import Map
+
+
+@pytest.mark.parametrize('width, height, num_regions', [(12, 12, 1), (18, 8, 18), (30, 24, 6)])
+def test_parallel_regions_match_serial(width, height, num_regions):
+    for seed in range(4):
+        serial = Grid(width, height, num_regions, seed=seed)
+        parallel = Grid(width, height, num_regions, seed=seed, workers=2)
+        for name in ('grid', 'room_grid', 'exits'):
+            assert np.array_equal(getattr(serial, name), getattr(parallel, name)), (seed, name)
+        assert serial.room_counts == parallel.room_counts
+
+
+def test_parallel_map_matches_serial():
+    serial = Map(Grid(20, 20, 5, seed=3), verbose=False)
+    parallel = Map(Grid(20, 20, 5, seed=3, workers=3), verbose=False)
+    assert serial.to_dict() == parallel.to_dict()
@@ -0,0 +1,40 @@
+import numpy as np
+
+from grid import Grid
+from map import Map
+from profiler import GenerationProfile
+from world import build_world
+
+
+def test_profiled_build_gives_the_same_world():
+    profile = GenerationProfile()
+    game_map = build_world(seed=9, width=20, height=16, num_regions=4, profile=profile)
+    plain = Map(Grid(20, 16, 4, seed=9), verbose=False)
+    assert np.array_equal(game_map.exits, plain.exits)
+    assert np.array_equal(game_map.name_ids, plain.name_ids)
+
+
+def test_times_and_allocations_for_every_stage():
+    profile = GenerationProfile()
+    game_map = build_world(seed=9, width=20, height=16, num_regions=4, profile=profile)
+    names = [stage['name'] for stage in profile.stages]
+    assert names[:3] == ['generate_voronoi_grid', 'make_uneven_edges', 'drop_cut_off_cells']
+    assert len(names) == len(set(names))
+    for stage in profile.stages:
+        assert stage['seconds'] >= 0 and 'allocations' in stage and 'peak_bytes' in stage
+    # Counters come from one of the two passes only
+    rooms = sum(value for name, value in profile.counters.items() if name.startswith('cells.'))
+    assert rooms == np.count_nonzero(game_map.room_types)
+
+def test_timing_only():
+    profile = GenerationProfile(track_allocations=False)
+    build_world(seed=9, width=20, height=16, num_regions=4, profile=profile)
+    assert profile.stages and all('allocations' not in stage for stage in profile.stages)
+
+
+def test_measure_builds_twice_only_to_trace_allocations():
+    for track_allocations, builds in ((True, 2), (False, 1)):
+        calls = []
+        profile = GenerationProfile(track_allocations)
+        profile.measure(lambda: calls.append(profile.run('stage', lambda: None)))
+        assert len(calls) == builds
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from grid import Grid
+
+
+def brute_force_labels(points, width, height):
+    # Nearest seed point for every cell by checking every point
+    ys, xs = np.mgrid[0:height, 0:width]
+    distances = (xs[..., None] - points[:, 0]) ** 2 + (ys[..., None] - points[:, 1]) ** 2
+    return distances.argmin(axis=2)
+
+
+@pytest.mark.parametrize('width, height, num_regions', [(9, 7, 3), (24, 22, 5), (31, 17, 12)])
+def test_kd_tree_labels_match_brute_force(width, height, num_regions):
+    grid = Grid(width, height, num_regions, seed=1, uneven_edges=False)
+    rng = np.random.default_rng(width)
+    for _ in range(5):
+        points = rng.random((num_regions, 2)) * (width, height)
+        assert np.array_equal(grid.label_regions(points), brute_force_labels(points, width, height))
+
+
+def test_labelling_in_bands_matches_one_pass():
+    grid = Grid(20, 30, 6, seed=2)
+    points = np.random.default_rng(2).random((6, 2)) * (20, 30)
+    assert np.array_equal(grid.label_regions(points, rows_per_chunk=7), grid.label_regions(points))
+
+
+def test_configurable_size():
+    assert Grid(40, 12, 5, seed=3).grid.shape == (12, 40)
+    height, width = Grid(seed=3).grid.shape
+    assert 22 <= height <= 25 and 22 <= width <= 25
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+pygame = pytest.importorskip('pygame')
+
+from grid import Grid
+from map import Map
+from renderer import MapRenderer, fonts, text_cache
+
+DIRECTIONS = (('N', 1), ('E', 2), ('S', 4), ('W', 8))
+
+
+@pytest.fixture(autouse=True)
+def display():
+    pygame.init()
+    yield
+    # Fonts and text surfaces do not survive pygame.quit
+    fonts.clear()
+    text_cache.clear()
+    pygame.quit()
+
+
+def step(game_map):
+    room = game_map.get_player_location()
+    direction = next(direction for direction, bit in DIRECTIONS if room.exits & bit)
+    game_map.move_player(direction)
+
+
+def pixels(surface):
+    return pygame.image.tobytes(surface, 'RGB')
+
+
+def test_only_the_cells_the_player_leaves_and_enters_are_redrawn():
+    game_map = Map(Grid(14, 12, 4, seed=6), verbose=False)
+    renderer = MapRenderer(game_map, 10)
+    surface = pygame.Surface(renderer.size)
+    assert renderer.update(surface) == [pygame.Rect((0, 0), renderer.size)]
+    assert renderer.update(surface) == []
+    start = game_map.get_player_location()
+    step(game_map)
+    moved = game_map.get_player_location()
+    assert renderer.update(surface) == [renderer.cell_rect(start.x, start.y), renderer.cell_rect(moved.x, moved.y)]
+
+
+def test_incremental_frames_match_a_full_redraw():
+    game_map = Map(Grid(14, 12, 4, seed=6), verbose=False)
+    renderer = MapRenderer(game_map, 10)
+    surface = pygame.Surface(renderer.size)
+    renderer.update(surface)
+    for _ in range(10):
+        step(game_map)
+        renderer.update(surface)
+        full = pygame.Surface(renderer.size)
+        MapRenderer(game_map, 10).draw(full)
+        assert pixels(surface) == pixels(full)
@@ -0,0 +1,39 @@
+from collections import Counter
+
+import numpy as np
+
+import grid as grid_module
+from cells import QUAD
+from grid import MAX_QUADS, ROOM_CHANCES_WITHOUT_Q, Grid
+
+
+def test_no_region_has_more_than_max_quads():
+    for seed in range(20):
+        grid = Grid(30, 30, 5, seed=seed)
+        for region, counts in grid.room_counts.items():
+            assert counts['Q'] <= MAX_QUADS, (seed, region)
+            # Entry rooms may take a cell of a quad, so a quad covers at most four cells
+            assert np.count_nonzero((grid.grid == region) & (grid.room_grid == QUAD)) <= 4 * counts['Q']
+
+
+def test_a_large_region_reaches_the_cap(monkeypatch):
+    assert Grid(40, 40, 1, seed=1).room_counts[0]['Q'] == MAX_QUADS
+    for cap in (0, 5):
+        monkeypatch.setattr(grid_module, 'MAX_QUADS', cap)
+        assert Grid(40, 40, 1, seed=1).room_counts[0]['Q'] == cap
+
+
+def test_room_type_distribution():
+    # Draws follow ROOM_CHANCES; doubles and multis fail to fit now and then, and those cells
+    # end up as singles, while the quad cap keeps quads rare
+    totals = Counter()
+    for seed in range(20):
+        for counts in Grid(40, 40, 5, seed=seed).room_counts.values():
+            totals.update(counts)
+    rooms = sum(totals.values())
+    shares = {room_type: count / rooms for room_type, count in totals.items()}
+    assert 0.35 < shares['S'] < 0.47
+    assert 0.27 < shares['D'] < 0.37
+    assert 0.21 < shares['M'] < 0.31
+    assert shares['Q'] < 0.03
+    assert abs(sum(ROOM_CHANCES_WITHOUT_Q) - 1) < 1e-9
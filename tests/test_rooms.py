@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from cells import ROOM_TYPES, NORTH, EAST, SOUTH, WEST, EXIT_OFFSETS, region_dtype
+from grid import Grid
+from map import Map
+from room import Room
+
+
+def test_grid_arrays_are_compact():
+    grid = Grid(20, 15, 5, seed=1)
+    assert grid.grid.dtype == np.int8 and grid.room_grid.dtype == np.int8
+    assert grid.exits.dtype == np.uint8
+    assert not (grid.exits & ~np.uint8(0xF)).any()
+    assert region_dtype(127) == 'int8' and region_dtype(128) == 'int16'
+    assert Grid(40, 40, 200, seed=1).grid.dtype == np.int16
+
+
+def test_exits_are_symmetric():
+    grid = Grid(20, 15, 5, seed=2)
+    exits = grid.exits
+    assert np.array_equal((exits[:, :-1] & EAST) != 0, (exits[:, 1:] & WEST) != 0)
+    assert np.array_equal((exits[:-1] & SOUTH) != 0, (exits[1:] & NORTH) != 0)
+    # Nothing leads off the map
+    assert not (exits[0] & NORTH).any() and not (exits[-1] & SOUTH).any()
+    assert not (exits[:, 0] & WEST).any() and not (exits[:, -1] & EAST).any()
+    assert grid.is_connected((3, 3), (3, 4)) == bool(exits[3, 3] & EAST)
+
+
+def test_rooms_are_views_of_the_map_arrays():
+    game_map = Map(Grid(20, 15, 5, seed=3), verbose=False)
+    room = game_map.rooms[4][7]
+    assert (room.x, room.y) == (7, 4)
+    assert room == Room(game_map, 7, 4) and room == game_map.get_room(7, 4)
+    assert room.region == game_map.regions[4, 7]
+    assert room.room_type == ROOM_TYPES[game_map.room_types[4, 7]]
+    assert sorted(room.get_connections()) == sorted((7 + d_col, 4 + d_row) for d_row, d_col in EXIT_OFFSETS[room.exits])
+    # A change to the arrays shows through every view of the cell
+    neighbour = Room(game_map, 8, 4)
+    room.add_connection(neighbour)
+    assert neighbour in game_map.rooms[4][7].connections
+    assert room in neighbour.connections
+
+
+def test_room_grid_indexing():
+    game_map = Map(Grid(6, 5, 2, seed=4), verbose=False)
+    assert len(game_map.rooms) == 5 and len(game_map.rooms[0]) == 6
+    assert [room.x for room in game_map.rooms[2]] == list(range(6))
+    for index in (-1, 6):
+        with pytest.raises(IndexError):
+            game_map.rooms[0][index]
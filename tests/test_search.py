@@ -0,0 +1,60 @@
+import pytest
+
+from grid import Grid
+from map import Map
+from search import words
+
+
+@pytest.fixture
+def game_map():
+    return Map(Grid(24, 20, 5, seed=8), verbose=False, lazy_names=True)
+
+
+def scan(game_map, word):
+    # Every room with the word in any of its text, found without the index
+    index = game_map.get_search_index()
+    found = []
+    for row in game_map.rooms:
+        for room in row:
+            if room.region == -1 or room.room_type == ' ':
+                continue
+            text = " ".join((room.name, room.desc, index.major_type(room), game_map.regions_mapping[room.region]))
+            if word in words(text):
+                found.append((room.x, room.y))
+    return found
+
+
+def found(game_map, text, **facets):
+    return [(room.x, room.y) for room in game_map.search(text, **facets)]
+
+
+def test_search_matches_a_scan(game_map):
+    start = game_map.get_player_location()
+    for word in sorted(set(words(start.name + " " + start.desc)))[:6]:
+        assert found(game_map, word) == scan(game_map, word), word
+
+
+def test_search_after_rename(game_map):
+    game_map.get_search_index()
+    room = game_map.get_player_location()
+    old_words = set(words(room.name + " " + room.desc))
+    game_map.rename_room(room, "Zanzibar Vault", "Cold stone under the zanzibar hills.")
+    assert (room.x, room.y) in found(game_map, "zanzibar")
+    assert found(game_map, "zanzibar vault") == [(room.x, room.y)]
+    for word in old_words:
+        assert found(game_map, word) == scan(game_map, word), word
+    # Renamed again, to text that is already used elsewhere on the map
+    other = next(other for row in game_map.rooms for other in row
+                 if other.name and (other.x, other.y) != (room.x, room.y))
+    game_map.rename_room(room, other.name, other.desc)
+    assert found(game_map, "zanzibar") == []
+    for word in words(other.name):
+        assert found(game_map, word) == scan(game_map, word), word
+
+
+def test_facets_after_rename(game_map):
+    room = game_map.get_player_location()
+    game_map.rename_room(room, "Quillwort Den", "")
+    assert found(game_map, "quillwort", region=room.region) == [(room.x, room.y)]
+    assert found(game_map, "quillwort", region=(room.region + 1) % game_map.num_regions) == []
+    assert found(game_map, "quillwort", near=room, distance=0) == [(room.x, room.y)]
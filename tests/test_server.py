@@ -0,0 +1,63 @@
+import asyncio
+
+from server import GameServer
+
+
+async def read_response(reader):
+    lines = []
+    while True:
+        line = (await reader.readline()).decode()
+        if line in ("\n", ""):
+            return "\n".join(lines)
+        lines.append(line.rstrip("\n"))
+
+
+async def play(game_server, commands):
+    server = await asyncio.start_server(game_server.handle_client, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        responses = [await read_response(reader)]
+        for command in commands:
+            writer.write(command.encode() + b"\n")
+            await writer.drain()
+            responses.append(await read_response(reader))
+        writer.close()
+        await writer.wait_closed()
+    return responses
+
+
+def run(commands, **kwargs):
+    game_server = GameServer(workers=1, width=12, height=12, num_regions=3, pool_size=0, **kwargs)
+    try:
+        return game_server, asyncio.run(play(game_server, commands))
+    finally:
+        game_server.close()
+
+
+def test_a_session():
+    game_server, responses = run(['look', 'new 5', 'join 7', 'look', 'move', 'move up', 'e', 'find type:E',
+                                  'find', 'new x', 'stats', 'quit'])
+    welcome, outside, new, join, look, move, bad_move, east, find, find_nothing, usage, stats, goodbye = responses
+    assert welcome.startswith("Welcome.")
+    assert outside == "You are not in a world yet. Use new or join <seed>."
+    assert new.startswith("You arrive in world 5.\nCoordinates:")
+    assert join.startswith("You arrive in world 7.\nCoordinates:")
+    assert look.startswith("Coordinates:") and "You can see exits:" in look
+    assert move == bad_move == "Move which way? (N, E, S or W)"
+    assert east in ("You have moved E.", "You can't go that way.")
+    assert find.startswith("(") and all(" away" in line for line in find.split("\n") if line != "...")
+    assert find_nothing == "Find what?"
+    assert usage == "Usage error. Type help for a list."
+    assert stats.startswith("sessions 1 (total 1), shared worlds 1, worlds generated 2, commands 11")
+    assert goodbye == "Goodbye."
+    assert game_server.sessions == 0 and not game_server.shared_worlds
+
+
+def test_a_failing_command_leaves_the_session_open(monkeypatch):
+    async def broken(self, session):
+        raise RuntimeError("disk on fire")
+    monkeypatch.setattr(GameServer, 'command_look', broken)
+    _, responses = run(['new 5', 'look', 'exits'])
+    assert responses[2] == "Something went wrong with that command."
+    assert responses[3].startswith("You can see exits:")
@@ -0,0 +1,82 @@
+import json
+import subprocess
+import sys
+from multiprocessing.dummy import Pool as ThreadPool
+
+import numpy as np
+import pytest
+
+import simulate
+from cells import SINGLE, ENTRY, EAST, WEST
+from simulate import WalkSimulation, analyse, summarize
+
+
+def corridor(length, regions=None, room_types=None):
+    # One row of rooms, each joined to the next
+    exits = np.zeros((1, length), dtype=np.uint8)
+    exits[0, :-1] |= EAST
+    exits[0, 1:] |= WEST
+    regions = np.zeros((1, length), dtype=np.int8) if regions is None else np.array([regions], dtype=np.int8)
+    room_types = np.full((1, length), SINGLE, dtype=np.int8) if room_types is None else np.array([room_types], dtype=np.int8)
+    return regions, room_types, exits, (0, 0)
+
+
+def test_a_corridor_is_covered_and_its_ends_are_dead_ends():
+    stats, = analyse(WalkSimulation([corridor(5)]), walkers=64, steps=200)
+    assert stats['rooms'] == 5 and stats['unreachable_rooms'] == 0
+    assert stats['coverage'] == 1.0
+    assert stats['dead_end_density'] == pytest.approx(2 / 5)
+    # One region: no hitting times
+    assert 'hitting_time' not in stats
+
+
+def test_a_room_cut_off_from_the_start_is_reported():
+    regions, room_types, exits, start = corridor(5)
+    exits[0, 2] ^= EAST
+    exits[0, 3] ^= WEST
+    stats, = analyse(WalkSimulation([(regions, room_types, exits, start)]), walkers=64, steps=200)
+    assert stats['unreachable_rooms'] == 2
+    assert stats['coverage'] == 1.0  # of the rooms that can be reached
+    report = summarize([dict(stats, seed=7), dict(stats, seed=3, unreachable_rooms=0)])
+    assert report['unreachable_rooms'] == 2 and report['maps_with_unreachable_rooms'] == [7]
+
+
+def test_hitting_times_between_two_regions():
+    # Two "E" rooms side by side: every walker reaches the other region on its first step
+    stats, = analyse(WalkSimulation([corridor(2, [0, 1], [ENTRY, ENTRY])]), walkers=32, steps=10)
+    assert stats['hitting_time'] == 1.0 and stats['hit_rate'] == 1.0
+    assert stats['goal_hitting_time'] == 1.0 and stats['goal_hit_rate'] == 1.0
+    # Farther apart, hitting takes longer and goal-directed walkers beat random ones
+    far, = analyse(WalkSimulation([corridor(9, [0] * 4 + [1] * 5, [ENTRY] + [SINGLE] * 7 + [ENTRY])]), walkers=256,
+                   steps=400)
+    assert 4 <= far['goal_hitting_time'] < far['hitting_time']
+
+
+def test_maps_in_one_batch_do_not_see_each_other():
+    together = analyse(WalkSimulation([corridor(5), corridor(3)]), walkers=64, steps=200)
+    assert [stats['rooms'] for stats in together] == [5, 3]
+    assert all(stats['unreachable_rooms'] == 0 and stats['coverage'] == 1.0 for stats in together)
+
+
+def test_exit_status_is_0_when_every_room_is_reachable(tmp_path):
+    out = tmp_path / 'report.json'
+    result = subprocess.run([sys.executable, 'simulate.py', '--seeds', '0', '4', '--size', '12', '--regions', '3',
+                             '--walkers', '16', '--steps', '50', '--workers', '1', '--out', str(out)],
+                            cwd=simulate.os.path.dirname(simulate.__file__), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "unreachable rooms: 0 in 0 maps" in result.stdout
+    saved = json.loads(out.read_text())
+    assert saved['report']['maps'] == 4 and [stats['seed'] for stats in saved['maps']] == [0, 1, 2, 3]
+
+
+def test_exit_status_is_1_when_a_map_has_unreachable_rooms(monkeypatch, capsys):
+    def broken(seeds, **kwargs):
+        return [{'seed': seed, 'rooms': 10, 'unreachable_rooms': seed % 2, 'coverage': 1.0,
+                 'dead_end_density': 0.1} for seed in seeds]
+    monkeypatch.setattr(simulate, 'Pool', ThreadPool)
+    monkeypatch.setattr(simulate, 'simulate_seeds', broken)
+    monkeypatch.setattr(sys, 'argv', ['simulate.py', '--seeds', '0', '4', '--workers', '1'])
+    with pytest.raises(SystemExit) as exit:
+        simulate.main()
+    assert exit.value.code == 1
+    assert "2 in 2 maps (seeds [1, 3])" in capsys.readouterr().out
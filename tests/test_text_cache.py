@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+pygame = pytest.importorskip('pygame')
+
+from renderer import TextCache, fonts, get_font, text_cache
+
+TEXTS = [
+    "A narrow stair winds down into the dark.\nSomething drips far below.",
+    "short",
+    "",
+    "Supercalifragilisticexpialidociousness is a word wider than any box",
+    "Many  spaces   between\n\nand blank lines",
+]
+
+
+@pytest.fixture(autouse=True)
+def font_module():
+    pygame.font.init()
+    yield
+    fonts.clear()
+    text_cache.clear()
+    pygame.font.quit()
+
+
+def old_wrap(font, text, width):
+    # The wrap render_text_box did before the layout cache, bounded here since it never ended
+    # on a word wider than the box
+    lines = []
+    for paragraph in text.split('\n'):
+        words = paragraph.split(' ')
+        line = ''
+        steps = 0
+        while words and steps < 1000:
+            steps += 1
+            if font.size(line + words[0])[0] <= width:
+                line += words.pop(0) + ' '
+            else:
+                lines.append(line)
+                line = ''
+        if words:
+            return None
+        lines.append(line)
+    return tuple(lines)
+
+
+@pytest.mark.parametrize('width', [60, 150, 400])
+def test_wrap_gives_the_old_lines(width):
+    cache = TextCache()
+    for text in TEXTS:
+        expected = old_wrap(get_font(30), text, width)
+        lines = cache.wrap(text, 30, width)
+        if expected is not None:
+            assert lines == expected, text
+        # Every word is kept, in order
+        assert " ".join(lines).split() == text.split()
+
+
+def test_fonts_are_loaded_once():
+    assert get_font(18) is get_font(18)
+    assert get_font(18) is not get_font(20)
+
+
+def test_caches_hit_and_evict_least_recently_used():
+    cache = TextCache(max_surfaces=2, max_layouts=2)
+    first = cache.render("one", 14, (0, 0, 0))
+    assert cache.render("one", 14, (0, 0, 0)) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.render("two", 14, (0, 0, 0))
+    cache.render("one", 14, (0, 0, 0))
+    cache.render("three", 14, (0, 0, 0))
+    assert list(cache.surfaces) == [("one", 14, (0, 0, 0)), ("three", 14, (0, 0, 0))]
+    for text in ("a b", "c d", "e f"):
+        cache.wrap(text, 14, 100)
+    assert len(cache.layouts) == 2
+    cache.clear()
+    assert not cache.surfaces and not cache.layouts
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+pygame = pytest.importorskip('pygame')
+
+from cells import NORTH, EAST, SOUTH, WEST
+from grid import Grid
+from map import Map
+from UI import UI, LatencyHistogram
+
+KEYS = {NORTH: pygame.K_UP, EAST: pygame.K_RIGHT, SOUTH: pygame.K_DOWN, WEST: pygame.K_LEFT}
+
+
+@pytest.mark.parametrize('event_driven', [False, True])
+def test_only_presses_that_redraw_are_timed(event_driven):
+    game_map = Map(Grid(16, 16, 4, seed=2), verbose=False)
+    room = game_map.get_player_location()
+    exits = int(game_map.exits[room.y, room.x])
+    wall = next(bit for bit in KEYS if not exits & bit)
+    way = next(bit for bit in KEYS if exits & bit)
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    for bit in (wall, way):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=KEYS[bit]))
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+    latency = LatencyHistogram()
+    UI(game_map, event_driven=event_driven, latency=latency)
+    assert len(latency.latencies) == 1
+    assert 0 <= latency.latencies[0] < 1
+    assert game_map.get_player_location() != room
@@ -0,0 +1,102 @@
+import os
+import random
+
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+pygame = pytest.importorskip('pygame')
+
+from grid import Grid
+from map import Map
+from renderer import ZOOM_LEVELS, MapRenderer, fonts, text_cache
+
+VIEW = (230, 170)
+
+
+@pytest.fixture(autouse=True)
+def display():
+    pygame.init()
+    yield
+    # Fonts and text surfaces do not survive pygame.quit
+    fonts.clear()
+    text_cache.clear()
+    pygame.quit()
+
+
+def pixels(surface):
+    return pygame.image.tobytes(surface, 'RGB')
+
+
+def wander(game_map, moves, seed=0):
+    rng = random.Random(seed)
+    for _ in range(moves):
+        game_map.move_player(rng.choice('NESW'))
+        yield game_map.get_player_location()
+
+
+def test_the_viewport_is_a_window_of_the_whole_map():
+    game_map = Map(Grid(40, 30, 6, seed=2), verbose=False)
+    renderer = MapRenderer(game_map, 10, view_size=VIEW)
+    whole = MapRenderer(game_map, 10)
+    assert renderer.size == VIEW
+    for room in wander(game_map, 200):
+        surface = pygame.Surface((300, 300))
+        surface.fill((1, 2, 3))
+        assert renderer.draw(surface, (20, 30)) == [pygame.Rect((20, 30), VIEW)]
+        full = pygame.Surface(whole.size)
+        whole.draw(full)
+        camera_x, camera_y = renderer.camera
+        expected = full.subsurface(pygame.Rect((camera_x * 20, camera_y * 20), VIEW)).copy()
+        assert pixels(surface.subsurface(pygame.Rect((20, 30), VIEW))) == pixels(expected)
+        # Nothing is drawn outside the viewport
+        assert surface.get_at((10, 10))[:3] == (1, 2, 3)
+        assert surface.get_at((20 + VIEW[0], 30 + VIEW[1]))[:3] == (1, 2, 3)
+
+
+def test_the_camera_keeps_the_player_away_from_the_edges():
+    game_map = Map(Grid(40, 30, 6, seed=2), verbose=False)
+    renderer = MapRenderer(game_map, 10, view_size=VIEW)
+    surface = pygame.Surface(VIEW)
+    renderer.update(surface)
+    shown = [(view - 10) // 20 + 1 for view in VIEW]
+    for room in wander(game_map, 500):
+        camera = renderer.camera
+        dirty = renderer.update(surface)
+        for axis, (position, cells) in enumerate(((room.x, 40), (room.y, 30))):
+            start = renderer.camera[axis]
+            assert 0 <= start <= cells - shown[axis]
+            assert start <= position < start + shown[axis]
+            # Within the margin, or already against the map's edge
+            margin = shown[axis] // 4
+            assert start + margin <= position or start == 0
+            assert position < start + shown[axis] - margin or start == cells - shown[axis]
+        if renderer.camera == camera and dirty:
+            assert len(dirty) == 2
+
+
+def test_zoom_steps_through_the_levels_and_redraws_everything():
+    game_map = Map(Grid(40, 30, 6, seed=2), verbose=False)
+    renderer = MapRenderer(game_map, 25, view_size=(240, 180))
+    surface = pygame.Surface((240, 180))
+    renderer.update(surface)
+    assert renderer.update(surface) == []
+    assert renderer.zoom(1) == 35 and renderer.zoom(1) == 35
+    assert renderer.update(surface) == [pygame.Rect(0, 0, 240, 180)]
+    levels = [renderer.zoom(-1) for _ in ZOOM_LEVELS]
+    assert levels == sorted(ZOOM_LEVELS, reverse=True)[1:] + [ZOOM_LEVELS[0]]
+    assert renderer.camera is None
+    # Zoomed out far enough, the whole map fits and the camera stays put
+    renderer.update(surface)
+    assert renderer.camera == (0, 0)
+    assert renderer.size == renderer.map_size == (79 * 3, 59 * 3)
+
+
+def test_labels_are_only_drawn_on_large_tiles():
+    game_map = Map(Grid(12, 10, 3, seed=2), verbose=False)
+    renderer = MapRenderer(game_map, 8)
+    text_cache.clear()
+    renderer.atlas
+    assert not text_cache.surfaces
+    renderer.zoom(1)
+    renderer.atlas
+    assert text_cache.surfaces
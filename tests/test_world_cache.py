@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+import world_cache
+from world_cache import WorldCache
+
+
+def test_second_build_is_a_hit(tmp_path):
+    cache = WorldCache(str(tmp_path))
+    built = cache.get_or_build(7, 12, 10, 4)
+    loaded = cache.get_or_build(7, 12, 10, 4)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert np.array_equal(built.exits, loaded.exits)
+    assert np.array_equal(built.name_ids, loaded.name_ids)
+
+
+def test_other_params_miss(tmp_path):
+    cache = WorldCache(str(tmp_path))
+    cache.get_or_build(7, 12, 10, 4)
+    cache.get_or_build(8, 12, 10, 4)
+    cache.get_or_build(7, 12, 10, 5)
+    assert (cache.hits, cache.misses) == (0, 3)
+
+
+def test_generator_version_is_part_of_the_key(tmp_path, monkeypatch):
+    cache = WorldCache(str(tmp_path))
+    key = cache.key(7, 12, 10, 4, "fantasy")
+    monkeypatch.setattr(world_cache, 'GENERATOR_VERSION', world_cache.GENERATOR_VERSION + 1)
+    assert cache.key(7, 12, 10, 4, "fantasy") != key
+
+
+def test_unreadable_world_is_built_again(tmp_path):
+    cache = WorldCache(str(tmp_path))
+    built = cache.get_or_build(7, 12, 10, 4)
+    path = cache.path(cache.key(7, 12, 10, 4, "fantasy"))
+    with open(path, 'r+b') as file:
+        file.seek(4)
+        file.write(b'\xff\xff')  # format version
+    rebuilt = cache.get_or_build(7, 12, 10, 4)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert np.array_equal(built.exits, rebuilt.exits)
+    assert os.path.exists(path)
+    cache.get_or_build(7, 12, 10, 4)
+    assert cache.hits == 1
@@ -0,0 +1,98 @@
+import struct
+
+import numpy as np
+import pytest
+
+from grid import Grid
+from map import Map
+from world_format import HEADER, WorldFile, decode_world, encode_world, load_world, save_world
+
+ARRAYS = ('regions', 'room_types', 'exits', 'name_ids', 'desc_ids')
+
+
+@pytest.fixture(scope='module')
+def game_map():
+    game_map = Map(Grid(14, 11, 5, seed=21), verbose=False)
+    game_map.rename_room(game_map.get_player_location(), "Lantern Hall", "A hall of lanterns.")
+    return game_map
+
+
+def assert_same_world(loaded, game_map):
+    for name in ARRAYS:
+        assert np.array_equal(getattr(loaded, name), getattr(game_map, name)), name
+    assert loaded.regions_mapping == game_map.regions_mapping
+    assert loaded.to_dict() == game_map.to_dict()
+
+
+def test_save_and_load(game_map, tmp_path):
+    path = tmp_path / "world.world"
+    save_world(game_map, str(path))
+    assert_same_world(load_world(str(path)), game_map)
+    assert_same_world(decode_world(encode_world(game_map)), game_map)
+    room = game_map.get_player_location()
+    assert WorldFile.open(str(path)).room(room.x, room.y)['name'] == "Lantern Hall"
+
+
+def test_loaded_world_can_change(game_map, tmp_path):
+    path = tmp_path / "world.world"
+    save_world(game_map, str(path))
+    loaded = load_world(str(path))
+    loaded.exits[0, 0] ^= 1
+    assert_same_world(load_world(str(path)), game_map)
+
+
+def test_other_format_version(game_map):
+    data = bytearray(encode_world(game_map))
+    struct.pack_into('<H', data, 4, 99)
+    with pytest.raises(ValueError, match="version 99"):
+        decode_world(data)
+
+
+def test_not_a_world():
+    with pytest.raises(ValueError):
+        decode_world(b'{"rooms": []}' * 10)
+    with pytest.raises(ValueError):
+        decode_world(b'')
+
+
+@pytest.mark.parametrize('length', [HEADER.size - 1, HEADER.size + 5, -1])
+def test_truncated_world(game_map, length):
+    with pytest.raises(ValueError):
+        decode_world(encode_world(game_map)[:length])
+
+
+def test_loading_keeps_no_file_open(game_map, tmp_path):
+    resource = pytest.importorskip('resource')
+    path = tmp_path / "world.world"
+    save_world(game_map, str(path))
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (64, hard))
+    try:
+        worlds = [load_world(str(path)) for _ in range(200)]
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    assert len(worlds) == 200
+
+
+def test_read_only_mapping_gives_a_changeable_map(game_map, tmp_path):
+    path = tmp_path / "world.world"
+    save_world(game_map, str(path))
+    loaded = WorldFile.open(str(path)).to_map()
+    room = loaded.get_room(2, 2)
+    loaded.rename_room(room, "Quiet Nook", "")
+    loaded.connect_rooms(room, loaded.get_room(3, 2))
+    assert room.name == "Quiet Nook"
+    assert_same_world(load_world(str(path)), game_map)
+
+
+def test_mapped_load_is_copy_on_write(game_map, tmp_path):
+    path = tmp_path / "world.world"
+    save_world(game_map, str(path))
+    with open(path, 'rb') as file:
+        saved = file.read()
+    loaded = load_world(str(path), mapped=True)
+    assert_same_world(loaded, game_map)
+    loaded.connect_rooms(loaded.get_room(2, 2), loaded.get_room(3, 2))
+    loaded.rename_room(loaded.get_room(2, 2), "Quiet Nook", "")
+    with open(path, 'rb') as file:
+        assert file.read() == saved
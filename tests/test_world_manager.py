@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pytest
+
+from grid import Grid
+from map import Map
+from world_format import WorldFile, load_world, save_world
+from world_manager import WorldManager, map_bytes
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = WorldManager(directory=str(tmp_path))
+    yield manager
+    manager.close()
+
+
+def build(seed):
+    return Map(Grid(20, 16, 4, seed=seed), verbose=False)
+
+
+def test_evicted_map_comes_back_unchanged(manager):
+    game_map = manager.add('a', build(1))
+    expected = game_map.to_dict()
+    start = game_map.get_player_location()
+    manager.add('b', build(2))
+    manager.evict('a')
+    assert manager.metrics()['evicted_maps'] == 1
+    assert os.path.exists(manager.paths['a'])
+    # The first read of its arrays restores it, through the same Map and Room objects
+    assert start.name == build(1).get_room(start.x, start.y).name
+    assert game_map.to_dict() == expected
+    assert manager.metrics()['restores'] == 1
+    assert 'a' in manager.resident and not os.path.exists(manager.paths['a'])
+
+
+def test_changes_survive_eviction(manager):
+    game_map = manager.add('a', build(1))
+    room = game_map.get_player_location()
+    game_map.rename_room(room, "Lantern Hall", "A hall of lanterns.")
+    exits = game_map.exits.copy()
+    manager.add('b', build(2))
+    manager.evict('a')
+    assert room.name == "Lantern Hall"
+    assert np.array_equal(game_map.exits, exits)
+    direction = next(direction for direction, bit in (('N', 1), ('E', 2), ('S', 4), ('W', 8)) if exits[room.y, room.x] & bit)
+    assert game_map.move_player(direction) == f"You have moved {direction}."
+
+
+def test_budget_evicts_least_recently_used(tmp_path):
+    size = map_bytes(build(1))
+    manager = WorldManager(budget=int(size * 2.5), directory=str(tmp_path))
+    try:
+        maps = [manager.add(seed, build(seed)) for seed in range(4)]
+        assert list(manager.evicted) == [0, 1]
+        manager.get(2)
+        maps[0].get_player_location().name
+        assert list(manager.resident)[-1] == 0
+        assert manager.resident_bytes <= manager.budget
+        assert len(manager) == 4
+    finally:
+        manager.close()
+
+
+def test_discard_and_remove(manager):
+    manager.add('a', build(1))
+    game_map = manager.add('b', build(2))
+    manager.evict('a')
+    path = manager.paths['a']
+    manager.discard('a')
+    assert 'a' not in manager and not os.path.exists(path)
+    assert manager.remove('b') is game_map and game_map.manager is None
+    assert len(manager) == 0 and manager.resident_bytes == 0
+
+
+def test_eviction_keeps_a_lazy_map_lazy(manager):
+    game_map = manager.add('a', Map(Grid(20, 16, 4, seed=1), verbose=False, lazy_names=True))
+    start = game_map.get_player_location()
+    start_name = start.name
+    manager.add('b', build(2))
+    manager.evict('a')
+    # Only the room that was read is named in the snapshot
+    snapshot = WorldFile.read(manager.paths['a'])
+    assert np.count_nonzero(snapshot.arrays['name_ids'] != -1) == 1
+    assert start.name == start_name
+    assert game_map.lazy_names
+    assert np.count_nonzero(game_map.name_ids != -1) == 1
+    # Rooms named after the restore get the names an eagerly named map gives them
+    eager = build(1)
+    for x, y in ((0, 0), (5, 7), (19, 15)):
+        assert game_map.get_room(x, y).name == eager.get_room(x, y).name
+
+
+def test_saving_still_names_every_room(tmp_path):
+    game_map = Map(Grid(20, 16, 4, seed=1), verbose=False, lazy_names=True)
+    save_world(game_map, str(tmp_path / 'world'))
+    assert not game_map.lazy_names
+    loaded = load_world(str(tmp_path / 'world'))
+    assert not loaded.lazy_names
+    assert np.array_equal(loaded.name_ids, build(1).name_ids)
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from world_pool import WorldPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_refill_metrics_keep_a_bounded_window():
+    with ThreadPoolExecutor(1) as executor:
+        pool = WorldPool(size=2, executor=executor)
+        pool.fill(12, 10, 3)
+        assert pool.take(12, 10, 3, refill=False) is not None
+        assert pool.refills == 2
+        assert pool.refill_times.maxlen == 1000
+        pool.refill_times.extend([0.5] * 2000)
+        metrics = pool.metrics()
+        assert metrics['refills'] == 2
+        assert metrics['refill_seconds']['p50'] == 0.5
+        pool.close()
+
+
+def filled_directory_pool(directory, size=2, params=(12, 10, 3)):
+    with ThreadPoolExecutor(1) as executor:
+        pool = WorldPool(size=size, directory=str(directory), executor=executor)
+        pool.fill(*params)
+        pool.close()
+    return WorldPool(size=size, directory=str(directory))
+
+
+def test_a_directory_pool_outlives_the_pool_that_filled_it(tmp_path):
+    pool = filled_directory_pool(tmp_path)
+    key = pool.key(12, 10, 3)
+    assert pool.depth(key) == 2
+    game_map = pool.take(12, 10, 3, refill=False)
+    assert game_map.width == 12 and game_map.height == 10
+    assert pool.depth(key) == 1
+    assert not [name for name in os.listdir(pool.key_directory(key)) if not name.endswith(".world")]
+    assert pool.take(12, 10, 3, refill=False) is not None
+    assert pool.take(12, 10, 3, refill=False) is None
+    assert (pool.hits, pool.misses, pool.futures) == (2, 1, set())
+
+
+def test_a_damaged_world_file_is_skipped_and_removed(tmp_path):
+    pool = filled_directory_pool(tmp_path)
+    key = pool.key(12, 10, 3)
+    first = pool.world_files(key)[0]
+    with open(first, 'r+b') as file:
+        file.truncate(10)
+    assert pool.take(12, 10, 3, refill=False) is not None
+    assert pool.depth(key) == 0 and not os.path.exists(first)
+
+
+def test_taking_a_saved_world_does_not_load_the_generator(tmp_path):
+    filled_directory_pool(tmp_path)
+    script = ("import sys; from world_pool import WorldPool; "
+              f"game_map = WorldPool(directory={str(tmp_path)!r}).take(12, 10, 3, refill=False); "
+              "print(game_map is not None, 'scipy' in sys.modules, 'grid' in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['True', 'False', 'False']
+
+
+def test_fill_from_the_command_line(tmp_path):
+    subprocess.run([sys.executable, 'world_pool.py', '--fill', '--directory', str(tmp_path), '--size', '1',
+                    '--width', '12', '--height', '10', '--regions', '3'], cwd=ROOT, check=True, capture_output=True)
+    assert WorldPool(size=1, directory=str(tmp_path)).depth((12, 10, 3, 'fantasy')) == 1
+
+
+def test_fast_start_shows_a_pooled_world(tmp_path):
+    environment = dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    filled_directory_pool(tmp_path / ".world_pool", params=())
+    generated = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--exit-after-first-frame'],
+                               cwd=tmp_path, env=environment, capture_output=True, text=True, timeout=60)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--fast-start', '--exit-after-first-frame'],
+                            cwd=tmp_path, env=environment, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    # A generated world announces the player's start room; a pooled one was built elsewhere
+    assert generated.returncode == 0 and generated.stdout
+    assert not result.stdout
+
+
+def test_a_key_that_fails_to_generate_is_logged_counted_and_not_retried(caplog):
+    with ThreadPoolExecutor(1) as executor:
+        pool = WorldPool(size=2, executor=executor)
+        with pytest.raises(ValueError, match="unknown genre"):
+            pool.fill(12, 10, 3, genre="opera")
+        assert pool.take(12, 10, 3, genre="opera") is None
+        metrics = pool.metrics()
+        assert metrics['failures'] == 1
+        assert metrics['pending'] == metrics['waiting'] == 0
+        assert "generating a world for (12, 10, 3, 'opera') failed" in caplog.text
+        # Other keys are still refilled
+        pool.fill(12, 10, 3)
+        assert pool.depth(pool.key(12, 10, 3)) == 2
+        pool.close()
+
+
+def test_fill_returns_from_a_closed_pool():
+    with ThreadPoolExecutor(1) as executor:
+        pool = WorldPool(size=2, executor=executor)
+        pool.close()
+        pool.fill(12, 10, 3)
+        assert pool.depth(pool.key(12, 10, 3)) == 0
@@ -0,0 +1,21 @@
+import random
+
+from grid import Grid
+from map import Map
+
+
+def build_world(seed=None, width=None, height=None, num_regions=5, genre="fantasy", verbose=False, cache=None,
+                profile=None, lazy_names=False):
+    # A seed and set of parameters always give the same world, so seeded worlds can come from a
+    # cache; a profiled build always generates, since a cached world has no stages to measure
+    if cache is not None and seed is not None and profile is None:
+        return cache.get_or_build(seed, width, height, num_regions, genre)
+    if profile is not None:
+        # The profile builds the world twice, so both passes need the same seed; only the
+        # first one prints
+        seed = seed if seed is not None else random.randrange(2 ** 32)
+        passes = iter((verbose, False))
+        return profile.measure(lambda: Map(Grid(width, height, num_regions, seed=seed, profile=profile), genre=genre,
+                                           verbose=next(passes), lazy_names=lazy_names))
+    grid = Grid(width, height, num_regions, seed=seed)
+    return Map(grid, genre=genre, verbose=verbose, lazy_names=lazy_names)
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+from content import load_content
+from grid import Grid
+from map import Map
+from world_format import save_world, load_world
+
+# Part of every cache key. Bump it whenever a change to generation or naming makes a seed give a
+# different world, so worlds cached by older code are built again rather than served.
+GENERATOR_VERSION = 2
+
+
+class WorldCache:
+    # Content-addressed store of generated worlds keyed by (seed, params, data.json hash)
+    def __init__(self, directory=".world_cache"):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, seed, width, height, num_regions, genre):
+        params = {
+            'seed': seed,
+            'width': width,
+            'height': height,
+            'num_regions': num_regions,
+            'genre': genre,
+            'data': load_content().data_hash,
+            'generator': GENERATOR_VERSION,
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".world")
+
+    def load(self, key):
+        try:
+            return load_world(self.path(key))
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Written by another format version, or for another data.json: built again
+            return None
+
+    def store(self, key, game_map):
+        # save_world writes through a temporary file, so concurrent readers never see a partial world
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        save_world(game_map, path)
+
+    def get_or_build(self, seed, width=None, height=None, num_regions=5, genre="fantasy"):
+        key = self.key(seed, width, height, num_regions, genre)
+        game_map = self.load(key)
+        if game_map is not None:
+            self.hits += 1
+            return game_map
+        self.misses += 1
+        game_map = Map(Grid(width, height, num_regions, seed=seed), genre=genre, verbose=False)
+        self.store(key, game_map)
+        return game_map
@@ -0,0 +1,172 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from cells import ROOM_TYPES
+from content import load_content
+from map import Map
+
+# A saved world is a fixed header, a small JSON metadata block and then one
+# 8-byte aligned section per cell array, so the arrays can be mapped straight from disk
+MAGIC = b'PGWD'
+VERSION = 1
+# magic, version, width, height, num_regions, region itemsize, id itemsize, player x, player y, metadata length
+HEADER = struct.Struct('<4sHIIHBBIII')
+ALIGNMENT = 8
+
+
+def padding(offset):
+    return -offset % ALIGNMENT
+
+
+def section_dtypes(region_itemsize, id_itemsize):
+    return (
+        ('regions', np.dtype(f'<i{region_itemsize}')),
+        ('room_types', np.dtype('i1')),
+        ('exits', np.dtype('u1')),
+        ('name_ids', np.dtype(f'<i{id_itemsize}')),
+        ('desc_ids', np.dtype(f'<i{id_itemsize}')),
+    )
+
+
+def encode_world(game_map, name_rooms=True):
+    state = game_map.get_state(name_rooms)
+    metadata = json.dumps({
+        'genre': state['genre'],
+        'seed': state['seed'],
+        'regions_mapping': state['regions_mapping'],
+        'colors': state['colors'],
+        'custom_strings': state['custom_strings'],
+        'lazy_names': state['lazy_names'],
+        'data_hash': game_map.content.data_hash,
+    }).encode()
+    region_itemsize = state['regions'].dtype.itemsize
+    id_itemsize = state['name_ids'].dtype.itemsize
+    player_x, player_y = state['player_start']
+    parts = [HEADER.pack(MAGIC, VERSION, state['width'], state['height'], state['num_regions'],
+                         region_itemsize, id_itemsize, player_x, player_y, len(metadata)), metadata]
+    offset = HEADER.size + len(metadata)
+    for name, dtype in section_dtypes(region_itemsize, id_itemsize):
+        parts.append(b'\0' * padding(offset))
+        offset += padding(offset)
+        data = np.ascontiguousarray(state[name], dtype=dtype).tobytes()
+        parts.append(data)
+        offset += len(data)
+    return b''.join(parts)
+
+
+def save_world(game_map, path, name_rooms=True):
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(handle, 'wb') as file:
+        file.write(encode_world(game_map, name_rooms))
+    os.replace(temp_path, path)
+
+
+class WorldFile:
+    # Reads a saved world in place; arrays are views over the buffer, nothing is parsed up front
+    def __init__(self, buffer):
+        self.buffer = buffer
+        if len(buffer) < HEADER.size:
+            raise ValueError("not a saved world")
+        (magic, version, self.width, self.height, self.num_regions, region_itemsize, id_itemsize,
+         player_x, player_y, metadata_length) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("not a saved world")
+        if version != VERSION:
+            raise ValueError(f"unsupported world format version {version}")
+        self.player_start = (player_x, player_y)
+        if len(buffer) < HEADER.size + metadata_length:
+            raise ValueError("saved world is truncated")
+        self.metadata = json.loads(bytes(buffer[HEADER.size:HEADER.size + metadata_length]))
+        self.content = load_content()
+        if self.metadata['data_hash'] != self.content.data_hash:
+            raise ValueError("world was saved against a different data.json")
+        self.arrays = {}
+        offset = HEADER.size + metadata_length
+        cells = self.width * self.height
+        for name, dtype in section_dtypes(region_itemsize, id_itemsize):
+            offset += padding(offset)
+            if len(buffer) < offset + cells * dtype.itemsize:
+                raise ValueError("saved world is truncated")
+            array = np.frombuffer(buffer, dtype=dtype, count=cells, offset=offset)
+            self.arrays[name] = array.reshape(self.height, self.width)
+            offset += array.nbytes
+
+    @classmethod
+    def open(cls, path, writable=False):
+        # Maps the file, so only the pages that are read are loaded. A copy-on-write mapping
+        # lets a loaded Map change connections without touching the file. The mapping holds
+        # a file descriptor until the WorldFile and every array taken from it are gone, so
+        # keeping many of them needs a higher open file limit (ulimit -n).
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY if writable else mmap.ACCESS_READ)
+        return cls(buffer)
+
+    @classmethod
+    def read(cls, path):
+        # Reads the whole file into one writable buffer; no file stays open, however many
+        # worlds are loaded
+        with open(path, 'rb') as file:
+            buffer = bytearray(os.fstat(file.fileno()).st_size)
+            del buffer[file.readinto(buffer):]
+        return cls(buffer)
+
+    def string(self, string_id, table):
+        if string_id == -1:
+            return ""
+        if string_id >= 0:
+            return table[string_id]
+        return self.metadata['custom_strings'][-2 - string_id]
+
+    def room(self, x, y):
+        return {
+            'region': int(self.arrays['regions'][y, x]),
+            'room_type': ROOM_TYPES[self.arrays['room_types'][y, x]],
+            'exits': int(self.arrays['exits'][y, x]),
+            'name': self.string(self.arrays['name_ids'][y, x], self.content.names).title(),
+            'desc': self.string(self.arrays['desc_ids'][y, x], self.content.descs),
+        }
+
+    def state(self):
+        # The same dict as Map.get_state, with the arrays still backed by the buffer
+        return {
+            'genre': self.metadata['genre'],
+            'seed': self.metadata['seed'],
+            'width': self.width,
+            'height': self.height,
+            'num_regions': self.num_regions,
+            'regions': self.arrays['regions'],
+            'room_types': self.arrays['room_types'],
+            'exits': self.arrays['exits'],
+            'name_ids': self.arrays['name_ids'],
+            'desc_ids': self.arrays['desc_ids'],
+            'custom_strings': self.metadata['custom_strings'],
+            'regions_mapping': self.metadata['regions_mapping'],
+            'colors': self.metadata['colors'],
+            'player_start': self.player_start,
+            'lazy_names': self.metadata.get('lazy_names', False),
+        }
+
+    def to_map(self):
+        state = self.state()
+        if not self.arrays['exits'].flags.writeable:
+            # A read-only mapping is copied, so the Map can still change connections and names
+            state.update((name, array.copy()) for name, array in self.arrays.items())
+        return Map.from_state(state)
+
+
+def load_world(path, mapped=False):
+    # Reads the file into memory by default. mapped=True maps it copy-on-write instead, so
+    # nothing is read until it is used, at the cost of one open file per loaded world.
+    if mapped:
+        return WorldFile.open(path, writable=True).to_map()
+    return WorldFile.read(path).to_map()
+
+
+def decode_world(data):
+    return WorldFile(bytearray(data)).to_map()
@@ -0,0 +1,174 @@
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict, deque
+from itertools import count
+
+import numpy as np
+
+from content import Content, GenreContent
+from map import Map
+from world_format import WorldFile, save_world
+from world_pool import percentile
+
+
+def index_bytes(index, depth=2):
+    # Approximate size of an index built on a map: its arrays, plus 8 bytes per slot of its
+    # lists and dicts. The lists' contents, the map itself and the shared content tables are
+    # not followed.
+    total = 0
+    for value in vars(index).values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif isinstance(value, (list, tuple, dict, set)):
+            total += 8 * len(value)
+            if isinstance(value, dict):
+                total += sum(item.nbytes for item in value.values() if isinstance(item, np.ndarray))
+        elif depth and hasattr(value, '__dict__') and not isinstance(value, (Map, Content, GenreContent)):
+            total += index_bytes(value, depth - 1)
+    return total
+
+
+def map_bytes(game_map):
+    # Approximate resident size of a map: its arrays and strings plus the indexes built on it
+    total = game_map.nbytes
+    for index in (game_map.navigation, game_map.search_index, game_map.namer, game_map.renderer):
+        if index is not None:
+            total += index_bytes(index)
+    return total
+
+
+class WorldManager:
+    # Keeps many maps within a memory budget. Maps are kept in least recently used order, and
+    # when their approximate size goes over the budget the ones idle for longest are saved to
+    # disk and drop their arrays. An evicted map is the same Map object, so sessions and Rooms
+    # that refer to it stay valid: the first read of its arrays (a move, a look-up, a route)
+    # loads it back from the snapshot. Not thread-safe; the server uses it from its event loop.
+    def __init__(self, budget=None, directory=".world_snapshots", min_idle=0.0):
+        self.budget = budget  # bytes, or None for no limit
+        # Every manager has a directory of its own, so several processes can share the parent
+        os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="snapshots-", dir=directory)
+        self.min_idle = min_idle  # seconds a map must be idle before it can be evicted
+        self.resident = OrderedDict()  # key -> Map, least recently used first
+        self.evicted = {}  # key -> Map
+        self.sizes = {}  # key -> approximate bytes of a resident map
+        self.last_access = {}
+        self.paths = {}  # key -> snapshot path
+        self.file_numbers = count()
+        self.resident_bytes = 0
+        self.evictions = 0
+        self.restores = 0
+        self.restore_times = deque(maxlen=1000)  # latest restores, for the latency percentiles
+
+    def __len__(self):
+        return len(self.resident) + len(self.evicted)
+
+    def __contains__(self, key):
+        return key in self.resident or key in self.evicted
+
+    def add(self, key, game_map):
+        if key in self:
+            self.remove(key)
+        game_map.manager = self
+        game_map.manager_key = key
+        self.paths[key] = os.path.join(self.directory, f"{next(self.file_numbers)}.world")
+        self.resident[key] = game_map
+        self.touch(game_map)
+        return game_map
+
+    def get(self, key):
+        game_map = self.resident[key] if key in self.resident else self.evicted[key]
+        self.touch(game_map)
+        return game_map
+
+    def touch(self, game_map):
+        # Marks the map as just used and re-measures it, since indexes built on it since the
+        # last touch add to its size. An evicted map stays on disk until it is read.
+        key = game_map.manager_key
+        self.last_access[key] = time.monotonic()
+        if key in self.resident:
+            self.resident.move_to_end(key)
+            size = map_bytes(game_map)
+            self.resident_bytes += size - self.sizes.get(key, 0)
+            self.sizes[key] = size
+            self.enforce_budget()
+
+    def enforce_budget(self):
+        # Never evicts the map used last, so the map being read is always resident
+        now = time.monotonic()
+        while self.budget is not None and self.resident_bytes > self.budget and len(self.resident) > 1:
+            key = next(iter(self.resident))
+            if now - self.last_access[key] < self.min_idle:
+                break
+            self.evict(key)
+
+    def evict(self, key):
+        game_map = self.resident.pop(key)
+        # Rooms nobody has looked at stay unnamed in the snapshot, and are named when read
+        save_world(game_map, self.paths[key], name_rooms=False)
+        game_map.unload()
+        self.resident_bytes -= self.sizes.pop(key)
+        self.evicted[key] = game_map
+        self.evictions += 1
+
+    def restore(self, game_map):
+        # Called by Map.__getattr__ on the first read of an evicted map
+        start = time.perf_counter()
+        key = game_map.manager_key
+        path = self.paths[key]
+        # The snapshot is read whole rather than mapped, so restored maps hold no open files
+        game_map.reload(WorldFile.read(path).state())
+        os.remove(path)
+        del self.evicted[key]
+        self.resident[key] = game_map
+        self.restores += 1
+        self.restore_times.append(time.perf_counter() - start)
+        self.touch(game_map)
+
+    def remove(self, key):
+        # Stops managing a map; an evicted map is restored first so it stays usable
+        game_map = self.resident.get(key)
+        if game_map is None:
+            game_map = self.evicted[key]
+            self.restore(game_map)
+        del self.resident[key]
+        self.resident_bytes -= self.sizes.pop(key)
+        del self.last_access[key]
+        del self.paths[key]
+        game_map.manager = None
+        return game_map
+
+    def discard(self, key):
+        # Forgets a map that is no longer needed without restoring it
+        if key in self.evicted:
+            self.evicted.pop(key).manager = None
+            os.remove(self.paths.pop(key))
+            del self.last_access[key]
+        elif key in self.resident:
+            self.remove(key)
+
+    def metrics(self):
+        times = sorted(self.restore_times)
+        return {
+            'resident_maps': len(self.resident),
+            'evicted_maps': len(self.evicted),
+            'resident_bytes': self.resident_bytes,
+            'budget': self.budget,
+            'evictions': self.evictions,
+            'restores': self.restores,
+            'restore_seconds': {
+                'mean': sum(times) / len(times) if times else 0.0,
+                'p50': percentile(times, 0.5) if times else 0.0,
+                'p99': percentile(times, 0.99) if times else 0.0,
+            },
+        }
+
+    def close(self):
+        # Maps that are still evicted cannot be read after this
+        for game_map in list(self.evicted.values()) + list(self.resident.values()):
+            game_map.manager = None
+        self.resident.clear()
+        self.evicted.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
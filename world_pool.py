@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+from content import load_content
+from world_format import decode_world, encode_world, load_world
+
+logger = logging.getLogger(__name__)
+
+
+def generate_world(seed, width, height, num_regions, genre):
+    # Runs in a worker process; the world comes back in the compact binary format
+    from world import build_world
+    return encode_world(build_world(seed, width, height, num_regions, genre))
+
+
+def percentile(times, fraction):
+    return times[min(len(times) - 1, int(len(times) * fraction))]
+
+
+class WorldPool:
+    # Ready-made worlds for every (width, height, num_regions, genre) key that has been asked
+    # for, at most `size` per key. Taking a world never generates: a miss returns None and the
+    # caller builds the world itself. Every take tops its key back up from a process pool, with
+    # at most `max_pending` worlds generating at once across all keys, so refills never crowd
+    # out the generation a caller does on a miss. Keys waiting for a slot are refilled in turn.
+    # With a directory, ready worlds are saved there instead of kept in memory, so a pool can
+    # outlive the process that filled it. A key whose generation fails is not refilled again.
+    def __init__(self, size=2, workers=None, directory=None, max_pending=None, executor=None):
+        self.size = size
+        self.directory = directory
+        self.owns_executor = executor is None
+        self.executor = executor
+        self.workers = workers
+        self.max_pending = max_pending or workers or os.cpu_count()
+        # Reentrant, since a future that is already done runs its callback in the submitting thread
+        self.lock = threading.RLock()
+        self.keys = set()
+        self.ready = {}  # key -> deque of encoded worlds, when there is no directory
+        self.pending = {}  # key -> worlds generating
+        self.waiting = deque()  # keys with room for more worlds, in the order they asked
+        self.futures = set()
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.failures = 0
+        self.failed = {}  # key -> the exception its generation raised
+        self.refill_times = deque(maxlen=1000)  # latest refills, for the latency percentiles
+        self.closed = False
+        self.seed_sequence = int.from_bytes(os.urandom(4), 'little')
+
+    def key(self, width=None, height=None, num_regions=5, genre="fantasy"):
+        return (width, height, num_regions, genre)
+
+    def key_directory(self, key):
+        params = dict(zip(('width', 'height', 'num_regions', 'genre'), key), data=load_content().data_hash)
+        name = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+        path = os.path.join(self.directory, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def world_files(self, key):
+        directory = self.key_directory(key)
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".world")]
+
+    def depth(self, key):
+        if self.directory is not None:
+            return len(self.world_files(key))
+        return len(self.ready.get(key, ()))
+
+    def pop(self, key):
+        if self.directory is None:
+            ready = self.ready.get(key)
+            return decode_world(ready.popleft()) if ready else None
+        # Claim a saved world by renaming it, so two processes never get the same one
+        for path in self.world_files(key):
+            claimed = f"{path}.{os.getpid()}.taken"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                return load_world(claimed)
+            except ValueError:
+                continue
+            finally:
+                os.remove(claimed)
+        return None
+
+    def push(self, key, data):
+        if self.depth(key) >= self.size:
+            return
+        if self.directory is None:
+            self.ready.setdefault(key, deque()).append(data)
+            return
+        directory = self.key_directory(key)
+        handle, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, os.path.join(directory, f"{time.time_ns()}-{os.getpid()}.world"))
+
+    def take(self, width=None, height=None, num_regions=5, genre="fantasy", refill=True):
+        # A ready Map for these parameters, or None on a miss; either way the key is refilled
+        key = self.key(width, height, num_regions, genre)
+        with self.lock:
+            self.keys.add(key)
+            game_map = self.pop(key)
+            if game_map is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if refill:
+                self.request_refill(key)
+        return game_map
+
+    def get(self, width=None, height=None, num_regions=5, genre="fantasy"):
+        # Like take, but builds the world in-line on a miss
+        game_map = self.take(width, height, num_regions, genre)
+        if game_map is None:
+            from world import build_world
+            game_map = build_world(None, width, height, num_regions, genre)
+        return game_map
+
+    def warm(self, width=None, height=None, num_regions=5, genre="fantasy"):
+        # Start filling a key before the first take
+        with self.lock:
+            self.request_refill(self.key(width, height, num_regions, genre))
+
+    def request_refill(self, key):
+        self.keys.add(key)
+        if key not in self.waiting:
+            self.waiting.append(key)
+        self.start_refills()
+
+    def start_refills(self):
+        # Called with the lock held. Hands free generation slots to waiting keys in turn.
+        while self.waiting and not self.closed and len(self.futures) < self.max_pending:
+            key = self.waiting.popleft()
+            if key in self.failed or self.depth(key) + self.pending.get(key, 0) >= self.size:
+                continue
+            self.pending[key] = self.pending.get(key, 0) + 1
+            self.seed_sequence = (self.seed_sequence + 1) % 2 ** 32
+            if self.executor is None:
+                # Imported here, so a process that only takes worlds never loads multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                self.executor = ProcessPoolExecutor(self.workers)
+            started = time.perf_counter()
+            future = self.executor.submit(generate_world, self.seed_sequence, *key)
+            self.futures.add(future)
+            future.add_done_callback(lambda future, key=key, started=started: self.refilled(key, started, future))
+            if self.depth(key) + self.pending[key] < self.size:
+                self.waiting.append(key)
+
+    def refilled(self, key, started, future):
+        # Runs on the executor's thread when a world is ready
+        with self.lock:
+            self.futures.discard(future)
+            self.pending[key] -= 1
+            if future.cancelled():
+                pass
+            elif future.exception() is not None:
+                # Generating this key again would fail the same way
+                self.failures += 1
+                self.failed[key] = future.exception()
+                logger.error("generating a world for %s failed", key, exc_info=future.exception())
+            else:
+                self.push(key, future.result())
+                self.refills += 1
+                self.refill_times.append(time.perf_counter() - started)
+            if (key not in self.failed and self.depth(key) + self.pending[key] < self.size
+                    and key not in self.waiting):
+                self.waiting.append(key)
+            self.start_refills()
+
+    def fill(self, width=None, height=None, num_regions=5, genre="fantasy"):
+        # Block until the key holds `size` worlds. Raises what generation raised if it fails,
+        # and returns early from a closed pool.
+        from concurrent.futures import FIRST_COMPLETED, wait
+        key = self.key(width, height, num_regions, genre)
+        while True:
+            with self.lock:
+                if self.depth(key) >= self.size:
+                    return
+                if key in self.failed:
+                    raise self.failed[key]
+                self.request_refill(key)
+                futures = set(self.futures)
+            if not futures:
+                return
+            wait(futures, return_when=FIRST_COMPLETED)
+
+    def metrics(self):
+        with self.lock:
+            times = sorted(self.refill_times)
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'refills': self.refills,
+                'failures': self.failures,
+                'refill_seconds': {
+                    'mean': sum(times) / len(times) if times else 0.0,
+                    'p50': percentile(times, 0.5) if times else 0.0,
+                    'p99': percentile(times, 0.99) if times else 0.0,
+                },
+                'pending': len(self.futures),
+                'waiting': len(self.waiting),
+                'depth': {'x'.join(map(str, key)): self.depth(key) for key in sorted(self.keys, key=str)},
+            }
+
+    def refill_in_background(self, width=None, height=None, num_regions=5, genre="fantasy"):
+        # Fill a directory pool from a detached process, so the refill outlives a player who
+        # quits straight away
+        args = [sys.executable, os.path.abspath(__file__), '--fill', '--directory', self.directory,
+                '--size', str(self.size), '--regions', str(num_regions), '--genre', genre]
+        if width is not None:
+            args += ['--width', str(width)]
+        if height is not None:
+            args += ['--height', str(height)]
+        return subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.waiting.clear()
+        if self.owns_executor and self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate worlds for main.py --fast-start")
+    parser.add_argument('--fill', action='store_true', help="generate worlds until the pool is full")
+    parser.add_argument('--directory', default=".world_pool")
+    parser.add_argument('--size', type=int, default=2, help="worlds kept ready")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--width', type=int)
+    parser.add_argument('--height', type=int)
+    parser.add_argument('--regions', type=int, default=5)
+    parser.add_argument('--genre', default="fantasy", choices=load_content().playable_genres())
+    args = parser.parse_args()
+    params = (args.width, args.height, args.regions, args.genre)
+    if args.fill:
+        # Background refills run at low priority so they do not slow the game that started them
+        os.nice(10)
+    pool = WorldPool(args.size, args.workers, args.directory)
+    try:
+        if args.fill:
+            pool.fill(*params)
+        print(f"{pool.depth(pool.key(*params))} worlds ready in {pool.key_directory(pool.key(*params))}")
+    finally:
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()